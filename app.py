@@ -1,484 +1,342 @@
+import time
+_IMPORT_START = time.perf_counter()
+
 import streamlit as st
 import pandas as pd
+from streamlit.errors import StreamlitAPIException
 from datetime import date, timedelta
-import time
-import gspread 
-import numpy as np 
 # Mantendo a lógica de ID original, sem 'import uuid'
 
+# ⏱️ O gspread só é importado na primeira leitura (ver controle_automotivo/sheets.py)
+import controle_automotivo as dados
+from controle_automotivo import services
+from controle_automotivo.bulk_edit import DERIVED_COLS, check_unique_ids, diff_table, has_changes
+from controle_automotivo.config import EXPECTED_COLS, SEARCH_RESULTS_LIMIT
+from controle_automotivo.errors import DataAccessError, ValidationError
+from controle_automotivo.formatting import DATE_COLUMN_FORMAT, format_currency, format_date
+from controle_automotivo.search import get_prestador_index, get_vehicle_index
+
+dados.startup.record('import', time.perf_counter() - _IMPORT_START)
+
 # ==============================================================================
 # 🚨 CONFIGURAÇÃO GOOGLE SHEETS E CONEXÃO (DUPLA LÓGICA) 🚨
 # ==============================================================================
+#
+# A planilha (SHEET_ID/PLANILHA_TITULO), o modo de log de alterações e o
+# particionamento ficam em controle_automotivo/config.py. A camada de dados não
+# depende do Streamlit: aqui só entregamos as credenciais e exibimos os erros.
 
-# Defina a URL ou ID da sua planilha AQUI
-SHEET_ID = '1BNjgWhvEj8NbnGr4x7F42LW7QbQiG5kZ1FBhfr9Q-4g'
-PLANILHA_TITULO = 'Dados Automóvel' # Título exato da sua planilha
 
-@st.cache_resource(ttl=3600) 
-def get_gspread_client():
-    """Retorna o cliente Gspread autenticado."""
+def configure_data_layer():
+    """Entrega as credenciais de secrets.toml à camada de dados (uma vez por processo)."""
     try:
         creds_info = st.secrets["gcp_service_account"]
-        gc = gspread.service_account_from_dict(creds_info)
-        return gc
     except KeyError:
         st.error("⚠️ Credenciais do Google Sheets não encontradas. Configure o 'gcp_service_account' em secrets.toml.")
         st.stop()
     except Exception as e:
-        st.error(f"Erro de autenticação Gspread: {e}")
+        st.error(f"Erro ao ler as credenciais do Google Sheets: {e}")
         st.stop()
+    if not dados.is_configured():
+        # 🏢 Seção opcional [frotas] de secrets.toml: uma planilha por frota, mesmo servidor
+        frotas = st.secrets.get('frotas')
+        dados.configure(credentials=creds_info, tenants={name: dict(entry) for name, entry in frotas.items()} if frotas else None)
+        # 🪦 Remove de fato os registros excluídos, nos períodos sem gravações
+        dados.start_purge_worker()
+        # 💾 Mantém a réplica local em dia (só com LOCAL_REPLICA)
+        dados.start_sync_worker()
 
-@st.cache_data(ttl=5) 
-def get_sheet_data(sheet_name):
-    """Lê os dados de uma aba/sheet e retorna um DataFrame, com conversões iniciais."""
-    
-    expected_cols = {
-        'veiculo': ['id_veiculo', 'nome', 'placa', 'renavam', 'ano', 'valor_pago', 'data_compra'],
-        'prestador': ['id_prestador', 'empresa', 'telefone', 'nome_prestador', 'cnpj', 'email', 'endereco', 'numero', 'cidade', 'bairro', 'cep'],
-        'servico': ['id_servico', 'id_veiculo', 'id_prestador', 'nome_servico', 'data_servico', 'garantia_dias', 'valor', 'km_realizado', 'km_proxima_revisao', 'registro', 'data_vencimento']
-    }
 
-    try:
-        gc = get_gspread_client()
-        
-        # 🛑 LÓGICA DUPLA DE CONEXÃO: Tenta por chave, e se falhar, tenta por título.
-        sh = None
-        try:
-            sh = gc.open_by_key(SHEET_ID)
-        except Exception:
-            try:
-                st.warning(f"Falha ao abrir por Chave. Tentando por Título: '{PLANILHA_TITULO}'...")
-                sh = gc.open(PLANILHA_TITULO) 
-            except Exception as e:
-                # Falha crítica após esgotar as opções
-                st.error(f"Falha Crítica ao conectar à planilha. Verifique se a Service Account tem permissão de EDITOR: {e}")
-                return pd.DataFrame(columns=expected_cols.get(sheet_name, []))
-        
-        worksheet = sh.worksheet(sheet_name)
-        data = worksheet.get_all_records()
-        df = pd.DataFrame(data)
-
-        if df.empty:
-            return pd.DataFrame(columns=expected_cols.get(sheet_name, []))
-            
-        # Garante que as colunas de ID sejam tratadas como inteiros
-        id_col = f'id_{sheet_name}' if sheet_name in ('veiculo', 'prestador') else 'id_servico'
-        if id_col in df.columns:
-            df[id_col] = pd.to_numeric(df[id_col], errors='coerce').fillna(0).astype(int)
-
-        # 🚀 ESTABILIZAÇÃO DE TIPOS
-        if sheet_name == 'veiculo':
-            if 'valor_pago' in df.columns:
-                df['valor_pago'] = pd.to_numeric(df['valor_pago'], errors='coerce').fillna(0.0).astype(float)
-            if 'data_compra' in df.columns:
-                df['data_compra'] = pd.to_datetime(df['data_compra'], errors='coerce')
-
-        if sheet_name == 'servico':
-            for col in ['valor', 'garantia_dias', 'km_realizado', 'km_proxima_revisao']:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-            for col in ['data_servico', 'data_vencimento']:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        return df
-
-    except gspread.WorksheetNotFound:
-        st.error(f"A aba/sheet **'{sheet_name}'** não foi encontrada na planilha. Verifique a ortografia.")
-        return pd.DataFrame()
-    except Exception as e:
-        st.error(f"Erro ao ler a sheet '{sheet_name}': {e}")
-        return pd.DataFrame()
+def session_user():
+    """E-mail do usuário logado (st.login), ou None sem login."""
+    return st.user.get('email') if st.user.get('is_logged_in') else None
 
 
-def write_sheet_data(sheet_name, df_new):
-    """Sobrescreve a aba/sheet com o novo DataFrame (usado em Update/Delete)."""
-    try:
-        gc = get_gspread_client()
-        
-        # 🛑 LÓGICA DUPLA DE CONEXÃO PARA ESCRITA
-        sh = None
-        try:
-            sh = gc.open_by_key(SHEET_ID)
-        except Exception:
-            sh = gc.open(PLANILHA_TITULO)
-
-        worksheet = sh.worksheet(sheet_name)
-        
-        df_to_write = df_new
-        data_to_write = [df_to_write.columns.tolist()] + df_to_write.values.tolist()
-        
-        # Operação de reescrever TUDO (o gargalo)
-        worksheet.clear()
-        worksheet.update('A1', data_to_write, value_input_option='USER_ENTERED')
-        
-        get_sheet_data.clear()
-        
-        return True
+def select_tenant():
+    """Frota da sessão (só com várias frotas): ?frota=NOME na URL ou o seletor da barra lateral.
+
+    🔒 Só entram as frotas liberadas para o usuário logado (chave 'usuarios' da frota).
+    """
+    if not dados.config.TENANTS:
+        apply_session_tenant()
+        return
+    user = session_user()
+    frotas = dados.allowed_tenants(user)
+    if user is None and dados.restricted_tenants():
+        st.sidebar.button("🔑 Entrar", key='btn_login', on_click=st.login, help="Frotas restritas exigem login")
+    if not frotas:
+        st.warning("🔒 Nenhuma frota liberada para esta sessão." + (" Faça login para continuar." if user is None else ""))
+        st.stop()
+    if st.session_state.get('tenant') not in frotas:
+        requested = st.query_params.get('frota')
+        st.session_state['tenant'] = requested if requested in frotas else frotas[0]
+    st.sidebar.selectbox("🏢 Frota", frotas, key='tenant', on_change=change_tenant)
+    apply_session_tenant()
+
+
+def apply_session_tenant():
+    """Aponta a camada de dados para a frota da sessão (a cada execução do script ou do fragmento)."""
+    tenant = st.session_state.get('tenant') if dados.config.TENANTS else None
+    if tenant is not None and tenant not in dados.allowed_tenants(session_user()):
+        st.error("🔒 Frota não liberada para esta sessão.")
+        st.stop()
+    dados.set_tenant(tenant)
 
-    except Exception as e:
-        st.error(f"Erro ao escrever na sheet '{sheet_name}': {e}")
-        return False
 
 # ==============================================================================
-# 🚨 FUNÇÕES DE ACESSO A DADOS (SIMULAÇÃO CRUD) 🚨
+# 🚨 FUNÇÕES DE ACESSO A DADOS (ERROS EXIBIDOS NA TELA) 🚨
 # ==============================================================================
 
 
 def get_data(sheet_name, filter_col=None, filter_value=None):
     """Busca dados de uma aba/sheet e retorna um DataFrame do Pandas, com filtro opcional."""
-    df = get_sheet_data(sheet_name)
-    if df.empty:
-        return df
+    try:
+        return dados.get_data(sheet_name, filter_col, filter_value)
+    except DataAccessError as e:
+        st.error(str(e))
+        return pd.DataFrame(columns=EXPECTED_COLS.get(sheet_name, []))
 
-    if filter_col and filter_value is not None:
-        try:
-            # Garante que o ID no DataFrame é inteiro para comparação
-            if filter_col.startswith('id_'):
-                df[filter_col] = pd.to_numeric(df[filter_col], errors='coerce').fillna(0).astype(int)
-                # Garante que o valor de filtro seja inteiro
-                filter_value = int(filter_value) if pd.notna(filter_value) else 0
-
-            df_filtered = df[df[filter_col] == filter_value]
-            return df_filtered
-        except:
-            return pd.DataFrame()
-
-    return df
-
-
-def execute_crud_operation(sheet_name, data=None, id_col=None, id_value=None, operation='insert'):
-    """Executa as operações CRUD no Google Sheets (Insert, Update, Delete)."""
-    df = get_data(sheet_name)
-
-    # 1. TRATAMENTO DE ID (SIMULAÇÃO DE AUTO_INCREMENT)
-    new_id = None
-    if operation == 'insert':
-        # Calcula o próximo ID
-        id_col = f'id_{sheet_name}' if id_col is None else id_col
-        if df.empty:
-            new_id = 1
-            df = pd.DataFrame(columns=data.keys()) # Cria DF vazio com as colunas
-        else:
-            df[id_col] = pd.to_numeric(df[id_col], errors='coerce').fillna(0).astype(int)
-            new_id = df[id_col].max() + 1
-
-        data[id_col] = new_id
-
-    # 2. INSERÇÃO (APPEND)
-    if operation == 'insert':
-        # Cria um novo DataFrame com os dados a serem inseridos
-        df_new_row = pd.DataFrame([data])
-        # Concatena a nova linha. Garante a ordem das colunas.
-        if df.empty:
-            df_updated = df_new_row
-        else:
-            df_updated = pd.concat([df, df_new_row], ignore_index=True)
-            df_updated = df_updated[df.columns] # Reordena colunas
 
-        success = write_sheet_data(sheet_name, df_updated)
-        return success, new_id if success else None
+def get_full_service_data(date_start=None, date_end=None):
+    """Lê todos os dados e simula a operação JOIN do SQL no Pandas."""
+    try:
+        return dados.get_full_service_data(date_start, date_end)
+    except DataAccessError as e:
+        st.error(str(e))
+        return pd.DataFrame()
+
+
+def get_spend_by_vehicle():
+    """Total gasto em serviços por veículo (agregado por partição, se houver)."""
+    try:
+        return dados.get_spend_by_vehicle()
+    except DataAccessError as e:
+        st.error(str(e))
+        return pd.DataFrame(columns=['Veículo', 'Total Gasto em Serviços'])
+
+
+def get_fleet_analytics():
+    """Relatórios de custo da frota (calculados uma vez por versão dos dados)."""
+    try:
+        return dados.get_fleet_analytics()
+    except DataAccessError as e:
+        st.error(str(e))
+        return {}
 
-    # 3. ATUALIZAÇÃO OU EXCLUSÃO (UPDATE/DELETE)
-    elif operation in ['update', 'delete']:
-        if df.empty or id_value is None:
-            return False, None
 
-        # Encontra o índice da linha
-        id_col = f'id_{sheet_name}' if id_col is None else id_col
-        df[id_col] = pd.to_numeric(df[id_col], errors='coerce').fillna(0).astype(int)
-        index_to_modify = df[df[id_col] == int(id_value)].index
+def get_maintenance_forecast():
+    """Próximas revisões previstas pelo KM (calculadas uma vez por versão dos dados)."""
+    try:
+        return dados.get_maintenance_forecast()
+    except DataAccessError as e:
+        st.error(str(e))
+        return pd.DataFrame()
 
-        if index_to_modify.empty:
-            return False, None
 
-        if operation == 'update':
-            # Atualiza a linha
-            for key, value in data.items():
-                if key in df.columns:
-                    df.loc[index_to_modify, key] = value
-            df_updated = df
+def get_search_indexes():
+    """Índices de busca de veículos e prestadores (reconstruídos só quando os dados mudam)."""
+    try:
+        return get_vehicle_index(), get_prestador_index()
+    except DataAccessError as e:
+        st.error(str(e))
+        return None, None
 
-        elif operation == 'delete':
-            # Remove a linha
-            df_updated = df.drop(index_to_modify).reset_index(drop=True)
 
-        success = write_sheet_data(sheet_name, df_updated)
-        return success, id_value if success else None
+def show_data_age(slot):
+    """Mostra há quanto tempo os dados exibidos foram lidos da planilha."""
+    age = dados.get_data_age()
+    if age is None:
+        return
+    if dados.config.LOCAL_REPLICA:
+        text = f"💾 Réplica local sincronizada com a planilha há {age:.0f} s"
+        if age > 2 * dados.config.REPLICA_SYNC_INTERVAL:
+            text += " (planilha lenta ou inacessível: exibindo a última cópia)"
+    else:
+        text = f"🕒 Dados lidos da planilha há {age:.0f} s"
+        if age > dados.config.DATA_CACHE_TTL:
+            text += " (atualizando em segundo plano)"
+    slot.caption(text)
 
+
+def run_operation(operation, *args, failure_message):
+    """Executa uma operação da camada de dados, exibindo o erro. Retorna (sucesso, resultado)."""
+    try:
+        return True, operation(*args)
+    except ValidationError as e:
+        st.error(str(e))
+    except DataAccessError as e:
+        st.error(f"{failure_message} {e}")
     return False, None
 
 
 # --- Funções de Inserção/Atualização/Exclusão (CRUD) ---
+#
+# Após gravar, o cache já contém as abas alteradas (sem releitura da planilha). Os
+# painéis de resumo e histórico só mostram veículos/prestadores com serviços: cadastrar
+# ou excluir um deles reexecuta só o fragmento de cadastro; gravar serviços ou renomear
+# veículos/prestadores reexecuta o app. O aviso de sucesso vai em st.toast, que
+# sobrevive ao rerun (antes era preciso um time.sleep para o st.success aparecer).
+
+def rerun_cadastro(whole_app=False):
+    """Reexecuta só o fragmento de cadastro ou, se a mudança aparece nos painéis, o app todo.
+
+    O Streamlit só aceita o rerun do fragmento durante um rerun do próprio fragmento;
+    chamado numa execução completa do app, cai no rerun do app.
+    """
+    if not whole_app:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            pass
+    st.rerun()
 
-# Veículo
-# --- Funções de Inserção/Atualização/Exclusão (CRUD) ---
 
 # Veículo
 
 def insert_vehicle(nome, placa, ano, valor_pago, data_compra):
-
-    # 🛑 CORRIGIDO: usa .isoformat() para garantir a serialização da data
-    if placa:
-        df_check = get_data('veiculo', 'placa', placa)
-        if not df_check.empty:
-            st.error(f"Placa '{placa}' já cadastrada.")
-            return False
-
-    data = {
-        'id_veiculo': 0,
-        'nome': nome, 'placa': placa,
-        'ano': ano, 'valor_pago': float(valor_pago), 'data_compra': data_compra.isoformat() # ✅ CORREÇÃO APLICADA
-    }
-
-    success, _ = execute_crud_operation('veiculo', data=data, id_col='id_veiculo', operation='insert')
+    success, _ = run_operation(services.insert_vehicle, nome, placa, ano, valor_pago, data_compra, failure_message="Falha ao cadastrar veículo.")
 
     if success:
-        st.success(f"Veículo '{nome}' ({placa}) cadastrado com sucesso!")
+        st.toast(f"Veículo '{nome}' ({placa}) cadastrado com sucesso!", icon="✅")
         st.session_state['edit_vehicle_id'] = None
-        st.rerun()
-    else:
-        st.error("Falha ao cadastrar veículo.")
+        rerun_cadastro()
+    return False
 
 
 def update_vehicle(id_veiculo, nome, placa, ano, valor_pago, data_compra):
-
-    # 🛑 CORRIGIDO: usa .isoformat() para garantir a serialização da data
-    if placa:
-        df_check = get_data('veiculo', 'placa', placa)
-        if not df_check.empty:
-            # Pega o ID do veículo encontrado (se houver) e converte para int
-            found_id = df_check.iloc[0]['id_veiculo']
-            if found_id != int(id_veiculo):
-                st.error(f"Placa '{placa}' já cadastrada para outro veículo (ID {found_id}).")
-                return False
-
-    data = {
-        'nome': nome, 'placa': placa,
-        'ano': ano, 'valor_pago': float(valor_pago), 'data_compra': data_compra.isoformat() # ✅ CORREÇÃO APLICADA
-    }
-
-    success, _ = execute_crud_operation('veiculo', data=data, id_col='id_veiculo', id_value=int(id_veiculo), operation='update')
+    success, _ = run_operation(services.update_vehicle, id_veiculo, nome, placa, ano, valor_pago, data_compra, failure_message="Falha ao atualizar veículo.")
 
     if success:
-        st.success(f"Veículo '{nome}' ({placa}) atualizado com sucesso!")
+        st.toast(f"Veículo '{nome}' ({placa}) atualizado com sucesso!", icon="✅")
         st.session_state['edit_vehicle_id'] = None
-        st.rerun()
-    else:
-        st.error("Falha ao atualizar veículo.")
-        
-def delete_vehicle(id_veiculo):
-    # Simulação da verificação de chave estrangeira
-    df_servicos = get_data('servico', 'id_veiculo', int(id_veiculo))
-    if not df_servicos.empty:
-        st.error("Não é possível remover o veículo. Existem serviços vinculados a ele.")
-        return False
+        rerun_cadastro(True)  # o nome aparece nos painéis
+    return False
 
-    success, _ = execute_crud_operation('veiculo', id_col='id_veiculo', id_value=int(id_veiculo), operation='delete')
+
+def delete_vehicle(id_veiculo):
+    success, _ = run_operation(services.delete_vehicle, id_veiculo, failure_message="Falha ao remover veículo.")
 
     if success:
-        st.success("Veículo removido com sucesso!")
-        time.sleep(1)
-        st.rerun()
-    else:
-        st.error("Falha ao remover veículo.")
+        st.session_state.pop(f'confirm_delete_v_{id_veiculo}', None)
+        offer_undo('veiculo', id_veiculo, "Veículo")
+        st.toast("Veículo removido com sucesso!", icon="🗑️")
+        rerun_cadastro()  # só sai se não tiver serviços
+    return False
 
 
 # Prestador
 
 def insert_new_prestador(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
-    df_check = get_data("prestador", "empresa", empresa)
-    if not df_check.empty:
-        st.warning(f"A empresa '{empresa}' já está cadastrada.")
+    try:
+        services.insert_new_prestador(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep)
+    except ValidationError as e:
+        st.warning(str(e))
+        return False
+    except DataAccessError as e:
+        st.error(f"Falha ao cadastrar prestador. {e}")
         return False
 
-    data = {
-        'id_prestador': 0, 'empresa': empresa, 'telefone': telefone, 'nome_prestador': nome_prestador,
-        'cnpj': cnpj, 'email': email, 'endereco': endereco, 'numero': numero,
-        'cidade': cidade, 'bairro': bairro, 'cep': cep
-    }
-
-    success, _ = execute_crud_operation('prestador', data=data, id_col='id_prestador', operation='insert')
-
-    if success:
-        st.success(f"Prestador '{empresa}' cadastrado com sucesso!")
-        st.session_state['edit_prestador_id'] = None
-        st.rerun()
-        return True
-    return False
+    st.toast(f"Prestador '{empresa}' cadastrado com sucesso!", icon="✅")
+    st.session_state['edit_prestador_id'] = None
+    rerun_cadastro()
+    return True
 
 
 def update_prestador(id_prestador, empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
-    data = {
-        'empresa': empresa, 'telefone': telefone, 'nome_prestador': nome_prestador,
-        'cnpj': cnpj, 'email': email, 'endereco': endereco, 'numero': numero,
-        'cidade': cidade, 'bairro': bairro, 'cep': cep
-    }
-
-    success, _ = execute_crud_operation('prestador', data=data, id_col='id_prestador', id_value=int(id_prestador), operation='update')
+    success, _ = run_operation(
+        services.update_prestador, id_prestador, empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep,
+        failure_message="Falha ao atualizar prestador."
+    )
 
     if success:
-        st.success(f"Prestador '{empresa}' atualizado com sucesso!")
+        st.toast(f"Prestador '{empresa}' atualizado com sucesso!", icon="✅")
         st.session_state['edit_prestador_id'] = None
-        st.rerun()
+        rerun_cadastro(True)  # empresa e cidade aparecem nos painéis
         return True
     return False
 
 
 def delete_prestador(id_prestador):
-    df_servicos = get_data('servico', 'id_prestador', int(id_prestador))
-    if not df_servicos.empty:
-        st.error("Não é possível remover o prestador. Existem serviços vinculados a ele.")
-        return False
-
-    success, _ = execute_crud_operation('prestador', id_col='id_prestador', id_value=int(id_prestador), operation='delete')
+    success, _ = run_operation(services.delete_prestador, id_prestador, failure_message="Falha ao remover prestador.")
 
     if success:
-        st.success("Prestador removido com sucesso!")
-        time.sleep(1)
-        st.rerun()
-    else:
-        st.error("Falha ao remover prestador.")
-
-
-def insert_prestador(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
-    """Insere ou atualiza um prestador (usado no cadastro de Serviço)."""
-    df = get_data("prestador", "empresa", empresa)
-
-    if not df.empty:
-        # Se existe, retorna o ID e atualiza os dados
-        id_prestador = df.iloc[0]['id_prestador']
-        # Simula a atualização de dados do prestador
-        update_prestador(id_prestador, empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep)
-        st.info(f"Dados do Prestador '{empresa}' atualizados.")
-        return id_prestador
-
-    # Se não existe, insere
-    data = {
-        'id_prestador': 0, 'empresa': empresa, 'telefone': telefone, 'nome_prestador': nome_prestador,
-        'cnpj': cnpj, 'email': email, 'endereco': endereco, 'numero': numero,
-        'cidade': cidade, 'bairro': bairro, 'cep': cep
-    }
-    success, new_id = execute_crud_operation('prestador', data=data, id_col='id_prestador', operation='insert')
-
-    return new_id if success else None
+        st.session_state.pop(f'confirm_delete_p_{id_prestador}', None)
+        offer_undo('prestador', id_prestador, "Prestador")
+        st.toast("Prestador removido com sucesso!", icon="🗑️")
+        rerun_cadastro()  # só sai se não tiver serviços
+    return False
 
 
 # Serviço
 
 def insert_service(id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro):
-    data_servico_dt = pd.to_datetime(data_servico)
-    # Garante que garantia_dias é inteiro para o timedelta
-    garantia_dias_int = int(garantia_dias)
-    data_vencimento = data_servico_dt + timedelta(days=garantia_dias_int)
-
-    data = {
-        'id_servico': 0, 'id_veiculo': int(id_veiculo), 'id_prestador': int(id_prestador),
-        'nome_servico': nome_servico, 'data_servico': data_servico_dt.date().isoformat(), # 🛑 CORRIGIDO: Armazena como ISO string
-        'garantia_dias': str(garantia_dias), 'valor': float(valor),
-        'km_realizado': str(km_realizado), 'km_proxima_revisao': str(km_proxima_revisao),
-        'registro': registro,
-        'data_vencimento': data_vencimento.date().isoformat() # 🛑 CORRIGIDO: Armazena como ISO string
-    }
-
-    success, _ = execute_crud_operation('servico', data=data, id_col='id_servico', operation='insert')
+    success, _ = run_operation(
+        services.insert_service, id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro,
+        failure_message="Falha ao cadastrar serviço."
+    )
 
     if success:
-        st.success(f"Serviço '{nome_servico}' cadastrado com sucesso!")
+        st.toast(f"Serviço '{nome_servico}' cadastrado com sucesso!", icon="✅")
         if 'edit_service_id' in st.session_state:
             del st.session_state['edit_service_id']
-        st.rerun()
-    else:
-        st.error("Falha ao cadastrar serviço.")
+        rerun_cadastro(True)
 
 
 def update_service(id_servico, id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro):
-    data_servico_dt = pd.to_datetime(data_servico)
-    # Garante que garantia_dias é inteiro para o timedelta
-    garantia_dias_int = int(garantia_dias)
-    data_vencimento = data_servico_dt + timedelta(days=garantia_dias_int)
-
-    data = {
-        'id_veiculo': int(id_veiculo), 'id_prestador': int(id_prestador),
-        'nome_servico': nome_servico, 'data_servico': data_servico_dt.date().isoformat(), # 🛑 CORRIGIDO: Armazena como ISO string
-        'garantia_dias': str(garantia_dias), 'valor': float(valor),
-        'km_realizado': str(km_realizado), 'km_proxima_revisao': str(km_proxima_revisao),
-        'registro': registro,
-        'data_vencimento': data_vencimento.date().isoformat() # 🛑 CORRIGIDO: Armazena como ISO string
-    }
-
-    success, _ = execute_crud_operation('servico', data=data, id_col='id_servico', id_value=int(id_servico), operation='update')
+    success, _ = run_operation(
+        services.update_service, id_servico, id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro,
+        failure_message="Falha ao atualizar serviço."
+    )
 
     if success:
-        st.success(f"Serviço '{nome_servico}' atualizado com sucesso!")
+        st.toast(f"Serviço '{nome_servico}' atualizado com sucesso!", icon="✅")
         if 'edit_service_id' in st.session_state:
             del st.session_state['edit_service_id']
-        st.rerun()
-    else:
-        st.error("Falha ao atualizar serviço.")
+        rerun_cadastro(True)
 
 
 def delete_service(id_servico):
-    success, _ = execute_crud_operation('servico', id_col='id_servico', id_value=int(id_servico), operation='delete')
+    success, _ = run_operation(services.delete_service, id_servico, failure_message="Falha ao remover serviço.")
 
     if success:
-        st.success("Serviço removido com sucesso!")
-        time.sleep(1)
-        st.rerun()
-    else:
-        st.error("Falha ao remover serviço.")
-
-
-# --- FUNÇÃO QUE SIMULA O JOIN DO SQL ---
-
-
-def get_full_service_data(date_start=None, date_end=None):
-    """Lê todos os dados e simula a operação JOIN do SQL no Pandas."""
-
-    df_servicos = get_data('servico')
-    df_veiculos = get_data('veiculo')
-    df_prestadores = get_data('prestador')
+        st.session_state.pop(f'confirm_delete_{id_servico}', None)
+        offer_undo('servico', id_servico, "Serviço")
+        st.toast("Serviço removido com sucesso!", icon="🗑️")
+        rerun_cadastro(True)
 
-    if df_servicos.empty or df_veiculos.empty or df_prestadores.empty:
-        return pd.DataFrame()
 
-    # Converte IDs para INT para o merge (Chave Estrangeira)
-    df_servicos['id_veiculo'] = pd.to_numeric(df_servicos['id_veiculo'], errors='coerce').fillna(0).astype(int)
-    df_servicos['id_prestador'] = pd.to_numeric(df_servicos['id_prestador'], errors='coerce').fillna(0).astype(int)
-    
-    # IDs de veiculos/prestadores para o join
-    df_veiculos['id_veiculo'] = pd.to_numeric(df_veiculos['id_veiculo'], errors='coerce').fillna(0).astype(int)
-    df_prestadores['id_prestador'] = pd.to_numeric(df_prestadores['id_prestador'], errors='coerce').fillna(0).astype(int)
+# Desfazer exclusão
 
-    # 🛑 CONVERSÃO FINAL DE TIPOS NUMÉRICOS 🛑
-    df_servicos['valor'] = pd.to_numeric(df_servicos['valor'], errors='coerce').fillna(0.0)
-    df_servicos['garantia_dias'] = pd.to_numeric(df_servicos['garantia_dias'], errors='coerce').fillna(0).astype(int)
-    df_servicos['km_realizado'] = pd.to_numeric(df_servicos['km_realizado'], errors='coerce').fillna(0).astype(int)
-    df_servicos['km_proxima_revisao'] = pd.to_numeric(df_servicos['km_proxima_revisao'], errors='coerce').fillna(0).astype(int)
-    # -----------------------------------------------
-    # 1. JOIN com Veículo
-    df_merged = pd.merge(df_servicos, df_veiculos[['id_veiculo', 'nome', 'placa']], on='id_veiculo', how='left')
+def offer_undo(sheet_name, record_id, label):
+    """Guarda a última exclusão da sessão para o botão "Desfazer" (só com exclusão lógica)."""
+    if dados.config.SOFT_DELETE:
+        st.session_state['undo_delete'] = {'sheet': sheet_name, 'id': int(record_id), 'label': label}
 
-    # 2. JOIN com Prestador
-    df_merged = pd.merge(df_merged, df_prestadores[['id_prestador', 'empresa', 'cidade']], on='id_prestador', how='left')
 
-    # Renomeia colunas para o display
-    df_merged = df_merged.rename(columns={'nome': 'Veículo', 'placa': 'Placa', 'empresa': 'Empresa', 'cidade': 'Cidade', 'nome_servico': 'Serviço', 'data_servico': 'Data', 'valor': 'Valor'})
+def undo_delete():
+    undo = st.session_state['undo_delete']
+    success, _ = run_operation(services.restore_record, undo['sheet'], undo['id'], failure_message="Falha ao desfazer a exclusão.")
 
-    # Converte colunas de data (sem NaT)
-    df_merged['Data'] = pd.to_datetime(df_merged['Data'], errors='coerce')
-    df_merged['data_vencimento'] = pd.to_datetime(df_merged['data_vencimento'], errors='coerce')
-    
-    # CÁLCULO: Dias para Vencer (Dias Restantes)
-    df_merged['Dias para Vencer'] = (df_merged['data_vencimento'] - pd.to_datetime(date.today())).dt.days
+    if success:
+        st.session_state.pop('undo_delete', None)
+        st.toast(f"{undo['label']} ID {undo['id']} restaurado!", icon="↩️")
+        rerun_cadastro(undo['sheet'] == 'servico')
 
 
-    # 3. Filtragem por Data (se necessário)
+# Edição em lote
 
-    if date_start and date_end:
-        df_merged = df_merged[(df_merged['Data'] >= pd.to_datetime(date_start)) & (df_merged['Data'] <= pd.to_datetime(date_end))]
+def save_table_edits(sheet_name, df_base, df_edited):
+    success, counts = run_operation(services.apply_table_edits, sheet_name, df_base, df_edited, failure_message="Falha ao salvar a edição em lote.")
 
-    return df_merged.sort_values(by='Data', ascending=False)
+    if success:
+        st.toast(
+            f"Edição salva: {counts['updated']} alterado(s), {counts['inserted']} novo(s), {counts['deleted']} excluído(s).",
+            icon="✅",
+        )
+        discard_table_edits()
+        # Serviços ou nomes alterados aparecem nos painéis; linhas novas/excluídas de
+        # veículo/prestador não têm serviços
+        rerun_cadastro(sheet_name == 'servico' or counts['updated'] > 0)
 
 
 # ==============================================================================
@@ -512,6 +370,40 @@ CUSTOM_CSS = """
 # ==============================================================================
 
 
+# --- CALLBACKS DE NAVEGAÇÃO ---
+# Rodam antes do rerun do fragmento de cadastro, então não precisam de st.rerun().
+
+
+def start_editing(state_key, record_id):
+    """Abre o formulário de cadastro ('NEW_MODE') ou de edição do registro."""
+    st.session_state[state_key] = record_id
+
+
+def stop_editing(state_key):
+    """Fecha o formulário e volta para a lista."""
+    st.session_state[state_key] = None
+
+
+def dismiss_undo():
+    """Esconde a oferta de desfazer a última exclusão."""
+    st.session_state.pop('undo_delete', None)
+
+
+def discard_table_edits():
+    """Recria a grade da edição em lote a partir da tabela (descarta o que não foi salvo)."""
+    st.session_state['bulk_edit_version'] = st.session_state.get('bulk_edit_version', 0) + 1
+
+
+def change_tenant():
+    """Troca de frota: fecha formulários, desfazer e edição em lote (os IDs são de outra planilha)."""
+    st.query_params['frota'] = st.session_state['tenant']
+    for state_key in ('edit_vehicle_id', 'edit_prestador_id', 'edit_service_id'):
+        st.session_state[state_key] = None
+    for state_key in [k for k in st.session_state if k.startswith('confirm_delete_')] + ['undo_delete']:
+        st.session_state.pop(state_key, None)
+    discard_table_edits()
+
+
 # --- COMPONENTES DE DISPLAY ---
 
 
@@ -520,6 +412,9 @@ def display_vehicle_table_and_actions(df_veiculos_listagem):
     st.subheader("Manutenção de Veículos Existentes")
     st.markdown('---')
 
+    # Textos de exibição calculados para a coluna inteira, não linha a linha
+    valores = format_currency(df_veiculos_listagem['valor_pago'], missing='R$ 0,00')
+
     for index, row in df_veiculos_listagem.iterrows():
         id_veiculo = int(row['id_veiculo'])
 
@@ -530,24 +425,22 @@ def display_vehicle_table_and_actions(df_veiculos_listagem):
         with col_data:
             st.markdown(f"**{row['nome']} ({row['placa'] or 'S/ Placa'})**") # Exibe 'S/ Placa' se for vazio
             st.markdown(f"Ano: **{row['ano']}**")
-            st.markdown(f"Valor: **R$ {float(row['valor_pago']):.2f}**")
+            st.markdown(f"Valor: **{valores[index]}**")
 
         # --- BLOCO DE AÇÃO (COLUNA DIREITA) ---
         with col_actions:
             col_act1, col_act2 = st.columns(2)
 
             with col_act1:
-                if st.button("✏️", key=f"edit_v_{id_veiculo}", help=f"Editar Veículo ID {id_veiculo}"):
-                    st.session_state['edit_vehicle_id'] = id_veiculo
-                    st.rerun()
+                st.button("✏️", key=f"edit_v_{id_veiculo}", help=f"Editar Veículo ID {id_veiculo}", on_click=start_editing, args=('edit_vehicle_id', id_veiculo))
 
             with col_act2:
                 if st.button("🗑️", key=f"delete_v_{id_veiculo}", help=f"Excluir Veículo ID {id_veiculo}"):
                     if st.session_state.get(f'confirm_delete_v_{id_veiculo}', False):
                         delete_vehicle(id_veiculo)
                     else:
+                        # O aviso de confirmação logo abaixo já aparece nesta mesma execução
                         st.session_state[f'confirm_delete_v_{id_veiculo}'] = True
-                        st.rerun()
 
         # Linha de aviso de confirmação de exclusão (fora das colunas)
         if st.session_state.get(f'confirm_delete_v_{id_veiculo}', False) and not st.session_state.get('edit_vehicle_id'):
@@ -579,17 +472,15 @@ def display_prestador_table_and_actions(df_prestadores_listagem):
             col_act1, col_act2 = st.columns(2)
 
             with col_act1:
-                if st.button("✏️", key=f"edit_p_{id_prestador}", help=f"Editar Prestador ID {id_prestador}"):
-                    st.session_state['edit_prestador_id'] = id_prestador
-                    st.rerun()
+                st.button("✏️", key=f"edit_p_{id_prestador}", help=f"Editar Prestador ID {id_prestador}", on_click=start_editing, args=('edit_prestador_id', id_prestador))
 
             with col_act2:
                 if st.button("🗑️", key=f"delete_p_{id_prestador}", help=f"Excluir Prestador ID {id_prestador}"):
                     if st.session_state.get(f'confirm_delete_p_{id_prestador}', False):
                         delete_prestador(id_prestador)
                     else:
+                        # O aviso de confirmação logo abaixo já aparece nesta mesma execução
                         st.session_state[f'confirm_delete_p_{id_prestador}'] = True
-                        st.rerun()
 
         if st.session_state.get(f'confirm_delete_p_{id_prestador}', False) and not st.session_state.get('edit_prestador_id'):
             st.error(f"⚠️ **Clique novamente** no botão 🗑️ acima para confirmar a exclusão do ID {id_prestador}.")
@@ -602,12 +493,13 @@ def display_service_table_and_actions(df_servicos_listagem):
     st.subheader("Manutenção de Serviços Existentes")
     st.markdown('---')
 
+    # Datas de exibição formatadas para a coluna inteira, não linha a linha
+    datas = format_date(df_servicos_listagem['Data'], missing='N/A')
+
     for index, row in df_servicos_listagem.iterrows():
         # df_servicos_listagem é o resultado de get_full_service_data, que já tem o id_servico
         id_servico = int(row['id_servico'])
-
-        # Formata a data para exibição (a coluna 'Data' já é datetime do Pandas)
-        data_display = row['Data'].strftime('%d-%m-%Y') if pd.notna(row['Data']) else 'N/A'
+        data_display = datas[index]
 
         # PROPORÇÃO PARA RESPONSIVIDADE
         col_data, col_actions = st.columns([0.85, 0.15])
@@ -623,17 +515,15 @@ def display_service_table_and_actions(df_servicos_listagem):
             col_act1, col_act2 = st.columns(2)
 
             with col_act1:
-                if st.button("✏️", key=f"edit_{id_servico}", help=f"Editar Serviço ID {id_servico}"):
-                    st.session_state['edit_service_id'] = id_servico
-                    st.rerun()
+                st.button("✏️", key=f"edit_{id_servico}", help=f"Editar Serviço ID {id_servico}", on_click=start_editing, args=('edit_service_id', id_servico))
 
             with col_act2:
                 if st.button("🗑️", key=f"delete_{id_servico}", help=f"Excluir Serviço ID {id_servico}"):
                     if st.session_state.get(f'confirm_delete_{id_servico}', False):
                         delete_service(id_servico)
                     else:
+                        # O aviso de confirmação logo abaixo já aparece nesta mesma execução
                         st.session_state[f'confirm_delete_{id_servico}'] = True
-                        st.rerun()
 
         if st.session_state.get(f'confirm_delete_{id_servico}', False) and not st.session_state.get('edit_service_id'):
             st.error(f"⚠️ **Clique novamente** no botão 🗑️ acima para confirmar a exclusão do ID {id_servico}.")
@@ -655,9 +545,7 @@ def manage_vehicle_form():
         st.write("")
         _, col_button = st.columns([0.8, 0.2])
         with col_button:
-            if st.button("➕ Novo Veículo", key="btn_novo_veiculo_lista", help="Iniciar um novo cadastro de veículo"):
-                st.session_state['edit_vehicle_id'] = 'NEW_MODE'
-                st.rerun()
+            st.button("➕ Novo Veículo", key="btn_novo_veiculo_lista", help="Iniciar um novo cadastro de veículo", on_click=start_editing, args=('edit_vehicle_id', 'NEW_MODE'))
 
     if is_editing or st.session_state.get('edit_vehicle_id') == 'NEW_MODE':
 
@@ -671,10 +559,7 @@ def manage_vehicle_form():
                 'nome': '', 'placa': '', 'ano': date.today().year,
                 'valor_pago': 0.0, 'data_compra': date.today()
             }
-            if st.button("Cancelar Cadastro / Voltar para Lista"):
-                del st.session_state['edit_vehicle_id']
-                st.rerun()
-                return
+            st.button("Cancelar Cadastro / Voltar para Lista", on_click=stop_editing, args=('edit_vehicle_id',))
 
         else: # MODO EDIÇÃO
             submit_label = 'Atualizar Veículo'
@@ -684,17 +569,14 @@ def manage_vehicle_form():
             except:
                 st.error("Dados do veículo não encontrados para edição.")
                 del st.session_state['edit_vehicle_id']
-                st.rerun()
+                rerun_cadastro()
                 return
 
             data = selected_row.to_dict()
             data['data_compra'] = pd.to_datetime(data['data_compra'], errors='coerce').date() if pd.notna(data['data_compra']) else date.today()
 
             st.header(f"✏️ Editando Veículo ID: {vehicle_id_to_edit}")
-            if st.button("Cancelar Edição / Voltar para Lista"):
-                del st.session_state['edit_vehicle_id']
-                st.rerun()
-                return
+            st.button("Cancelar Edição / Voltar para Lista", on_click=stop_editing, args=('edit_vehicle_id',))
 
         with st.form(key='manage_vehicle_form_edit'):
             st.caption("Informações Básicas")
@@ -754,9 +636,7 @@ def manage_prestador_form():
         st.write("")
         _, col_button = st.columns([0.8, 0.2])
         with col_button:
-            if st.button("➕ Novo Prestador", key="btn_novo_prestador_lista", help="Iniciar um novo cadastro de prestador"):
-                st.session_state['edit_prestador_id'] = 'NEW_MODE'
-                st.rerun()
+            st.button("➕ Novo Prestador", key="btn_novo_prestador_lista", help="Iniciar um novo cadastro de prestador", on_click=start_editing, args=('edit_prestador_id', 'NEW_MODE'))
 
     if is_editing or st.session_state.get('edit_prestador_id') == 'NEW_MODE':
 
@@ -770,10 +650,7 @@ def manage_prestador_form():
                 'empresa': '', 'telefone': '', 'nome_prestador': '', 'cnpj': '', 'email': '',
                 'endereco': '', 'numero': '', 'cidade': '', 'bairro': '', 'cep': ''
             }
-            if st.button("Cancelar Cadastro / Voltar para Lista"):
-                del st.session_state['edit_prestador_id']
-                st.rerun()
-                return
+            st.button("Cancelar Cadastro / Voltar para Lista", on_click=stop_editing, args=('edit_prestador_id',))
 
         else: # MODO EDIÇÃO
             submit_label = 'Atualizar Prestador'
@@ -782,16 +659,13 @@ def manage_prestador_form():
             except:
                 st.error("Dados do prestador não encontrados para edição.")
                 del st.session_state['edit_prestador_id']
-                st.rerun()
+                rerun_cadastro()
                 return
 
             data = selected_row.to_dict()
             st.header(f"✏️ Editando Prestador ID: {prestador_id_to_edit}")
 
-            if st.button("Cancelar Edição / Voltar para Lista"):
-                del st.session_state['edit_prestador_id']
-                st.rerun()
-                return
+            st.button("Cancelar Edição / Voltar para Lista", on_click=stop_editing, args=('edit_prestador_id',))
 
         with st.form(key='manage_prestador_form_edit'):
             st.caption("Dados da Empresa")
@@ -853,18 +727,13 @@ def manage_prestador_form():
 def manage_service_form():
     """Gerencia o fluxo de Novo Cadastro, Edição e Listagem/Filtro de Serviços."""
 
-    df_veiculos = get_data("veiculo").sort_values(by='nome')
-    df_prestadores = get_data("prestador").sort_values(by='empresa')
+    # 🔎 Seletores alimentados pelo índice de busca (sem varrer as tabelas a cada rerun)
+    vehicle_index, prestador_index = get_search_indexes()
 
-    if df_veiculos.empty or df_prestadores.empty:
+    if not vehicle_index or not prestador_index:
         st.warning("⚠️ Por favor, cadastre pelo menos um veículo e um prestador primeiro.")
         return
 
-    df_veiculos['display_name'] = df_veiculos['nome'] + ' (' + df_veiculos['placa'] + ')'
-    veiculos_map = pd.Series(df_veiculos.id_veiculo.values, index=df_veiculos.display_name).to_dict()
-    veiculos_nomes = list(df_veiculos['display_name'])
-    prestadores_nomes = list(df_prestadores['empresa'])
-
     service_id_to_edit = st.session_state.get('edit_service_id', None)
     is_editing = service_id_to_edit is not None
 
@@ -873,9 +742,7 @@ def manage_service_form():
         st.write("")
         _, col_button = st.columns([0.8, 0.2])
         with col_button:
-            if st.button("➕ Novo Serviço", key="btn_novo_servico_lista", help="Iniciar um novo cadastro de serviço"):
-                st.session_state['edit_service_id'] = 'NEW_MODE'
-                st.rerun()
+            st.button("➕ Novo Serviço", key="btn_novo_servico_lista", help="Iniciar um novo cadastro de serviço", on_click=start_editing, args=('edit_service_id', 'NEW_MODE'))
 
     if is_editing or st.session_state.get('edit_service_id') == 'NEW_MODE':
 
@@ -888,13 +755,10 @@ def manage_service_form():
                 'nome_servico': '', 'registro': '', 'data_servico': date.today(),
                 'garantia_dias': 90, 'valor': 0.0, 'km_realizado': 0, 'km_proxima_revisao': 0
             }
-            selected_vehicle_idx = 0
-            selected_prestador_idx = 0
+            current_vehicle_name = None
+            current_prestador_name = None
 
-            if st.button("Cancelar Cadastro / Voltar para Lista"):
-                del st.session_state['edit_service_id']
-                st.rerun()
-                return
+            st.button("Cancelar Cadastro / Voltar para Lista", on_click=stop_editing, args=('edit_service_id',))
 
         else: # MODO EDIÇÃO
             submit_label = 'Atualizar Serviço'
@@ -908,7 +772,7 @@ def manage_service_form():
             if df_data.empty:
                 st.error("Dados do serviço não encontrados para edição.")
                 del st.session_state['edit_service_id']
-                st.rerun()
+                rerun_cadastro()
                 return
 
             data = df_data.iloc[0].to_dict()
@@ -917,27 +781,38 @@ def manage_service_form():
             current_id_veiculo = int(data['id_veiculo'])
             current_id_prestador = int(data['id_prestador'])
 
-            current_vehicle_row = df_veiculos[df_veiculos['id_veiculo'] == current_id_veiculo].iloc[0]
-            current_vehicle_name = current_vehicle_row['display_name']
+            current_vehicle_name = vehicle_index.label(current_id_veiculo)
+            current_prestador_name = prestador_index.label(current_id_prestador)
 
-            current_prestador_name = df_prestadores[df_prestadores['id_prestador'] == current_id_prestador].iloc[0]['empresa']
+            data['data_servico'] = pd.to_datetime(data['data_servico'], errors='coerce').date() if pd.notna(data['data_servico']) else date.today()
 
-            selected_vehicle_idx = veiculos_nomes.index(current_vehicle_name)
-            selected_prestador_idx = prestadores_nomes.index(current_prestador_name) if current_prestador_name in prestadores_nomes else 0
+            st.button("Cancelar Edição / Voltar para Lista", on_click=stop_editing, args=('edit_service_id',))
 
-            data['data_servico'] = pd.to_datetime(data['data_servico'], errors='coerce').date() if pd.notna(data['data_servico']) else date.today()
+        # --- BUSCA (fora do formulário, para atualizar as opções ao pressionar Enter) ---
+        st.caption("Veículo e Prestador")
+        col_busca1, col_busca2 = st.columns(2)
+        with col_busca1:
+            vehicle_query = st.text_input("🔎 Buscar veículo", key='service_vehicle_query', placeholder="Nome ou placa")
+        with col_busca2:
+            company_query = st.text_input("🔎 Buscar empresa", key='service_company_query', placeholder="Nome, cidade ou CNPJ")
 
-            if st.button("Cancelar Edição / Voltar para Lista"):
-                del st.session_state['edit_service_id']
-                st.rerun()
-                return
+        veiculos_nomes = vehicle_index.search(vehicle_query, limit=SEARCH_RESULTS_LIMIT)
+        prestadores_nomes = prestador_index.search(company_query, limit=SEARCH_RESULTS_LIMIT)
+
+        # Na edição, a seleção atual continua disponível mesmo fora dos resultados
+        if current_vehicle_name and current_vehicle_name not in veiculos_nomes:
+            veiculos_nomes.insert(0, current_vehicle_name)
+        if current_prestador_name and current_prestador_name not in prestadores_nomes:
+            prestadores_nomes.insert(0, current_prestador_name)
+
+        selected_vehicle_idx = veiculos_nomes.index(current_vehicle_name) if current_vehicle_name in veiculos_nomes else 0
+        selected_prestador_idx = prestadores_nomes.index(current_prestador_name) if current_prestador_name in prestadores_nomes else 0
 
         # --- FORMULÁRIO (Novo Cadastro ou Edição) ---
         with st.form(key='manage_service_form_edit'):
 
-            st.caption("Veículo e Prestador")
-            selected_vehicle = st.selectbox("Veículo", veiculos_nomes, index=selected_vehicle_idx, key="edit_service_vehicle", help="Comece a digitar para buscar o veículo.")
-            selected_company_name = st.selectbox("Nome da Empresa/Oficina", prestadores_nomes, index=selected_prestador_idx, key='edit_service_company', help="Comece a digitar para buscar a empresa.")
+            selected_vehicle = st.selectbox("Veículo", veiculos_nomes, index=selected_vehicle_idx, key="edit_service_vehicle", help="Use a busca acima para filtrar os veículos.")
+            selected_company_name = st.selectbox("Nome da Empresa/Oficina", prestadores_nomes, index=selected_prestador_idx, key='edit_service_company', help="Use a busca acima para filtrar as empresas.")
 
             st.caption("Detalhes do Serviço")
             service_name = st.text_input("Nome do Serviço", value=data['nome_servico'], max_chars=100)
@@ -964,6 +839,9 @@ def manage_service_form():
             submit_button = st.form_submit_button(label=submit_label)
 
             if submit_button:
+                if not selected_vehicle:
+                    st.error("Por favor, selecione um Veículo válido.")
+                    return
                 if not selected_company_name:
                     st.error("Por favor, selecione uma Empresa/Oficina válida.")
                     return
@@ -971,9 +849,8 @@ def manage_service_form():
                     st.warning("Preencha o Nome do Serviço.")
                     return
 
-                new_id_veiculo = int(veiculos_map[selected_vehicle])
-                prestador_row = df_prestadores[df_prestadores['empresa'] == selected_company_name]
-                new_id_prestador = int(prestador_row.iloc[0]['id_prestador'])
+                new_id_veiculo = int(vehicle_index.resolve(selected_vehicle))
+                new_id_prestador = int(prestador_index.resolve(selected_company_name))
 
                 args_service = (
                     new_id_veiculo, new_id_prestador, service_name, service_date, garantia,
@@ -1008,18 +885,93 @@ def manage_service_form():
             st.info("Nenhum serviço encontrado no período selecionado.")
 
 
-# --- Layout Principal do Streamlit ---
+BULK_EDIT_TABLES = {"Veículo": 'veiculo', "Prestador": 'prestador', "Serviço": 'servico'}
 
 
-def main():
+def manage_bulk_edit():
+    """Grade editável de uma tabela inteira; só as diferenças são gravadas, em um lote por aba."""
+    st.subheader("Edição em Lote")
+    label = st.selectbox("Tabela:", list(BULK_EDIT_TABLES), key='bulk_edit_table')
+    sheet_name = BULK_EDIT_TABLES[label]
+    id_col = f'id_{sheet_name}'
 
-    # 🚨 PASSO 1: INJETAR O CSS PERSONALIZADO (APLICA O TRUQUE DE RESPONSIVIDADE)
-    st.markdown(f"<style>{CUSTOM_CSS}</style>", unsafe_allow_html=True)
+    df_base = get_data(sheet_name)
+    try:
+        check_unique_ids(sheet_name, df_base)
+    except ValidationError as e:
+        st.warning(f"⚠️ {e}")
+        return
+    st.caption("Edite as células, adicione linhas no fim da grade ou exclua linhas selecionadas. Nada é gravado até clicar em Salvar.")
+    df_edited = st.data_editor(
+        df_base,
+        key=f"bulk_editor_{sheet_name}_{st.session_state.get('bulk_edit_version', 0)}",
+        num_rows='dynamic', hide_index=True, width='stretch',
+        disabled=[id_col, *DERIVED_COLS.get(sheet_name, [])],
+    )
+
+    changes = diff_table(sheet_name, df_base, df_edited)
+    if not has_changes(changes):
+        st.info("Nenhuma alteração pendente.")
+        return
+
+    updated = changes['updated']
+    st.write(
+        f"**Pendente:** {updated.index.get_level_values(0).nunique()} linha(s) alterada(s) ({len(updated)} célula(s)), "
+        f"{len(changes['inserted'])} nova(s), {len(changes['deleted'])} excluída(s)."
+    )
+    col_save, col_discard = st.columns(2)
+    if col_save.button("💾 Salvar Alterações", key='bulk_edit_save', type="primary"):
+        save_table_edits(sheet_name, df_base, df_edited)
+    col_discard.button("Descartar", key='bulk_edit_discard', on_click=discard_table_edits)
+
+
+@st.fragment
+def cadastro_fragment():
+    """Aba de cadastro: cliques nas linhas, confirmações e formulários reexecutam só esta região."""
+    apply_session_tenant()  # o rerun do fragmento não passa por main()
+    st.header("Gestão de Dados (Cadastro e Edição)")
+
+    undo = st.session_state.get('undo_delete')
+    if undo:
+        col_msg, col_undo, col_dismiss = st.columns([6, 2, 1])
+        col_msg.info(f"{undo['label']} ID {undo['id']} excluído.")
+        if col_undo.button("↩️ Desfazer", key='btn_undo_delete'):
+            undo_delete()
+        col_dismiss.button("✖", key='btn_dismiss_undo', on_click=dismiss_undo)
+
+    if 'cadastro_choice_unificado' not in st.session_state:
+        st.session_state.cadastro_choice_unificado = "Veículo"
+
+    choice = st.radio("Selecione a Tabela para Gerenciar:", ["Veículo", "Prestador", "Serviço", "Edição em Lote"], horizontal=True, key='cadastro_choice_unificado')
+    st.markdown("---")
+
+    if choice == "Veículo":
+        manage_vehicle_form()
+    elif choice == "Prestador":
+        manage_prestador_form()
+    elif choice == "Serviço":
+        manage_service_form()
+    elif choice == "Edição em Lote":
+        manage_bulk_edit()
 
 
+# --- Layout Principal do Streamlit ---
+
+
+def main():
+
     # Configuração de Página
     st.set_page_config(page_title="Controle Automotivo", layout="wide")
+
+    # 🚨 PASSO 1: INJETAR O CSS PERSONALIZADO (APLICA O TRUQUE DE RESPONSIVIDADE)
+    st.markdown(f"<style>{CUSTOM_CSS}</style>", unsafe_allow_html=True)
     st.title("🚗 Sistema de Controle Automotivo")
+    data_age_slot = st.empty()  # preenchido no fim, depois das leituras
+
+    # Só guarda as credenciais: autenticação e abertura da planilha ficam para a
+    # primeira leitura, depois que o cabeçalho da página já foi enviado
+    configure_data_layer()
+    select_tenant()
 
 
     # Inicialização do State
@@ -1042,23 +994,68 @@ def main():
         st.header("Resumo de Gastos por Veículo")
 
 
-        df_merged = get_full_service_data()
-
+        # Totais combinados a partir dos agregados de cada partição
+        resumo = get_spend_by_vehicle()
 
-        if not df_merged.empty:
-            df_resumo_raw = df_merged[['Veículo', 'Valor']].copy()
-
-            resumo = df_resumo_raw.groupby('Veículo')['Valor'].sum().sort_values(ascending=False).reset_index()
-            resumo.columns = ['Veículo', 'Total Gasto em Serviços']
 
+        if not resumo.empty:
             # Formata para R$
-            resumo['Total Gasto em Serviços'] = resumo['Total Gasto em Serviços'].apply(lambda x: f'R$ {x:,.2f}'.replace('.', 'X').replace(',', '.').replace('X', ','))
+            resumo['Total Gasto em Serviços'] = format_currency(resumo['Total Gasto em Serviços'])
 
             st.dataframe(resumo, hide_index=True, width='stretch')
 
         else:
             st.info("Nenhum dado de serviço encontrado para calcular o resumo.")
 
+        # 📈 Análises da frota (custo por km, tendências e gasto por prestador)
+        analises = get_fleet_analytics()
+
+        if analises:
+            st.subheader("Custo por KM")
+            custo_km = analises['custo_por_km'].copy()
+            custo_km['Total Gasto'] = format_currency(custo_km['Total Gasto'])
+            st.dataframe(custo_km, hide_index=True, width='stretch', column_config={
+                'KM Rodados': st.column_config.NumberColumn(format="%d"),
+                'Custo por KM': st.column_config.NumberColumn(format="R$ %.2f"),
+            })
+
+            st.subheader("Gasto Mensal da Frota")
+            st.line_chart(analises['mensal'], x='Mês', y=['Gasto no Mês', 'Últimos 12 Meses'])
+
+            st.subheader("Gasto Anual por Veículo")
+            anual = analises['anual']
+            st.dataframe(anual, hide_index=True, width='stretch', column_config={
+                ano: st.column_config.NumberColumn(format="R$ %.2f") for ano in anual.columns if ano != 'Veículo'
+            })
+
+            col_prestador, col_cidade = st.columns(2)
+            with col_prestador:
+                st.subheader("Gasto por Prestador")
+                por_prestador = analises['por_prestador'].copy()
+                por_prestador['Total Gasto'] = format_currency(por_prestador['Total Gasto'])
+                st.dataframe(por_prestador, hide_index=True, width='stretch')
+            with col_cidade:
+                st.subheader("Gasto por Cidade")
+                por_cidade = analises['por_cidade'].copy()
+                por_cidade['Total Gasto'] = format_currency(por_cidade['Total Gasto'])
+                st.dataframe(por_cidade, hide_index=True, width='stretch')
+
+        # 🗓️ Calendário de manutenção: quando cada veículo deve chegar ao KM da próxima revisão
+        previsao = get_maintenance_forecast()
+
+        if not previsao.empty:
+            st.subheader("🗓️ Próximas Revisões (previsão pelo KM)")
+            st.caption("Ritmo de uso (KM/dia) estimado pelo histórico de KM de cada veículo; revisões com dias negativos estão atrasadas.")
+            st.dataframe(previsao.drop(columns='id_veiculo'), hide_index=True, width='stretch', column_config={
+                'Última Leitura': st.column_config.DateColumn(format=DATE_COLUMN_FORMAT),
+                'Data Prevista': st.column_config.DateColumn(format=DATE_COLUMN_FORMAT),
+                'KM Última Leitura': st.column_config.NumberColumn(format="%d"),
+                'KM/dia': st.column_config.NumberColumn(format="%.1f"),
+                'KM Estimado Hoje': st.column_config.NumberColumn(format="%d"),
+                'KM Próxima Revisão': st.column_config.NumberColumn(format="%d"),
+                'Dias para a Revisão': st.column_config.NumberColumn(format="%d"),
+            })
+
 
     # ----------------------------------------------------
     # 2. DASHBOARD: HISTÓRICO DETALHADO
@@ -1079,22 +1076,23 @@ def main():
             # Agora a linha funciona corretamente:
             df_historico['Dias para Vencer'] = (df_historico['data_vencimento'] - pd.to_datetime(date.today())).dt.days
 
-            # Formatação de colunas
-            df_historico['Data Serviço'] = df_historico['Data'].dt.strftime('%d-%m-%Y')
-            df_historico['Data Vencimento'] = df_historico['data_vencimento'].dt.strftime('%d-%m-%Y')
-
-            # O valor já é float, basta formatar.
-            df_historico['Valor'] = df_historico['Valor'].apply(lambda x: f'R$ {x:,.2f}'.replace('.', 'X').replace(',', '.').replace('X', ','))
+            # Formatação de colunas: datas continuam datetime (formatadas pelo column_config,
+            # ordenam como data); o valor vira texto R$ em uma operação sobre a coluna
+            df_historico['Valor'] = format_currency(df_historico['Valor'])
 
             # Seleção final das colunas
             df_historico_display = df_historico[[
-                'Veículo', 'Serviço', 'Empresa', 'Data Serviço', 'Data Vencimento',
+                'Veículo', 'Serviço', 'Empresa', 'Data', 'data_vencimento',
                 'Dias para Vencer', 'Cidade', 'Valor', 'km_realizado', 'km_proxima_revisao'
             ]].rename(columns={
+                'Data': 'Data Serviço', 'data_vencimento': 'Data Vencimento',
                 'km_realizado': 'KM Realizado', 'km_proxima_revisao': 'KM Próxima Revisão'
             })
 
-            st.dataframe(df_historico_display, width='stretch', hide_index=True)
+            st.dataframe(df_historico_display, width='stretch', hide_index=True, column_config={
+                'Data Serviço': st.column_config.DateColumn(format=DATE_COLUMN_FORMAT),
+                'Data Vencimento': st.column_config.DateColumn(format=DATE_COLUMN_FORMAT),
+            })
 
         else:
             st.info("Nenhum serviço encontrado. Por favor, cadastre um serviço na aba 'Cadastro'.")
@@ -1104,21 +1102,12 @@ def main():
     # 3. CADASTRO / MANUTENÇÃO UNIFICADA
     # ----------------------------------------------------
     with tab_cadastro:
-        st.header("Gestão de Dados (Cadastro e Edição)")
-
-        if 'cadastro_choice_unificado' not in st.session_state:
-            st.session_state.cadastro_choice_unificado = "Veículo"
-
-        choice = st.radio("Selecione a Tabela para Gerenciar:", ["Veículo", "Prestador", "Serviço"], horizontal=True, key='cadastro_choice_unificado')
-        st.markdown("---")
+        cadastro_fragment()
 
-        if choice == "Veículo":
-            manage_vehicle_form()
-        elif choice == "Prestador":
-            manage_prestador_form()
-        elif choice == "Serviço":
-            manage_service_form()
+    show_data_age(data_age_slot)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    with dados.startup.timed('first_render'):
+        main()
+    dados.startup.log_startup_report()
\ No newline at end of file
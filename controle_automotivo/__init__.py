@@ -0,0 +1,27 @@
+"""Camada de dados do Sistema de Controle Automotivo (Google Sheets), sem Streamlit.
+
+Pode ser usada pelo app, pela CLI (`python -m controle_automotivo`) ou por jobs:
+
+    import controle_automotivo as ca
+    ca.configure(credentials=dict_da_service_account)
+    df = ca.get_data('veiculo')
+"""
+
+from . import config, startup
+from .analytics import get_fleet_analytics
+from .cache import clear_all as clear_data_caches
+from .changelog import compact_change_log
+from .errors import CredentialsError, DataAccessError, RecordNotFoundError, SheetNotFoundError, ValidationError
+from .forecast import get_maintenance_forecast
+from .integrity import check_integrity, repair_integrity
+from .partitions import partition_service_sheet
+from .purge import purge_deleted, start_purge_worker
+from .search import SearchIndex, get_prestador_index, get_vehicle_index
+from .services import apply_table_edits, build_service_record, bulk_upsert, execute_crud_operation, restore_record
+from .sheets import configure, get_gspread_client, is_configured, write_sheet_data
+from .sync import start_sync_worker, sync_replica
+from .tables import (
+    get_data, get_data_age, get_due_services, get_full_service_data, get_service_data, get_sheet_data, get_spend_by_vehicle,
+)
+from .tenants import allowed_tenants, current_tenant, list_tenants, restricted_tenants, set_tenant, use_tenant
+from .unit_of_work import UnitOfWork
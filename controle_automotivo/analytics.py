@@ -0,0 +1,147 @@
+"""📈 Análises de custo da frota (custo por km, tendências mensais/anuais, gasto por prestador).
+
+Tudo é calculado com operações agrupadas do pandas/NumPy (sem laços por linha) e
+guardado por versão dos dados: enquanto as abas não mudam, os relatórios são
+reaproveitados entre reruns e sessões.
+"""
+
+import pandas as pd
+
+from .cache import VersionedCache
+from .tables import data_version, get_data
+
+_reports = VersionedCache(maxsize=4)
+
+
+def prepare_services(df_servicos):
+    """Colunas numéricas/datas da tabela de serviços prontas para agregação."""
+    return pd.DataFrame({
+        'id_veiculo': pd.to_numeric(df_servicos['id_veiculo'], errors='coerce').fillna(0).astype(int),
+        'id_prestador': pd.to_numeric(df_servicos['id_prestador'], errors='coerce').fillna(0).astype(int),
+        'data': pd.to_datetime(df_servicos['data_servico'], errors='coerce'),
+        'valor': pd.to_numeric(df_servicos['valor'], errors='coerce').fillna(0.0),
+        # KM zerado = não informado
+        'km': pd.to_numeric(df_servicos['km_realizado'], errors='coerce').where(lambda km: km > 0),
+    })
+
+
+def _vehicle_names(df_veiculos):
+    return pd.Series(
+        df_veiculos['nome'].to_numpy(),
+        index=pd.to_numeric(df_veiculos['id_veiculo'], errors='coerce').fillna(0).astype(int),
+    )
+
+
+def cost_per_km(df, df_veiculos):
+    """Custo por km de cada veículo.
+
+    Os km rodados são a soma dos deltas positivos de km_realizado entre serviços
+    consecutivos (em ordem de data); leituras menores que a anterior são ignoradas.
+    Serviços sem km (vazio ou 0, o padrão do formulário) entram no gasto, mas não
+    nos deltas: as leituras [1000, 0, 3000] somam 2000 km.
+    """
+    df = df.sort_values(['id_veiculo', 'data'], kind='stable')
+    # Odômetro não diminui: o delta é calculado sobre o máximo acumulado, só entre leituras válidas
+    readings = df[df['km'].notna() & (df['km'] > 0)]
+    km = readings['km'].groupby(readings['id_veiculo']).cummax()
+    km_delta = km.groupby(readings['id_veiculo']).diff().clip(lower=0)
+
+    result = pd.DataFrame({
+        'Total Gasto': df.groupby('id_veiculo')['valor'].sum(),
+        'Serviços': df.groupby('id_veiculo').size(),
+        'KM Rodados': km_delta.groupby(readings['id_veiculo']).sum(),
+    })
+    result['KM Rodados'] = result['KM Rodados'].fillna(0.0)
+    result['Custo por KM'] = result['Total Gasto'] / result['KM Rodados'].where(result['KM Rodados'] > 0)
+    result.insert(0, 'Veículo', _vehicle_names(df_veiculos).reindex(result.index))
+    return result.sort_values('Total Gasto', ascending=False).reset_index(drop=True)
+
+
+def monthly_spend(df):
+    """Gasto da frota por mês (meses sem serviço entram com zero) e total móvel de 12 meses."""
+    df = df[df['data'].notna()]
+    if df.empty:
+        return pd.DataFrame(columns=['Mês', 'Gasto no Mês', 'Últimos 12 Meses'])
+
+    months = df['data'].dt.to_period('M')
+    totals = df.groupby(months)['valor'].sum()
+    totals = totals.reindex(pd.period_range(totals.index.min(), totals.index.max(), freq='M'), fill_value=0.0)
+    return pd.DataFrame({
+        'Mês': totals.index.to_timestamp(),
+        'Gasto no Mês': totals.to_numpy(),
+        'Últimos 12 Meses': totals.rolling(12, min_periods=1).sum().to_numpy(),
+    })
+
+
+def rolling_12m_by_vehicle(df, df_veiculos):
+    """Gasto dos últimos 12 meses de cada veículo, mês a mês (matriz mês x veículo)."""
+    df = df[df['data'].notna()]
+    if df.empty:
+        return pd.DataFrame()
+
+    months = df['data'].dt.to_period('M')
+    pivot = df.pivot_table(index=months, columns='id_veiculo', values='valor', aggfunc='sum', fill_value=0.0)
+    pivot = pivot.reindex(pd.period_range(pivot.index.min(), pivot.index.max(), freq='M'), fill_value=0.0)
+    rolling = pivot.rolling(12, min_periods=1).sum()
+    rolling.index = rolling.index.to_timestamp()
+    rolling.index.name = 'Mês'
+    rolling.columns = _vehicle_names(df_veiculos).reindex(rolling.columns).fillna('').to_numpy()
+    return rolling
+
+
+def yearly_spend(df, df_veiculos):
+    """Gasto por veículo e ano (uma coluna por ano)."""
+    df = df[df['data'].notna()]
+    if df.empty:
+        return pd.DataFrame()
+
+    pivot = df.pivot_table(index='id_veiculo', columns=df['data'].dt.year.rename('Ano'), values='valor', aggfunc='sum', fill_value=0.0)
+    pivot.columns = pivot.columns.astype(str).rename(None)
+    pivot.insert(0, 'Veículo', _vehicle_names(df_veiculos).reindex(pivot.index))
+    return pivot.reset_index(drop=True)
+
+
+def spend_by_prestador(df, df_prestadores):
+    """Gasto e nº de serviços por prestador (com a cidade do prestador)."""
+    df_prestadores = pd.DataFrame({
+        'id_prestador': pd.to_numeric(df_prestadores['id_prestador'], errors='coerce').fillna(0).astype(int),
+        'Empresa': df_prestadores['empresa'].to_numpy(),
+        'Cidade': df_prestadores['cidade'].fillna('').astype(str).str.strip().to_numpy(),
+    })
+    totals = df.groupby('id_prestador')['valor'].agg(['sum', 'size']).rename(columns={'sum': 'Total Gasto', 'size': 'Serviços'})
+    result = df_prestadores.merge(totals, left_on='id_prestador', right_index=True, how='inner')
+    return result.drop(columns='id_prestador').sort_values('Total Gasto', ascending=False).reset_index(drop=True)
+
+
+def spend_by_cidade(df_by_prestador):
+    """Gasto e nº de serviços por cidade, a partir do gasto por prestador."""
+    cidades = df_by_prestador['Cidade'].replace('', 'Não informada')
+    result = df_by_prestador.groupby(cidades)[['Total Gasto', 'Serviços']].sum()
+    return result.sort_values('Total Gasto', ascending=False).rename_axis('Cidade').reset_index()
+
+
+def build_fleet_analytics(df_servicos, df_veiculos, df_prestadores):
+    """Calcula todos os relatórios de frota a partir das três tabelas."""
+    if df_servicos.empty:
+        return {}
+    df = prepare_services(df_servicos)
+    by_prestador = spend_by_prestador(df, df_prestadores)
+    return {
+        'custo_por_km': cost_per_km(df, df_veiculos),
+        'mensal': monthly_spend(df),
+        'movel_12_meses': rolling_12m_by_vehicle(df, df_veiculos),
+        'anual': yearly_spend(df, df_veiculos),
+        'por_prestador': by_prestador,
+        'por_cidade': spend_by_cidade(by_prestador),
+    }
+
+
+def get_fleet_analytics():
+    """Relatórios de custo da frota para a versão atual dos dados: {nome: DataFrame}.
+
+    Os DataFrames são compartilhados entre chamadas; copie antes de alterar.
+    """
+    sheets = ('servico', 'veiculo', 'prestador')
+    return dict(_reports.get_or_build(
+        'frota', lambda: data_version(*sheets), lambda: [get_data(name) for name in sheets], build_fleet_analytics,
+    ))
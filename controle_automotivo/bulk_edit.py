@@ -0,0 +1,195 @@
+"""✏️ Edição em lote: diferença entre a grade editada e a tabela, validação vetorizada.
+
+A grade (st.data_editor) devolve a tabela inteira editada; aqui ela é comparada
+com o DataFrame que a originou, coluna a coluna e sem laços por linha, e só o que
+mudou (linhas novas, excluídas e células alteradas) segue para a gravação.
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .errors import ValidationError
+from .sheets import get_id_col
+
+# Colunas obrigatórias (não podem ficar em branco) e únicas (quando preenchidas)
+REQUIRED_COLS = {'veiculo': ['nome'], 'prestador': ['empresa'], 'servico': ['nome_servico']}
+UNIQUE_COLS = {'veiculo': ['placa'], 'prestador': ['empresa']}
+
+# Colunas calculadas a partir de outras (não editáveis na grade)
+DERIVED_COLS = {'servico': ['data_vencimento']}
+
+# Quantos IDs citar nas mensagens de erro
+_MAX_IDS_IN_MESSAGE = 5
+
+
+def editable_columns(sheet_name):
+    """Colunas que a grade pode alterar (sem o ID e sem as calculadas)."""
+    id_col = get_id_col(sheet_name)
+    derived = DERIVED_COLS.get(sheet_name, [])
+    return [col for col in config.EXPECTED_COLS[sheet_name] if col != id_col and col not in derived]
+
+
+def _as_ids(values):
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype(int)
+
+
+def _normalize(base, edited):
+    """Converte a coluna editada para o tipo da coluna original (as duas alinhadas por ID)."""
+    if pd.api.types.is_datetime64_any_dtype(base):
+        return pd.to_datetime(edited, errors='coerce')
+    if pd.api.types.is_integer_dtype(base):
+        return pd.to_numeric(edited, errors='coerce').fillna(0).astype(int)
+    if pd.api.types.is_numeric_dtype(base):
+        return pd.to_numeric(edited, errors='coerce').astype(float)
+    return edited.astype(object).where(edited.notna(), '')
+
+
+def _changed(base, edited):
+    """Máscara das células diferentes (NaN/NaT/vazio contam como iguais entre si)."""
+    if pd.api.types.is_datetime64_any_dtype(base):
+        return ~((base == edited) | (base.isna() & edited.isna()))
+    if pd.api.types.is_numeric_dtype(base):
+        a, b = base.to_numpy(dtype=float), edited.to_numpy(dtype=float)
+        return pd.Series(~(np.isclose(a, b) | (np.isnan(a) & np.isnan(b))), index=base.index)
+    return base.fillna('').astype(str) != edited.fillna('').astype(str)
+
+
+def _service_due_dates(df):
+    """data_vencimento = data_servico + garantia_dias (vetorizado)."""
+    garantia = pd.to_numeric(df['garantia_dias'], errors='coerce').fillna(0).astype(int)
+    return pd.to_datetime(df['data_servico'], errors='coerce') + pd.to_timedelta(garantia, unit='D')
+
+
+def check_unique_ids(sheet_name, df):
+    """Levanta ValidationError se a tabela tem IDs repetidos ou linhas sem ID válido.
+
+    A diferença alinha as linhas pelo ID: com IDs repetidos uma linha editada seria
+    comparada com outra linha da tabela, e uma linha sem ID se confundiria com as novas.
+    """
+    id_col = get_id_col(sheet_name)
+    ids = _as_ids(df[id_col]) if id_col in df.columns else pd.Series(dtype=int)
+    repeated = sorted(ids[(ids > 0) & ids.duplicated()].unique())
+    blank = int((ids <= 0).sum())
+    if repeated or blank:
+        problems = [f"IDs repetidos: {_format_ids(repeated)}"] if repeated else []
+        problems += [f"{blank} linha(s) sem ID válido"] if blank else []
+        raise ValidationError(
+            f"A tabela não pode ser editada em lote ({'; '.join(problems)}). "
+            "Corrija com o reparo de integridade antes."
+        )
+
+
+def diff_table(sheet_name, df_base, df_edited):
+    """Compara a grade editada com a tabela de origem.
+
+    Retorna {'inserted': DataFrame das linhas novas, 'deleted': [IDs removidos],
+    'updated': Series com o novo valor de cada célula alterada, indexada por (id, coluna)}.
+    IDs repetidos na tabela de origem ou entre as linhas editadas levantam ValidationError.
+    """
+    id_col = get_id_col(sheet_name)
+    columns = [col for col in editable_columns(sheet_name) if col in df_base.columns and col in df_edited.columns]
+
+    check_unique_ids(sheet_name, df_base)
+    base_ids = _as_ids(df_base[id_col])
+    edited_ids = _as_ids(df_edited[id_col]) if id_col in df_edited.columns else pd.Series(0, index=df_edited.index)
+
+    # Linhas sem ID (ou com ID que não veio da tabela) são novas
+    is_new = ~edited_ids.isin(base_ids)
+    inserted = df_edited.loc[is_new, columns].reset_index(drop=True)
+    deleted = base_ids[~base_ids.isin(edited_ids)].tolist()
+
+    base = df_base.set_axis(base_ids, axis=0)
+    kept = df_edited.loc[~is_new].set_axis(edited_ids[~is_new], axis=0)
+    check_unique_ids(sheet_name, kept.assign(**{id_col: kept.index}))
+    base = base.loc[kept.index]
+
+    pieces = []
+    after = {}
+    for col in columns:
+        new_values = _normalize(base[col], kept[col])
+        after[col] = new_values
+        mask = _changed(base[col], new_values)
+        if mask.any():
+            changed = new_values[mask]
+            pieces.append(pd.Series(changed.to_numpy(dtype=object), index=pd.MultiIndex.from_arrays([changed.index, [col] * len(changed)])))
+
+    # Colunas calculadas acompanham as colunas de origem
+    if sheet_name == 'servico' and {'data_servico', 'garantia_dias', 'data_vencimento'} <= set(base.columns) and {'data_servico', 'garantia_dias'} <= set(after):
+        due = _service_due_dates(pd.DataFrame(after))
+        mask = _changed(pd.to_datetime(base['data_vencimento'], errors='coerce'), due)
+        if mask.any():
+            changed = due[mask]
+            pieces.append(pd.Series(changed.to_numpy(dtype=object), index=pd.MultiIndex.from_arrays([changed.index, ['data_vencimento'] * len(changed)])))
+
+    updated = pd.concat(pieces) if pieces else pd.Series(dtype=object, index=pd.MultiIndex.from_arrays([[], []]))
+    if sheet_name == 'servico' and not inserted.empty and {'data_servico', 'garantia_dias'} <= set(inserted.columns):
+        inserted['data_servico'] = pd.to_datetime(inserted['data_servico'], errors='coerce')
+        inserted['data_vencimento'] = _service_due_dates(inserted)
+    return {'inserted': inserted, 'updated': updated, 'deleted': deleted}
+
+
+def has_changes(changes):
+    """True se a diferença tem alguma linha nova, excluída ou célula alterada."""
+    return not changes['inserted'].empty or not changes['updated'].empty or bool(changes['deleted'])
+
+
+def _format_ids(ids):
+    ids = [str(i) for i in ids]
+    more = f" (e mais {len(ids) - _MAX_IDS_IN_MESSAGE})" if len(ids) > _MAX_IDS_IN_MESSAGE else ''
+    return ', '.join(ids[:_MAX_IDS_IN_MESSAGE]) + more
+
+
+def _touched(sheet_name, changes, df_after):
+    """Linhas (do estado final) que a edição inseriu ou alterou."""
+    id_col = get_id_col(sheet_name)
+    updated_ids = changes['updated'].index.get_level_values(0).unique()
+    df_touched = df_after[df_after[id_col].isin(updated_ids)]
+    return pd.concat([df_touched, changes['inserted'].assign(**{id_col: 0})], ignore_index=True)
+
+
+def validate_table_edits(sheet_name, changes, df_after, related):
+    """Valida a edição em lote inteira de uma vez; levanta ValidationError com todos os problemas.
+
+    `df_after` é a tabela já com as alterações (linhas mantidas e atualizadas) e
+    `related` dá acesso às outras abas (ex.: uow.table) para as chaves estrangeiras.
+    """
+    id_col = get_id_col(sheet_name)
+    df_touched = _touched(sheet_name, changes, df_after)
+    problems = []
+
+    for col in REQUIRED_COLS.get(sheet_name, []):
+        if col in df_touched.columns:
+            blank = df_touched[col].fillna('').astype(str).str.strip() == ''
+            if blank.any():
+                problems.append(f"'{col}' é obrigatório ({blank.sum()} linha(s) em branco).")
+
+    df_all = pd.concat([df_after, changes['inserted']], ignore_index=True)
+    for col in UNIQUE_COLS.get(sheet_name, []):
+        if col in df_all.columns:
+            values = df_all[col].fillna('').astype(str).str.strip()
+            duplicated = values[(values != '') & values.duplicated(keep=False)]
+            clashes = df_touched[col].fillna('').astype(str).str.strip().isin(duplicated)
+            if clashes.any():
+                problems.append(f"'{col}' repetido: {_format_ids(sorted(set(df_touched.loc[clashes, col].astype(str))))}.")
+
+    if sheet_name == 'servico' and not df_touched.empty:
+        for fk, parent in (('id_veiculo', 'veiculo'), ('id_prestador', 'prestador')):
+            df_parent = related(parent)
+            parent_ids = _as_ids(df_parent[get_id_col(parent)]) if not df_parent.empty else pd.Series(dtype=int)
+            missing = ~_as_ids(df_touched[fk]).isin(parent_ids)
+            if missing.any():
+                problems.append(f"'{fk}' inexistente: {_format_ids(sorted(set(_as_ids(df_touched.loc[missing, fk]))))}.")
+        invalid_dates = pd.to_datetime(df_touched['data_servico'], errors='coerce').isna()
+        if invalid_dates.any():
+            problems.append(f"'data_servico' inválida em {invalid_dates.sum()} linha(s).")
+
+    if sheet_name in ('veiculo', 'prestador') and changes['deleted']:
+        df_servicos = related('servico')
+        if not df_servicos.empty:
+            linked = pd.Index(changes['deleted']).intersection(_as_ids(df_servicos[id_col]).unique())
+            if not linked.empty:
+                problems.append(f"Existem serviços vinculados a: {_format_ids(sorted(linked))} ({id_col}).")
+
+    if problems:
+        raise ValidationError("Edição em lote recusada: " + ' '.join(problems))
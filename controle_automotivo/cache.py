@@ -0,0 +1,388 @@
+"""Cache em memória com TTL, substituto do st.cache_data/st.cache_resource.
+
+Os caches ficam por processo (compartilhados entre sessões, como no Streamlit)
+e são registrados por grupo para que clear_all() invalide todos os caches de
+dados após uma gravação.
+
+Os DataFrames em cache não são copiados a cada chamada: cada chamador recebe
+uma visão rasa (novo objeto, mesmos arrays). Os arrays guardados são somente
+leitura, então atribuir uma coluna inteira (df[col] = ...) só muda a visão do
+chamador e uma escrita no lugar (df.loc[...] = ...) levanta ValueError em vez
+de alterar o cache; quem precisa alterar valores copia a coluna antes. Nada
+disso depende do Copy-on-Write global do pandas.
+
+🏢 Com várias frotas, cada entrada é guardada sob a frota atual; a memória das abas
+em cache é somada entre as frotas e, acima de config.TENANT_CACHE_MAX_MB, as frotas
+usadas há mais tempo são descartadas inteiras (LRU).
+"""
+
+import contextlib
+import contextvars
+import functools
+import logging
+import sys
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+
+from . import config, tenants
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_fresh_reads = contextvars.ContextVar('fresh_reads', default=False)
+_tenant_last_used = {}   # frota -> time.monotonic do último acesso
+_evict_hooks = []
+_budget_lock = threading.Lock()
+
+
+def _read_only(column):
+    """Cópia dos valores da coluna com o array marcado como somente leitura."""
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+        return column.array.copy()  # arrays de extensão (ex.: Int64) não têm a marcação
+    array = column.to_numpy(copy=True)
+    array.flags.writeable = False
+    return array
+
+
+def freeze(value):
+    """🧊 DataFrame/Series (ou dict deles) com os arrays somente leitura, para guardar em cache."""
+    if isinstance(value, pd.DataFrame):
+        frozen = pd.DataFrame(
+            {i: _read_only(value.iloc[:, i]) for i in range(value.shape[1])}, index=value.index, copy=False,
+        )
+        frozen.columns = value.columns
+        return frozen
+    if isinstance(value, pd.Series):
+        return pd.Series(_read_only(value), index=value.index, name=value.name, copy=False)
+    if isinstance(value, dict):
+        return {key: freeze(item) for key, item in value.items()}
+    return value
+
+
+def _share(value):
+    """Visão rasa de DataFrame/Series (sem copiar os dados); cópia comum para o resto."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, dict):
+        return {key: _share(item) for key, item in value.items()}
+    return value.copy() if hasattr(value, 'copy') else value
+
+
+def _nbytes(value):
+    """Memória ocupada por um DataFrame/Series em cache (0 para outros objetos).
+
+    Só é medida com várias frotas: deep=True percorre os textos e só o LRU entre frotas a usa.
+    """
+    if not config.TENANTS:
+        return 0
+    if isinstance(value, pd.DataFrame):
+        columns = (value.iloc[:, i] for i in range(value.shape[1]))
+        return int(value.index.memory_usage(deep=True) + sum(_column_nbytes(column) for column in columns))
+    if isinstance(value, pd.Series):
+        return int(value.index.memory_usage(deep=True) + _column_nbytes(value))
+    return 0
+
+
+def _column_nbytes(column):
+    try:
+        return column.memory_usage(index=False, deep=True)
+    except ValueError:
+        # Colunas de texto já congeladas: o pandas não percorre arrays somente leitura
+        return column.memory_usage(index=False) + sum(map(sys.getsizeof, column.to_numpy()))
+
+
+@contextlib.contextmanager
+def fresh_reads():
+    """Dentro do bloco, os caches de dados releem a fonte em vez de servir o que guardam.
+
+    Usado por quem grava (UnitOfWork): IDs novos e posições de linha não podem
+    ser calculados sobre uma leitura antiga. O valor relido também atualiza o cache.
+    """
+    token = _fresh_reads.set(True)
+    try:
+        yield
+    finally:
+        _fresh_reads.reset(token)
+
+
+def reading_fresh():
+    """True dentro de fresh_reads()."""
+    return _fresh_reads.get()
+
+
+def data_ttl():
+    """TTL dos caches de dados: curto lendo da planilha, longo lendo da réplica local.
+
+    Com a réplica, a sincronização descarta os caches quando traz alterações.
+    """
+    return config.REPLICA_CACHE_TTL if config.LOCAL_REPLICA else config.DATA_CACHE_TTL
+
+
+def ttl_cache(ttl, copy=True, group='data', max_stale=None, per_tenant=True):
+    """Decorator de cache com expiração por tempo (segundos).
+
+    `ttl` pode ser um número ou uma função sem argumentos (lida a cada chamada,
+    para respeitar alterações em config). Com `copy=True`, o valor é guardado com
+    freeze() e cada chamada recebe um objeto próprio (visão rasa somente leitura
+    para DataFrame/Series, cópia para dict); use `copy=False` para recursos
+    compartilhados (ex.: o cliente autenticado).
+    `group` define quais caches são invalidados juntos por clear_all(); os do grupo
+    'data' são sempre relidos dentro de fresh_reads().
+
+    ♻️ Com `max_stale` (número ou função, em segundos), um valor vencido mas com
+    idade até `max_stale` é devolvido na hora (stale-while-revalidate) e uma única
+    atualização por chave roda em segundo plano; se ela falhar, o valor antigo
+    continua valendo. Acima de `max_stale` (ou com 0/None) a chamada espera o novo valor.
+
+    Além de `clear()`, a função decorada ganha `peek(*args)` (valor em cache, mesmo
+    expirado, ou None), `set_entry(args, value)` (grava o valor, renovando o TTL),
+    `discard(*args)`, usados para atualizar o cache após uma gravação sem reler a
+    planilha, `stored_at(*args)` (instante time.monotonic da gravação, ou None) e
+    `version(*args)` ((geração, stored_at) da entrada, ou None), que identifica a
+    leitura em cache sem percorrer os dados (ver VersionedCache).
+
+    🏢 Com `per_tenant=True` a chave inclui a frota atual (tenants.current_tenant()):
+    cada planilha tem as suas entradas, e `clear()` só limpa as da frota atual
+    (`clear(all_tenants=True)` limpa todas). Use `per_tenant=False` para recursos
+    compartilhados entre as frotas (o cliente autenticado).
+    """
+    def decorator(func):
+        entries = {}       # chave -> (time.monotonic, valor, bytes)
+        generations = {}   # chave -> contador; muda a cada gravação/descarte da chave
+        refreshing = set()
+        lock = threading.Lock()
+
+        def make_key(args):
+            return (tenants.current_tenant(),) + tuple(args) if per_tenant else tuple(args)
+
+        def to_store(value):
+            """(valor como será guardado, bytes); fora do lock, pois congelar copia os arrays."""
+            # O tamanho é medido antes: memory_usage(deep=True) não lê arrays somente leitura
+            return (freeze(value) if copy else value), _nbytes(value)
+
+        def store(key, stored):
+            entries[key] = (time.monotonic(),) + stored
+
+        def refresh(key, args, generation):
+            try:
+                stored = to_store(func(*args))
+            except Exception as e:
+                logger.warning("Atualização em segundo plano de %s%s falhou; mantendo o valor anterior: %s", func.__name__, args, e)
+                return
+            finally:
+                with lock:
+                    refreshing.discard(key)
+            with lock:
+                # Uma gravação no meio do caminho (set_entry/discard) é mais nova que esta leitura
+                if generations.get(key, 0) == generation:
+                    store(key, stored)
+            if per_tenant:
+                _enforce_memory_budget()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = make_key(args)
+            now = time.monotonic()
+            if per_tenant:
+                _tenant_last_used[key[0]] = now
+            max_age = ttl() if callable(ttl) else ttl
+            stale_limit = (max_stale() if callable(max_stale) else max_stale) or 0
+            fresh = group == 'data' and _fresh_reads.get()
+            with lock:
+                entry = None if fresh else entries.get(key)
+                age = None if entry is None else now - entry[0]
+                serve_stale = age is not None and max_age < age <= stale_limit
+                if serve_stale and key not in refreshing:
+                    refreshing.add(key)
+                    # A releitura roda no contexto (frota) de quem a disparou
+                    threading.Thread(
+                        target=contextvars.copy_context().run, args=(refresh, key, args, generations.get(key, 0)),
+                        name=f'refresh-{func.__name__}', daemon=True,
+                    ).start()
+            if entry is None or (age > max_age and not serve_stale):
+                stored = to_store(func(*args))
+                with lock:
+                    if fresh:
+                        _bump(key)  # uma releitura em segundo plano já iniciada é mais antiga
+                    store(key, stored)
+                value = stored[0]
+                if per_tenant:
+                    _enforce_memory_budget()
+            else:
+                value = entry[1]
+            return _share(value) if copy else value
+
+        def _bump(key):
+            generations[key] = generations.get(key, 0) + 1
+
+        def _drop(keep):
+            with lock:
+                for key in [key for key in set(entries) | refreshing if not keep(key)]:
+                    _bump(key)
+                    entries.pop(key, None)
+
+        def clear(all_tenants=False):
+            if all_tenants or not per_tenant:
+                _drop(lambda key: False)
+            else:
+                tenant = tenants.current_tenant()
+                _drop(lambda key: key[0] != tenant)
+
+        def evict_tenant(tenant):
+            if per_tenant:
+                _drop(lambda key: key[0] != tenant)
+
+        def tenant_nbytes():
+            """{frota: bytes} das entradas em cache (vazio se o cache não é por frota)."""
+            usage = Counter()
+            if per_tenant:
+                with lock:
+                    for key, entry in entries.items():
+                        usage[key[0]] += entry[2]
+            return usage
+
+        def peek(*args):
+            with lock:
+                entry = entries.get(make_key(args))
+            return None if entry is None else _share(entry[1]) if copy else entry[1]
+
+        def set_entry(args, value):
+            key = make_key(args)
+            stored = to_store(value)
+            with lock:
+                _bump(key)
+                store(key, stored)
+            if per_tenant:
+                _enforce_memory_budget()
+
+        def discard(*args):
+            key = make_key(args)
+            with lock:
+                _bump(key)
+                entries.pop(key, None)
+
+        def stored_at(*args):
+            with lock:
+                entry = entries.get(make_key(args))
+            return None if entry is None else entry[0]
+
+        def version(*args):
+            """(geração, momento da leitura) da entrada; muda a cada leitura/gravação/descarte."""
+            key = make_key(args)
+            with lock:
+                entry = entries.get(key)
+                return None if entry is None else (generations.get(key, 0), entry[0])
+
+        wrapper.clear = clear
+        wrapper.evict_tenant = evict_tenant
+        wrapper.tenant_nbytes = tenant_nbytes
+        wrapper.peek = peek
+        wrapper.set_entry = set_entry
+        wrapper.discard = discard
+        wrapper.stored_at = stored_at
+        wrapper.version = version
+        _registry.setdefault(group, []).append(wrapper)
+        return wrapper
+
+    return decorator
+
+
+def clear_all(group='data', all_tenants=False):
+    """Invalida os caches do grupo (por padrão, os de dados) da frota atual, ou de todas."""
+    for cached in _registry.get(group, []):
+        cached.clear(all_tenants=all_tenants)
+
+
+def on_tenant_evicted(func):
+    """Registra func(frota), chamada quando a frota sai do cache (para caches fora do ttl_cache)."""
+    _evict_hooks.append(func)
+    return func
+
+
+def evict_tenant(tenant):
+    """Descarta tudo o que está em cache para a frota (abas, planilha, abas abertas)."""
+    for cached in (c for group in _registry.values() for c in group):
+        cached.evict_tenant(tenant)
+    for hook in _evict_hooks:
+        hook(tenant)
+    _tenant_last_used.pop(tenant, None)
+
+
+def tenant_memory_usage():
+    """{frota: bytes} das tabelas em cache."""
+    usage = Counter()
+    for cached in (c for group in _registry.values() for c in group):
+        usage.update(cached.tenant_nbytes())
+    return dict(usage)
+
+
+def _enforce_memory_budget():
+    """Descarta as frotas usadas há mais tempo até a soma caber em TENANT_CACHE_MAX_MB."""
+    if not config.TENANTS:
+        return
+    limit = config.TENANT_CACHE_MAX_MB * 1e6
+    with _budget_lock:
+        usage = tenant_memory_usage()
+        total = sum(usage.values())
+        if total <= limit:
+            return
+        current = tenants.current_tenant()
+        for tenant in sorted(usage, key=lambda t: _tenant_last_used.get(t, 0)):
+            if total <= limit:
+                break
+            if tenant == current:
+                continue
+            evict_tenant(tenant)
+            total -= usage[tenant]
+            logger.info("Frota '%s' descartada do cache (%.1f MB; limite %s MB).", tenant, usage[tenant] / 1e6, config.TENANT_CACHE_MAX_MB)
+
+
+class VersionedCache:
+    """Resultados derivados (índices, relatórios) guardados por versão dos dados.
+
+    A chave é (frota, nome, version()), onde version() vem das entradas do
+    ttl_cache de onde os dados saem (ex.: tables.data_version): enquanto elas não
+    são relidas nem gravadas o resultado é reaproveitado, sem ler nem percorrer as
+    tabelas. Mantém no máximo `maxsize` entradas (a mais antiga sai primeiro).
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_build(self, name, version, load, builder):
+        """Retorna o valor em cache para a versão atual ou o calcula com builder(*load()).
+
+        `version` e `load` são funções sem argumentos: a versão dos dados e a
+        leitura deles. O resultado só é guardado se a versão não mudou durante a
+        leitura (na primeira chamada os dados ainda não estavam em cache e a
+        leitura é refeita uma vez). DataFrames/Series do resultado são guardados
+        somente leitura (freeze()).
+        """
+        key = (tenants.current_tenant(), name, version())
+        with self._lock:
+            value = self._entries.get(key)
+        if value is not None:
+            return value
+        frames = load()
+        current = version()
+        if current != key[2]:
+            key = key[:2] + (current,)
+            frames = load()
+            if version() != current:
+                key = None  # dados relidos no meio do caminho: calcula sem guardar
+        value = freeze(builder(*frames))
+        if key is not None:
+            with self._lock:
+                if len(self._entries) >= self.maxsize:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,276 @@
+"""📝 Log de alterações (append-only) e compactação nas abas base."""
+
+import json
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+from . import cache, config, replica
+from .errors import DataAccessError, SheetNotFoundError
+from .partitions import plan_table_writes, read_raw_table
+from .sheets import get_id_col, get_worksheet, open_spreadsheet, parse_column, read_sheet_values, to_sheet_value, values_to_frame, write_sheet_data
+
+logger = logging.getLogger(__name__)
+
+
+def build_change_event(sheet_name, operation, id_value, data=None):
+    """Monta a linha de log de um evento (insert/update/delete)."""
+    payload = {key: to_sheet_value(value) for key, value in (data or {}).items()}
+    return [
+        datetime.now().isoformat(timespec='seconds'), sheet_name, operation,
+        int(id_value), json.dumps(payload, ensure_ascii=False)
+    ]
+
+
+def get_change_log_worksheet(sh):
+    """Retorna a aba de log, criando-a (com cabeçalho) se ainda não existir."""
+    try:
+        return get_worksheet(sh, config.CHANGE_LOG_SHEET)
+    except SheetNotFoundError:
+        worksheet = sh.add_worksheet(title=config.CHANGE_LOG_SHEET, rows=1000, cols=len(config.CHANGE_LOG_COLUMNS))
+        worksheet.update('A1', [config.CHANGE_LOG_COLUMNS], value_input_option='RAW')
+        return worksheet
+
+
+def read_change_log(fresh=False):
+    """Lê o log de alterações sem cache, na ordem em que foi anexado.
+
+    Com LOCAL_REPLICA vem da réplica local, a menos que `fresh=True`.
+    """
+    try:
+        values = read_sheet_values(config.CHANGE_LOG_SHEET, fresh=fresh)
+    except SheetNotFoundError:
+        values = []
+    except DataAccessError:
+        raise
+    except Exception as e:
+        raise DataAccessError(f"Erro ao ler o log de alterações '{config.CHANGE_LOG_SHEET}': {e}") from e
+    return values_to_frame(values, config.COLUMN_TYPES[config.CHANGE_LOG_SHEET]).reindex(columns=config.CHANGE_LOG_COLUMNS)
+
+
+@cache.ttl_cache(ttl=cache.data_ttl)
+def get_change_log():
+    """Versão em cache de read_change_log (usada na leitura das abas)."""
+    return read_change_log()
+
+
+def _comparable(value):
+    """Valor como gravado na planilha, com números comparados como números ('10' == 10.0)."""
+    value = to_sheet_value(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+
+def _same_record(current, data):
+    """True se o registro atual já tem os valores do evento (evento já aplicado)."""
+    return all(_comparable(current.get(key, '')) == _comparable(value) for key, value in data.items())
+
+
+def _rows_matching(df, data):
+    """Máscara das linhas de df com os valores de `data` (como gravados na planilha)."""
+    mask = pd.Series(True, index=df.index)
+    for key, value in data.items():
+        if key not in df.columns:
+            return pd.Series(False, index=df.index)
+        mask &= df[key].map(_comparable) == _comparable(value)
+    return mask
+
+
+def apply_change_log(sheet_name, df_base, df_log):
+    """Reaplica sobre a aba base os eventos do log referentes a ela, em ordem.
+
+    Os eventos são percorridos uma vez, acumulando só o que eles tocam; a base é
+    alterada no fim por coluna (alinhada pelo ID), e as linhas novas entram com um
+    único concat. Linhas da base sem ID ou com ID repetido são mantidas (um update
+    ou delete vale para todas as linhas daquele ID).
+
+    A reaplicação é idempotente (insert de um ID que já tem aqueles valores, como
+    na base já compactada enquanto o log ainda não foi limpo, não duplica a linha;
+    a comparação vale para o registro do insert e para ele somado aos updates
+    seguintes do mesmo ID; delete de um ID inexistente é ignorado). Um insert de
+    um ID já usado por outro registro
+    (duas sessões que calcularam o mesmo máximo + 1) não sobrescreve nada: a linha
+    entra com um ID novo. Um update com o registro completo de um ID ausente (ex.:
+    serviço que mudou de ano/partição) recria a linha.
+    """
+    if df_log.empty:
+        return df_base
+    events = df_log[df_log['sheet'] == sheet_name]
+    if events.empty:
+        return df_base
+
+    id_col = get_id_col(sheet_name)
+    columns = list(df_base.columns) if not df_base.columns.empty else list(config.EXPECTED_COLS[sheet_name])
+    if config.SOFT_DELETE and config.DELETED_COL not in columns:
+        columns.append(config.DELETED_COL)
+
+    df = df_base.reindex(columns=columns)
+    base_ids = pd.Index(pd.to_numeric(df[id_col], errors='coerce')) if not df.empty else pd.Index([], dtype=float)
+    next_id = int(max(base_ids.max() if base_ids.notna().any() else 0, events['id_value'].max())) + 1
+    deleted = set()   # IDs da base removidos
+    pending = {}      # ID da base -> {coluna: valor} a aplicar
+    inserted = {}     # ID -> registro completo das linhas novas
+
+    def current(id_value):
+        if id_value in inserted:
+            return inserted[id_value]
+        row = df.iloc[base_ids.get_indexer_for([id_value])[0]].to_dict()
+        return {**row, **pending.get(id_value, {})}
+
+    def is_live(id_value):
+        return id_value in inserted or (id_value in base_ids and id_value not in deleted)
+
+    operations = events['operation'].tolist()
+    id_values = [int(id_value) for id_value in events['id_value']]
+    payloads = [json.loads(payload) if payload else {} for payload in events['payload']]
+
+    # Registro de cada insert depois dos updates seguintes do mesmo ID (até um novo
+    # insert/delete dele): é o que uma base já compactada guarda para aquele ID
+    folded = {}
+    open_inserts = {}
+    for position, (operation, id_value, data) in enumerate(zip(operations, id_values, payloads)):
+        if operation == 'insert':
+            open_inserts[id_value] = position
+            folded[position] = dict(data)
+        elif operation == 'update' and id_value in open_inserts:
+            folded[open_inserts[id_value]].update(data)
+        elif operation == 'delete':
+            open_inserts.pop(id_value, None)
+
+    for position, (operation, id_value, data) in enumerate(zip(operations, id_values, payloads)):
+        if operation == 'insert':
+            if is_live(id_value):
+                candidates = (data, folded[position])
+                if any(_same_record(current(id_value), candidate) for candidate in candidates):
+                    continue
+                # Numa compactação anterior a linha pode já ter entrado com um ID novo
+                live = df[~base_ids.isin(list(deleted))]
+                moved = [{key: value for key, value in candidate.items() if key not in (id_col, config.DELETED_COL)} for candidate in candidates]
+                if any(
+                    record and (_rows_matching(live, record).any() or any(_same_record(row, record) for row in inserted.values()))
+                    for record in moved
+                ):
+                    continue
+                logger.warning("Insert de '%s' com ID %s já usado; a linha entra com o ID %s.", sheet_name, id_value, next_id)
+                inserted[next_id] = {**{col: data.get(col, '') for col in columns}, id_col: next_id}
+                next_id += 1
+                continue
+            deleted.add(id_value)
+            inserted[id_value] = {**{col: data.get(col, '') for col in columns}, id_col: id_value}
+        elif operation == 'update' and id_value in inserted:
+            inserted[id_value].update({key: value for key, value in data.items() if key in columns})
+        elif operation == 'update' and is_live(id_value):
+            pending.setdefault(id_value, {}).update({key: value for key, value in data.items() if key in columns})
+        elif operation == 'update' and set(columns) - {id_col, config.DELETED_COL} <= set(data):
+            # Linha fora das partições carregadas, mas o evento traz o registro completo
+            deleted.add(id_value)
+            inserted[id_value] = {**{col: data.get(col, '') for col in columns}, id_col: id_value}
+        elif operation == 'delete':
+            deleted.add(id_value)
+            pending.pop(id_value, None)
+            inserted.pop(id_value, None)
+
+    if deleted:
+        keep = ~base_ids.isin(list(deleted))
+        df, base_ids = df[keep], base_ids[keep]
+    column_types = config.COLUMN_TYPES.get(sheet_name, {})
+    if pending:
+        # Cada coluna recebe os novos valores de uma vez, levados às linhas pelo ID
+        updates = pd.DataFrame.from_dict(pending, orient='index')
+        rows = base_ids.isin(updates.index)
+        targets = pd.Series(base_ids[rows], index=df.index[rows])
+        for col in updates.columns:
+            values = targets.map(updates[col].dropna()).dropna()
+            # Valores do log (texto) vão para o tipo do esquema antes de entrar na coluna
+            values = parse_column(values, column_types.get(col))
+            # A coluna é copiada antes da escrita: df pode ser a tabela em cache (somente leitura)
+            column = df[col].copy() if values.dtype == df[col].dtype else df[col].astype(object)
+            column.loc[values.index] = values
+            df[col] = column
+    if inserted:
+        df_new = pd.DataFrame(list(inserted.values()), columns=columns)
+        for col, kind in column_types.items():
+            if col in df_new.columns:
+                df_new[col] = parse_column(df_new[col], kind)
+        # Colunas todas vazias ficam fora do concat (o tipo vem do lado preenchido)
+        frames = [frame.loc[:, frame.notna().any().to_numpy()] for frame in (df, df_new) if not frame.empty]
+        df = pd.concat(frames, ignore_index=True).reindex(columns=columns)
+    df = df.reset_index(drop=True)
+
+    # Colunas que misturaram tipos (ex.: inteiros que ganharam um vazio) voltam ao esquema
+    for col, kind in column_types.items():
+        if col in df.columns and df[col].dtype == object:
+            df[col] = parse_column(df[col], kind)
+    # IDs inteiros mesmo com linhas sem ID (sem virar '1.0' na gravação)
+    if pd.api.types.is_float_dtype(df[id_col]) and (df[id_col].dropna() % 1 == 0).all():
+        df[id_col] = df[id_col].astype('Int64')
+    return df
+
+
+def append_change_events(events, clear_cache=True):
+    """Anexa os eventos ao log em uma única chamada (append), sem reescrever nenhuma aba."""
+    if not events:
+        return
+    sh = open_spreadsheet()
+    try:
+        worksheet = get_change_log_worksheet(sh)
+        worksheet.append_rows(events, value_input_option='RAW')
+    except Exception as e:
+        raise DataAccessError(f"Erro ao anexar no log de alterações '{config.CHANGE_LOG_SHEET}': {e}") from e
+
+    if config.LOCAL_REPLICA:
+        replica.append_rows(config.CHANGE_LOG_SHEET, events)
+
+    if clear_cache:
+        cache.clear_all()
+
+
+def patch_cached_change_log(events):
+    """Acrescenta os eventos recém-anexados ao log em cache (sem reler a aba de log)."""
+    df_log = get_change_log.peek()
+    if df_log is None:
+        return
+    df_events = pd.DataFrame(events, columns=config.CHANGE_LOG_COLUMNS)
+    get_change_log.set_entry((), pd.concat([df_log, df_events], ignore_index=True))
+
+
+def compact_change_log():
+    """Incorpora o log às abas base e remove do log apenas os eventos incorporados.
+
+    Eventos anexados durante a compactação permanecem no log. Se a compactação
+    falhar no meio, a reaplicação idempotente garante que nada se perde.
+    Retorna o número de eventos compactados.
+    """
+    df_log = read_change_log(fresh=True)
+    n_events = len(df_log)
+    if n_events == 0:
+        return 0
+
+    sh = open_spreadsheet()
+    for sheet_name in df_log['sheet'].unique():
+        if sheet_name not in config.EXPECTED_COLS:
+            continue
+        df_base = read_raw_table(sh, sheet_name)
+        df_folded = apply_change_log(sheet_name, df_base, df_log)
+        for target, df_new, _ in plan_table_writes(sheet_name, df_folded, df_base):
+            write_sheet_data(target, df_new, clear_cache=False)
+
+    # Remove só as linhas que foram incorporadas (linha 1 é o cabeçalho)
+    try:
+        get_worksheet(sh, config.CHANGE_LOG_SHEET).delete_rows(2, n_events + 1)
+    except Exception as e:
+        raise DataAccessError(f"Erro ao compactar o log de alterações: {e}") from e
+    finally:
+        # As linhas restantes do log mudaram de posição: a réplica relê a aba inteira
+        replica.drop_sheet(config.CHANGE_LOG_SHEET)
+        cache.clear_all()
+    return n_events
+
+
+def maybe_compact_change_log():
+    """Dispara a compactação quando o log passa de CHANGE_LOG_COMPACT_THRESHOLD eventos."""
+    if config.CHANGE_LOG_MODE and len(get_change_log()) >= config.CHANGE_LOG_COMPACT_THRESHOLD:
+        compact_change_log()
@@ -0,0 +1,234 @@
+"""Linha de comando para jobs em lote (sem carregar a interface Streamlit).
+
+Exemplos:
+    python -m controle_automotivo list veiculo
+    python -m controle_automotivo export historico -o historico.csv --start 2025-01-01 --end 2025-12-31
+    python -m controle_automotivo upsert servico servicos.csv
+    python -m controle_automotivo due-soon --days 15
+    python -m controle_automotivo maintenance-forecast --days 60
+    python -m controle_automotivo startup-report --json
+    python -m controle_automotivo purge-deleted --older-than 30
+    python -m controle_automotivo check-integrity -o problemas.csv --repair
+    python -m controle_automotivo sync-replica
+
+Credenciais (em ordem): --credentials ARQUIVO.json, variável de ambiente
+GCP_SERVICE_ACCOUNT_FILE, ou a seção [gcp_service_account] de .streamlit/secrets.toml.
+Com várias frotas (seção [frotas] de secrets.toml), --frota NOME escolhe a planilha.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tomllib
+
+import pandas as pd
+
+from . import config, sheets, tenants
+from .changelog import compact_change_log
+from .errors import DataAccessError, ValidationError
+from .forecast import get_maintenance_forecast
+from .integrity import check_integrity, repair_integrity
+from .partitions import partition_service_sheet
+from .purge import purge_deleted
+from .services import bulk_upsert
+from .startup import measure_cold_start
+from .sync import sync_replica
+from .tables import get_data, get_due_services, get_full_service_data
+
+TABLES = list(config.EXPECTED_COLS)
+SECRETS_FILE = os.path.join('.streamlit', 'secrets.toml')
+
+
+def _read_secrets():
+    if not os.path.exists(SECRETS_FILE):
+        return {}
+    with open(SECRETS_FILE, 'rb') as f:
+        return tomllib.load(f)
+
+
+def load_credentials(path=None):
+    """Carrega o dict da Service Account do arquivo JSON, da variável de ambiente ou do secrets.toml."""
+    path = path or os.environ.get('GCP_SERVICE_ACCOUNT_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return _read_secrets().get('gcp_service_account')
+
+
+def load_tenants():
+    """Frotas da seção [frotas] de secrets.toml ({nome: {'sheet_id': ..., 'title': ...}}), se houver."""
+    return _read_secrets().get('frotas')
+
+
+def _write_output(df, output):
+    if output:
+        df.to_csv(output, index=False)
+        print(f"{len(df)} linha(s) gravada(s) em {output}")
+    else:
+        df.to_csv(sys.stdout, index=False)
+
+
+def cmd_list(args):
+    df = get_data(args.table)
+    if args.limit:
+        df = df.head(args.limit)
+    print(df.to_string(index=False) if not df.empty else f"Nenhum registro em '{args.table}'.")
+
+
+def cmd_export(args):
+    if args.table == 'historico':
+        df = get_full_service_data(args.start, args.end)
+    else:
+        df = get_data(args.table)
+    _write_output(df, args.output)
+
+
+def cmd_upsert(args):
+    df_rows = pd.read_csv(args.file, dtype=str, keep_default_na=False)
+    counts = bulk_upsert(args.table, df_rows)
+    print(f"{counts['inserted']} inserido(s), {counts['updated']} atualizado(s) em '{args.table}'.")
+
+
+def cmd_due_soon(args):
+    df = get_due_services(args.days)
+    if df.empty:
+        print(f"Nenhuma garantia vencendo nos próximos {args.days} dias.")
+        return
+    columns = ['Veículo', 'Placa', 'Serviço', 'Empresa', 'data_vencimento', 'Dias para Vencer']
+    _write_output(df[columns], args.output)
+
+
+def cmd_maintenance_forecast(args):
+    df = get_maintenance_forecast(args.days)
+    df = df[df['Data Prevista'].notna()]
+    if df.empty:
+        print(f"Nenhuma revisão prevista para os próximos {args.days} dias.")
+        return
+    _write_output(df.drop(columns='id_veiculo'), args.output)
+
+
+def cmd_compact_log(args):
+    print(f"{compact_change_log()} evento(s) compactado(s).")
+
+
+def cmd_purge_deleted(args):
+    counts = purge_deleted(args.older_than, args.batch)
+    print(f"{sum(counts.values())} linha(s) excluída(s) removida(s) de vez." + ''.join(f"\n  {name}: {n}" for name, n in counts.items()))
+
+
+def cmd_check_integrity(args):
+    if args.repair:
+        report, counts = repair_integrity(tombstone_orphans=not args.keep_orphans)
+    else:
+        report, counts = check_integrity(), None
+    if report.empty:
+        print("Nenhum problema de integridade encontrado.")
+        return
+    print(f"{len(report)} problema(s):" + ''.join(f"\n  {problem}: {n}" for problem, n in report['problema'].value_counts().items()))
+    if counts is not None:
+        print(f"{sum(counts.values())} célula(s) corrigida(s)." + ''.join(f"\n  {problem}: {n}" for problem, n in counts.items()))
+    if args.output:
+        _write_output(report, args.output)
+
+
+def cmd_sync_replica(args):
+    config.LOCAL_REPLICA = True
+    changes = sync_replica()
+    print(f"Réplica local em {config.REPLICA_PATH}: {sum(changes.values())} linha(s) alterada(s)."
+          + ''.join(f"\n  {name}: {n}" for name, n in changes.items()))
+
+
+def cmd_partition_services(args):
+    parts = partition_service_sheet()
+    for name, n_rows in parts.items():
+        print(f"{name}: {n_rows} serviço(s)")
+
+
+def cmd_startup_report(args):
+    report = measure_cold_start(args.credentials, args.sheet_id, args.table, args.runs)
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"Inicialização a frio (mediana de {args.runs} execução(ões), lendo '{args.table}'):")
+    for phase, ms in report.items():
+        print(f"  {phase:<15}{ms:>10.1f} ms")
+
+
+def _date(value):
+    return pd.to_datetime(value).date()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='controle_automotivo', description="Jobs em lote do Sistema de Controle Automotivo.")
+    parser.add_argument('--credentials', help="Arquivo JSON da Service Account.")
+    parser.add_argument('--sheet-id', help="ID da planilha (padrão: config.SHEET_ID).")
+    parser.add_argument('--frota', help="Frota (planilha) usada pelo comando, com várias frotas configuradas.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('list', help="Lista uma tabela.")
+    p.add_argument('table', choices=TABLES)
+    p.add_argument('--limit', type=int)
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser('export', help="Exporta uma tabela (ou o histórico com JOIN) em CSV.")
+    p.add_argument('table', choices=TABLES + ['historico'])
+    p.add_argument('-o', '--output')
+    p.add_argument('--start', type=_date)
+    p.add_argument('--end', type=_date)
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('upsert', help="Insere/atualiza em lote a partir de um CSV (uma gravação).")
+    p.add_argument('table', choices=TABLES)
+    p.add_argument('file')
+    p.set_defaults(func=cmd_upsert)
+
+    p = sub.add_parser('due-soon', help="Relatório de garantias vencendo em breve.")
+    p.add_argument('--days', type=int, default=30)
+    p.add_argument('-o', '--output')
+    p.set_defaults(func=cmd_due_soon)
+
+    p = sub.add_parser('maintenance-forecast', help="Revisões previstas pelo ritmo de KM de cada veículo.")
+    p.add_argument('--days', type=int, default=30)
+    p.add_argument('-o', '--output')
+    p.set_defaults(func=cmd_maintenance_forecast)
+
+    p = sub.add_parser('compact-log', help="Incorpora o log de alterações às abas base.")
+    p.set_defaults(func=cmd_compact_log)
+
+    p = sub.add_parser('purge-deleted', help="Remove de fato as linhas excluídas logicamente (tombstones).")
+    p.add_argument('--older-than', type=int, default=None, help="Só as excluídas há mais de N dias (padrão: PURGE_AFTER_DAYS).")
+    p.add_argument('--batch', type=int, default=None, help="Máximo de linhas removidas (padrão: PURGE_BATCH_SIZE).")
+    p.set_defaults(func=cmd_purge_deleted)
+
+    p = sub.add_parser('check-integrity', help="Verifica IDs duplicados, órfãos, tipos inválidos e vencimentos.")
+    p.add_argument('-o', '--output', help="Grava o relatório completo neste CSV.")
+    p.add_argument('--repair', action='store_true', help="Corrige o que for possível (uma gravação por aba).")
+    p.add_argument('--keep-orphans', action='store_true', help="No reparo, não exclui logicamente os serviços órfãos.")
+    p.set_defaults(func=cmd_check_integrity)
+
+    p = sub.add_parser('sync-replica', help="Sincroniza a réplica local (SQLite) com a planilha.")
+    p.set_defaults(func=cmd_sync_replica)
+
+    p = sub.add_parser('partition-services', help="Migra a aba 'servico' para partições anuais.")
+    p.set_defaults(func=cmd_partition_services)
+
+    p = sub.add_parser('startup-report', help="Mede o tempo de inicialização a frio (importação, auth, abertura, 1ª leitura).")
+    p.add_argument('--table', choices=TABLES, default='veiculo', help="Tabela usada na primeira leitura.")
+    p.add_argument('--runs', type=int, default=3)
+    p.add_argument('--json', action='store_true', help="Saída em JSON (para acompanhar entre releases).")
+    p.set_defaults(func=cmd_startup_report)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        sheets.configure(credentials=load_credentials(args.credentials), sheet_id=args.sheet_id, tenants=load_tenants())
+        tenants.set_tenant(args.frota)
+        args.func(args)
+    except (DataAccessError, ValidationError, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    return 0
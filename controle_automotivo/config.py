@@ -0,0 +1,103 @@
+# ==============================================================================
+# 🚨 CONFIGURAÇÃO GOOGLE SHEETS (PLANILHA, MODOS DE GRAVAÇÃO E ESQUEMA) 🚨
+# ==============================================================================
+#
+# Os valores abaixo são lidos em tempo de execução (config.NOME), então podem ser
+# alterados pelo app, pela CLI ou por scripts antes da primeira leitura.
+
+import os
+import re
+
+# Defina a URL ou ID da sua planilha AQUI
+SHEET_ID = '1BNjgWhvEj8NbnGr4x7F42LW7QbQiG5kZ1FBhfr9Q-4g'
+PLANILHA_TITULO = 'Dados Automóvel' # Título exato da sua planilha
+
+# Tempo de vida (segundos) do cache das abas e do cliente autenticado
+DATA_CACHE_TTL = 5
+CLIENT_CACHE_TTL = 3600
+
+# ♻️ STALE-WHILE-REVALIDATE: vencido o DATA_CACHE_TTL, a aba continua sendo servida
+# do cache (sem esperar a planilha) enquanto UMA releitura por aba roda em segundo
+# plano, desde que a leitura tenha no máximo esta idade (segundos); acima dela a
+# leitura volta a esperar a planilha. 0 desliga (toda leitura vencida espera).
+# Só vale para leituras: as gravações (UnitOfWork) sempre releem a planilha antes.
+DATA_MAX_STALENESS = 120
+
+# 💾 RÉPLICA LOCAL (SQLite)
+# True: as leituras vêm de uma cópia local das abas (REPLICA_PATH), sem esperar a
+# rede; as gravações continuam indo para a planilha e são espelhadas na réplica, e
+# um worker traz a cada REPLICA_SYNC_INTERVAL segundos as alterações feitas fora
+# deste processo (só as linhas que mudaram são regravadas). Com a planilha lenta ou
+# fora do ar, o painel continua funcionando com a última cópia.
+LOCAL_REPLICA = False
+REPLICA_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'controle_automotivo', 'replica.sqlite3')
+REPLICA_SYNC_INTERVAL = 30
+# Com a réplica, o cache em memória só é descartado pela sincronização (ou por este TTL)
+REPLICA_CACHE_TTL = 3600
+
+# 📝 MODO LOG DE ALTERAÇÕES (APPEND-ONLY)
+# False: cada alteração reescreve a aba inteira (comportamento original).
+# True: cada insert/update/delete vira UMA linha anexada na aba de log; o estado
+# atual é a aba base (último snapshot compactado) + a cauda do log.
+CHANGE_LOG_MODE = False
+CHANGE_LOG_SHEET = 'log_alteracoes'
+CHANGE_LOG_COLUMNS = ['timestamp', 'sheet', 'operation', 'id_value', 'payload']
+CHANGE_LOG_COMPACT_THRESHOLD = 500 # Compacta automaticamente ao passar deste nº de eventos
+
+# 🪦 EXCLUSÃO LÓGICA (TOMBSTONES)
+# True: excluir grava só a data da exclusão na coluna DELETED_COL (uma célula); as
+# linhas marcadas somem das leituras e podem ser restauradas até a limpeza em
+# segundo plano removê-las de fato. False: excluir remove a linha na hora
+# (comportamento original). Ao ligar, a coluna DELETED_COL é acrescentada às abas
+# na primeira exclusão; para voltar a False, rode purge_deleted(0) antes, senão as
+# linhas marcadas voltam a aparecer.
+SOFT_DELETE = False
+DELETED_COL = 'excluido_em'
+PURGE_AFTER_DAYS = 7       # Só remove de fato o que foi excluído há mais dias que isso (janela do "desfazer")
+PURGE_BATCH_SIZE = 500     # Máximo de linhas removidas por rodada de limpeza
+PURGE_QUIET_SECONDS = 300  # A limpeza só roda após este tempo sem gravações
+PURGE_INTERVAL = 600       # Intervalo (segundos) entre as verificações do worker de limpeza
+
+# 🗂️ PARTICIONAMENTO DOS SERVIÇOS POR ANO
+# False: todos os serviços ficam na aba única 'servico' (comportamento original).
+# True: cada ano de data_servico fica na sua própria aba ('servico_2024', ...), e as
+# telas filtradas por data leem só as partições dos anos necessários.
+# Para migrar uma planilha existente, rode partition_service_sheet() uma vez
+# (ou `python -m controle_automotivo partition-services`).
+SERVICE_PARTITIONING = False
+SERVICE_PARTITION_PATTERN = re.compile(r'^servico_(\d{4})$')
+
+# 🏢 VÁRIAS FROTAS (MULTI-TENANT)
+# Vazio: uma planilha por implantação (SHEET_ID/PLANILHA_TITULO). Preenchido com
+# {nome: {'sheet_id': ..., 'title': ...}} (ou a seção [frotas] de secrets.toml), cada
+# sessão escolhe a sua frota: todas usam o mesmo cliente autenticado e cada uma tem
+# os seus caches de abas.
+# 🔒 Frotas NÃO são uma barreira de segurança por si só: qualquer sessão escolhe
+# qualquer frota (?frota=NOME ou a barra lateral). Para restringir, dê à frota a
+# chave 'usuarios' (lista de e-mails): ela só aparece para quem fez login (st.login)
+# com um desses e-mails.
+TENANTS = {}
+# Memória máxima (MB) das abas em cache somando todas as frotas; acima dela as frotas
+# usadas há mais tempo saem do cache (LRU). A frota em uso nunca é descartada.
+TENANT_CACHE_MAX_MB = 512
+
+# 🔎 Nº máximo de opções exibidas nos seletores de veículo/prestador (use a busca para refinar)
+SEARCH_RESULTS_LIMIT = 50
+
+EXPECTED_COLS = {
+    'veiculo': ['id_veiculo', 'nome', 'placa', 'renavam', 'ano', 'valor_pago', 'data_compra'],
+    'prestador': ['id_prestador', 'empresa', 'telefone', 'nome_prestador', 'cnpj', 'email', 'endereco', 'numero', 'cidade', 'bairro', 'cep'],
+    'servico': ['id_servico', 'id_veiculo', 'id_prestador', 'nome_servico', 'data_servico', 'garantia_dias', 'valor', 'km_realizado', 'km_proxima_revisao', 'registro', 'data_vencimento']
+}
+
+# 🧮 Tipo de cada coluna na leitura ('int', 'float' ou 'date'); as demais ficam como texto
+COLUMN_TYPES = {
+    'veiculo': {'id_veiculo': 'int', 'valor_pago': 'float', 'data_compra': 'date', DELETED_COL: 'date'},
+    'prestador': {'id_prestador': 'int', DELETED_COL: 'date'},
+    'servico': {
+        'id_servico': 'int', 'id_veiculo': 'int', 'id_prestador': 'int', 'data_servico': 'date',
+        'garantia_dias': 'int', 'valor': 'float', 'km_realizado': 'int', 'km_proxima_revisao': 'int',
+        'data_vencimento': 'date', DELETED_COL: 'date',
+    },
+    CHANGE_LOG_SHEET: {'id_value': 'int'},
+}
@@ -0,0 +1,21 @@
+"""Exceções da camada de dados (sem dependência do Streamlit)."""
+
+
+class DataAccessError(Exception):
+    """Falha ao ler ou gravar na planilha (conexão, permissão, API)."""
+
+
+class CredentialsError(DataAccessError):
+    """Credenciais da Service Account ausentes ou inválidas."""
+
+
+class SheetNotFoundError(DataAccessError):
+    """A aba/sheet pedida não existe na planilha."""
+
+
+class ValidationError(Exception):
+    """Operação recusada por regra de negócio (placa duplicada, serviços vinculados...)."""
+
+
+class RecordNotFoundError(ValidationError):
+    """O registro com o ID informado não existe."""
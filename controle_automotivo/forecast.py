@@ -0,0 +1,95 @@
+"""🗓️ Previsão da próxima revisão de cada veículo a partir do histórico de KM.
+
+A taxa de uso (km/dia) de cada veículo é a inclinação da reta de mínimos quadrados
+das leituras de km_realizado no tempo, calculada para a frota inteira de uma vez
+com somas agrupadas (sem laço por veículo). A data prevista é quando a reta atinge
+o km_proxima_revisao do serviço mais recente que o informou.
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .analytics import prepare_services
+from .cache import VersionedCache
+from .tables import data_version, get_data
+
+FORECAST_COLUMNS = [
+    'id_veiculo', 'Veículo', 'Placa', 'Última Leitura', 'KM Última Leitura', 'KM/dia',
+    'KM Estimado Hoje', 'KM Próxima Revisão', 'Data Prevista', 'Dias para a Revisão',
+]
+
+# Previsões a mais de 10 anos (uso quase nulo) ficam sem data
+MAX_FORECAST_DAYS = 3650
+
+_forecasts = VersionedCache(maxsize=4)
+
+
+def fit_km_rates(df):
+    """KM/dia de cada veículo (inclinação da reta km x dias), com a última leitura.
+
+    `df` é a saída de prepare_services. Só entram leituras com data e km; o odômetro
+    não diminui, então cada leitura vale pelo máximo acumulado até ela. Veículos com
+    menos de duas datas distintas ficam sem taxa (NaN).
+    """
+    df = df[df['data'].notna() & df['km'].notna()].sort_values(['id_veiculo', 'data'], kind='stable')
+    if df.empty:
+        return pd.DataFrame(columns=['Última Leitura', 'KM Última Leitura', 'KM/dia'])
+    vehicle = df['id_veiculo']
+    km = df['km'].groupby(vehicle).cummax()
+
+    # Dias desde a primeira leitura do veículo (centraliza a conta e evita números enormes)
+    first = df['data'].groupby(vehicle).transform('min')
+    t = (df['data'] - first).dt.days.astype(float)
+    sums = pd.DataFrame({'n': 1.0, 't': t, 'k': km, 'tt': t * t, 'tk': t * km}).groupby(vehicle).sum()
+
+    denominator = sums['n'] * sums['tt'] - sums['t'] ** 2
+    rate = (sums['n'] * sums['tk'] - sums['t'] * sums['k']) / denominator.where(denominator > 0)
+    return pd.DataFrame({
+        'Última Leitura': df['data'].groupby(vehicle).last(),
+        'KM Última Leitura': km.groupby(vehicle).last(),
+        'KM/dia': rate.where(rate > 0),
+    })
+
+
+def build_maintenance_forecast(df_servicos, df_veiculos, today):
+    """Previsão da próxima revisão de cada veículo com km_proxima_revisao informado."""
+    if df_servicos.empty:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    df = prepare_services(df_servicos)
+    df['km_proxima'] = pd.to_numeric(df_servicos['km_proxima_revisao'], errors='coerce').where(lambda km: km > 0).to_numpy()
+
+    # Meta = km_proxima_revisao do serviço mais recente que o informou
+    targets = df[df['km_proxima'].notna()].sort_values(['id_veiculo', 'data'], kind='stable', na_position='first')
+    result = fit_km_rates(df).join(targets.groupby('id_veiculo')['km_proxima'].last().rename('KM Próxima Revisão'), how='inner')
+
+    today = pd.Timestamp(today)
+    days_left = (result['KM Próxima Revisão'] - result['KM Última Leitura']) / result['KM/dia']
+    days_left = days_left.where(days_left.abs() <= MAX_FORECAST_DAYS)
+    result['Data Prevista'] = (result['Última Leitura'] + pd.to_timedelta(np.ceil(days_left), unit='D')).dt.normalize()
+    result['KM Estimado Hoje'] = result['KM Última Leitura'] + result['KM/dia'] * (today - result['Última Leitura']).dt.days
+    result['Dias para a Revisão'] = (result['Data Prevista'] - today).dt.days
+
+    names = df_veiculos.set_index(pd.to_numeric(df_veiculos['id_veiculo'], errors='coerce').fillna(0).astype(int))
+    result['Veículo'] = names['nome'].reindex(result.index)
+    result['Placa'] = names['placa'].reindex(result.index)
+    result = result[result['Veículo'].notna()].rename_axis('id_veiculo').reset_index()
+    return result.sort_values(['Data Prevista', 'Veículo'], na_position='last', ignore_index=True)[FORECAST_COLUMNS]
+
+
+def get_maintenance_forecast(days=None):
+    """Próximas revisões previstas da frota, ordenadas pela data prevista.
+
+    Calculada uma vez por versão dos dados (e por dia). Com `days`, só as revisões
+    previstas até `days` dias a partir de hoje (as atrasadas incluídas). Veículos
+    sem histórico suficiente ficam no fim, sem data prevista.
+    """
+    today = date.today()
+    forecast = _forecasts.get_or_build(
+        f'previsao_{today.isoformat()}', lambda: data_version('servico', 'veiculo'),
+        lambda: (get_data('servico'), get_data('veiculo')), lambda s, v: build_maintenance_forecast(s, v, today),
+    )
+    if days is not None:
+        forecast = forecast[forecast['Dias para a Revisão'] <= days].reset_index(drop=True)
+    return forecast.copy(deep=False)
@@ -0,0 +1,37 @@
+"""🇧🇷 Formatação para exibição no padrão brasileiro (moeda e datas), coluna a coluna.
+
+Os valores se repetem muito nas tabelas (mesmos preços, mesmas datas), então cada
+valor distinto é formatado uma única vez e o texto é espalhado de volta para a
+coluna com um take do NumPy, em vez de uma função Python por linha.
+"""
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%d-%m-%Y'
+# Mesmo formato para st.column_config.DateColumn (datas exibidas sem virar texto)
+DATE_COLUMN_FORMAT = 'DD-MM-YYYY'
+
+# Troca '1,234.56' por '1.234,56' em uma única passada
+_BR_SEPARATORS = str.maketrans({',': '.', '.': ','})
+
+
+def _spread(values, codes, labels, missing):
+    """Texto de cada linha a partir dos códigos do factorize (-1 = vazio/inválido)."""
+    labels = np.append(np.asarray(labels, dtype=object), missing)
+    return pd.Series(labels[codes], index=values.index, name=values.name)
+
+
+def format_currency(values, prefix='R$ ', missing=''):
+    """Valores numéricos como 'R$ 1.234,56' (texto `missing` para vazios/inválidos)."""
+    numbers = pd.to_numeric(pd.Series(values), errors='coerce')
+    codes, uniques = pd.factorize(numbers)
+    labels = [prefix + f'{value:,.2f}'.translate(_BR_SEPARATORS) for value in uniques]
+    return _spread(numbers, codes, labels, missing)
+
+
+def format_date(values, fmt=DATE_FORMAT, missing=''):
+    """Datas como texto dd-mm-aaaa (texto `missing` para vazias/inválidas)."""
+    dates = pd.to_datetime(pd.Series(values), errors='coerce')
+    codes, uniques = pd.factorize(dates)
+    return _spread(dates, codes, pd.DatetimeIndex(uniques).strftime(fmt), missing)
@@ -0,0 +1,231 @@
+"""🩺 Verificação de integridade das abas e reparo em lote.
+
+Os IDs nascem de max()+1 e as abas podem ser editadas à mão, então aparecem IDs
+duplicados, serviços órfãos (veículo/prestador apagado direto na planilha) e
+textos que não são número/data — que as conversões com fillna(0) escondem.
+A verificação lê o texto cru de cada aba física uma vez e faz cada checagem em
+passadas vetorizadas sobre as colunas; o reparo grava só as células corrigidas,
+em uma única chamada por aba.
+
+No modo log a verificação olha as abas base: eventos ainda no log não entram
+(rode compact-log antes para verificar o estado completo).
+"""
+
+import numpy as np
+import pandas as pd
+
+from . import cache, config
+from .changelog import read_change_log
+from .errors import DataAccessError, ValidationError
+from .partitions import list_service_partitions
+from .sheets import check_row_ids, get_id_col, get_table_name, get_worksheet, open_spreadsheet, parse_column, values_to_frame, write_sheet_cells
+
+ISSUE_COLUMNS = ['aba', 'linha', 'id', 'problema', 'coluna', 'valor']
+
+# Tipos de problema do relatório
+DUPLICATE_ID = 'id_duplicado'
+INVALID_ID = 'id_invalido'
+ORPHAN = 'orfao'
+INVALID_VALUE = 'tipo_invalido'
+DUE_DATE_MISMATCH = 'vencimento_inconsistente'
+
+_PARENTS = {'id_veiculo': 'veiculo', 'id_prestador': 'prestador'}
+
+
+def _physical_sheets(sh, table):
+    if table == 'servico' and config.SERVICE_PARTITIONING:
+        return list(list_service_partitions(sh).values())
+    return [table]
+
+
+def _read_table(sh, table):
+    """Lê as abas físicas da tabela como texto cru.
+
+    Retorna (texto, tipado, posições): os dois frames com as colunas auxiliares
+    '_aba' e '_linha' (linha na planilha) e {aba: {coluna: nº da coluna}}.
+    """
+    frames, positions = [], {}
+    for name in _physical_sheets(sh, table):
+        worksheet = get_worksheet(sh, name)
+        try:
+            values = worksheet.get_all_values()
+        except Exception as e:
+            raise DataAccessError(f"Erro ao ler a sheet '{name}': {e}") from e
+        header = values[0] if values else []
+        positions[name] = {col: i + 1 for i, col in enumerate(header) if col != ''}
+        df = values_to_frame(values)
+        frames.append(df.assign(_aba=name, _linha=np.arange(2, len(df) + 2)))
+
+    columns = config.EXPECTED_COLS[table]
+    text = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['_aba', '_linha'])
+    text = text.reindex(columns=list(dict.fromkeys(columns + list(text.columns)))).fillna('')
+    # Linhas em branco no meio da aba não são registros
+    data_cols = [col for col in text.columns if col not in ('_aba', '_linha')]
+    text = text[text[data_cols].ne('').any(axis=1)].reset_index(drop=True)
+
+    typed = text.copy()
+    for col, kind in config.COLUMN_TYPES[table].items():
+        if col in typed.columns:
+            typed[col] = parse_column(text[col], kind)
+    return text, typed, positions
+
+
+def _invalid_ids(ids):
+    return ids.isna() | (ids <= 0) | (ids % 1 != 0)
+
+
+def _live(typed):
+    if config.DELETED_COL not in typed.columns:
+        return pd.Series(True, index=typed.index)
+    return typed[config.DELETED_COL].isna()
+
+
+def _issues(text, typed, mask, problem, column, id_col):
+    """Linhas do relatório para as linhas de `mask` (valor = texto cru da coluna)."""
+    rows = text[mask]
+    return pd.DataFrame({
+        'aba': rows['_aba'], 'linha': rows['_linha'], 'id': typed.loc[mask, id_col],
+        'problema': problem, 'coluna': column,
+        'valor': rows[column] if column in rows.columns else '',
+    })
+
+
+def _scan(tables):
+    """Monta o relatório a partir de {tabela: (texto, tipado, posições)}."""
+    issues = []
+    live_ids = {}
+    for table, (text, typed, _) in tables.items():
+        id_col = get_id_col(table)
+
+        # 🔢 Texto que não converte para o tipo do esquema (inteiros com casas decimais também)
+        for col, kind in config.COLUMN_TYPES[table].items():
+            if col not in text.columns:
+                continue
+            bad = (text[col].str.strip() != '') & typed[col].isna()
+            if kind == 'int':
+                bad |= typed[col].notna() & (typed[col] % 1 != 0)
+            issues.append(_issues(text, typed, bad, INVALID_VALUE, col, id_col))
+
+        ids = typed[id_col]
+        invalid = _invalid_ids(ids)
+        issues.append(_issues(text, typed, invalid, INVALID_ID, id_col, id_col))
+        issues.append(_issues(text, typed, ~invalid & ids.duplicated(keep=False), DUPLICATE_ID, id_col, id_col))
+        live_ids[table] = ids[_live(typed)]
+
+    if 'servico' in tables:
+        text, typed, _ = tables['servico']
+        live = _live(typed)
+
+        # 🔗 Serviços ativos cujo veículo/prestador não existe (ou está excluído)
+        for fk, parent in _PARENTS.items():
+            orphan = live & typed[fk].notna() & ~typed[fk].isin(live_ids[parent])
+            issues.append(_issues(text, typed, orphan, ORPHAN, fk, 'id_servico'))
+
+        # 📅 data_vencimento diferente de data_servico + garantia_dias
+        expected = _expected_due_date(typed)
+        mismatch = live & expected.notna() & (typed['data_vencimento'] != expected)
+        issues.append(_issues(text, typed, mismatch, DUE_DATE_MISMATCH, 'data_vencimento', 'id_servico'))
+
+    issues = [df for df in issues if not df.empty]
+    if not issues:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    report = pd.concat(issues, ignore_index=True)
+    report['id'] = report['id'].astype('Int64')
+    return report.sort_values(['aba', 'linha', 'problema'], ignore_index=True)
+
+
+def _expected_due_date(typed):
+    garantia = typed['garantia_dias'].where(typed['garantia_dias'] % 1 == 0)
+    return typed['data_servico'] + pd.to_timedelta(garantia, unit='D')
+
+
+def _read_all():
+    sh = open_spreadsheet()
+    return {table: _read_table(sh, table) for table in config.EXPECTED_COLS}
+
+
+def check_integrity():
+    """Verifica as três tabelas e retorna o relatório (um DataFrame com ISSUE_COLUMNS).
+
+    'linha' é a linha na aba ('aba'), 'valor' é o texto cru da célula e 'problema'
+    é um de: id_duplicado, id_invalido, orfao, tipo_invalido, vencimento_inconsistente.
+    """
+    return _scan(_read_all())
+
+
+def repair_integrity(tombstone_orphans=True):
+    """Corrige o que tem correção automática e grava tudo em uma chamada por aba.
+
+    - IDs duplicados/inválidos: a primeira ocorrência fica com o ID; as demais
+      recebem novos IDs (max()+1...). Referências continuam apontando para a primeira.
+    - data_vencimento inconsistente: recalculada a partir de data_servico + garantia_dias.
+    - Serviços órfãos: excluídos logicamente (só com SOFT_DELETE e `tombstone_orphans`).
+
+    Valores com tipo inválido não são alterados: ficam no relatório para correção manual.
+    Antes de gravar, a coluna de ID de cada aba é relida: se alguma linha a corrigir
+    mudou de posição desde a leitura (gravação ou limpeza no meio do caminho), nada
+    é gravado e o reparo levanta DataAccessError.
+    Retorna (relatório antes do reparo, {problema: nº de células corrigidas}).
+    """
+    if config.CHANGE_LOG_MODE and not read_change_log(fresh=True).empty:
+        raise ValidationError("Há eventos pendentes no log de alterações. Rode compact-log antes de reparar.")
+
+    tables = _read_all()
+    report = _scan(tables)
+    cells = {}      # aba -> {(linha, coluna): valor}
+    row_ids = {}    # aba -> {linha: ID lido (texto cru)}
+    counts = {}
+
+    def stage(table, rows, column, values, problem):
+        text, _, positions = tables[table]
+        if rows.empty:
+            return
+        counts[problem] = counts.get(problem, 0) + len(rows)
+        id_col = get_id_col(table)
+        for name, group in text.loc[rows, ['_aba', '_linha', id_col]].groupby('_aba'):
+            row_ids.setdefault(name, {}).update(zip(group['_linha'].astype(int), group[id_col]))
+            sheet_cells = cells.setdefault(name, {})
+            if column not in positions[name]:
+                # Coluna nova (ex.: a de exclusão lógica): cabeçalho logo após a última coluna
+                positions[name][column] = max(positions[name].values(), default=0) + 1
+                sheet_cells[(1, positions[name][column])] = column
+            col = positions[name][column]
+            for row, value in zip(group['_linha'], pd.Series(values, index=rows).loc[group.index]):
+                sheet_cells[(int(row), col)] = value
+
+    for table, (_, typed, _) in tables.items():
+        id_col = get_id_col(table)
+        ids = typed[id_col]
+        invalid = _invalid_ids(ids)
+        duplicate = ~invalid & ids.duplicated(keep='first')
+        start = int(ids[~invalid].max()) if (~invalid).any() else 0
+        for problem, mask in ((INVALID_ID, invalid), (DUPLICATE_ID, duplicate)):
+            new_ids = np.arange(start + 1, start + 1 + int(mask.sum()))
+            stage(table, typed.index[mask], id_col, new_ids, problem)
+            start += len(new_ids)
+
+    _, services, _ = tables['servico']
+    live = _live(services)
+    expected = _expected_due_date(services)
+    mismatch = live & expected.notna() & (services['data_vencimento'] != expected)
+    stage('servico', services.index[mismatch], 'data_vencimento', expected[mismatch], DUE_DATE_MISMATCH)
+
+    if tombstone_orphans and config.SOFT_DELETE:
+        orphan = report.loc[report['problema'] == ORPHAN, ['aba', 'linha']].drop_duplicates()
+        index = services.reset_index().merge(orphan, left_on=['_aba', '_linha'], right_on=['aba', 'linha'])['index']
+        stage('servico', pd.Index(index), config.DELETED_COL, [pd.Timestamp.now().normalize()] * len(index), ORPHAN)
+
+    # As posições vêm da leitura acima: confere todas as abas antes da primeira gravação
+    for name, ids in row_ids.items():
+        id_col = get_id_col(name)
+        col = tables[get_table_name(name)][2][name][id_col]
+        if (1, col) not in cells[name]:  # aba sem coluna de ID: não há o que conferir
+            check_row_ids(name, id_col, col, list(ids), list(ids.values()))
+
+    try:
+        for name, sheet_cells in cells.items():
+            write_sheet_cells(name, [(row, col, value) for (row, col), value in sheet_cells.items()], clear_cache=False)
+    finally:
+        if cells:
+            cache.clear_all()
+    return report, counts
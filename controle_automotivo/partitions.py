@@ -0,0 +1,100 @@
+"""🗂️ Particionamento da tabela de serviços por ano (uma aba por ano de data_servico)."""
+
+import pandas as pd
+
+from . import cache, config, replica
+from .errors import DataAccessError
+from .sheets import open_spreadsheet, read_worksheet, serialize_for_sheet, write_sheet_data
+
+
+def service_partition_name(year):
+    """Nome da aba da partição de um ano (ano 0 = serviços sem data válida)."""
+    return f'servico_{int(year):04d}'
+
+
+def partitions_from_titles(titles):
+    """{ano: nome_da_aba} das partições entre os nomes de abas informados."""
+    partitions = {}
+    for title in titles:
+        match = config.SERVICE_PARTITION_PATTERN.match(title)
+        if match:
+            partitions[int(match.group(1))] = title
+    return dict(sorted(partitions.items()))
+
+
+def list_service_partitions(sh):
+    """Lista as partições existentes na planilha: {ano: nome_da_aba}."""
+    return partitions_from_titles(worksheet.title for worksheet in sh.worksheets())
+
+
+@cache.ttl_cache(ttl=60)
+def get_service_partitions():
+    """Versão em cache de list_service_partitions."""
+    if config.LOCAL_REPLICA and replica.get_marker() is not None:
+        # 💾 Depois da primeira sincronização a réplica conhece todas as abas
+        return partitions_from_titles(replica.list_sheets())
+    try:
+        return list_service_partitions(open_spreadsheet())
+    except DataAccessError:
+        raise
+    except Exception as e:
+        raise DataAccessError(f"Erro ao listar as partições de serviço: {e}") from e
+
+
+def split_service_partitions(df):
+    """Divide a tabela de serviços em {nome_da_aba: DataFrame} pelo ano de data_servico."""
+    if df.empty:
+        return {}
+    years = pd.to_datetime(df['data_servico'], errors='coerce').dt.year.fillna(0).astype(int)
+    return {
+        service_partition_name(year): df_year.reset_index(drop=True)
+        for year, df_year in df.groupby(years, sort=True)
+    }
+
+
+def plan_table_writes(sheet_name, df_new, df_old):
+    """Lista as gravações (aba, df_novo, df_antigo) necessárias para a tabela lógica.
+
+    Sem particionamento é a própria aba; com particionamento, só as partições de
+    serviço cujo conteúdo mudou.
+    """
+    if sheet_name != 'servico' or not config.SERVICE_PARTITIONING:
+        return [(sheet_name, df_new, df_old)]
+
+    empty = pd.DataFrame(columns=df_new.columns if not df_new.columns.empty else config.EXPECTED_COLS['servico'])
+    new_parts = split_service_partitions(df_new)
+    old_parts = split_service_partitions(df_old)
+
+    writes = []
+    for name in sorted(set(new_parts) | set(old_parts)):
+        df_part_new = new_parts.get(name, empty)
+        df_part_old = old_parts.get(name, empty)
+        # A coluna de exclusão lógica só entra nas partições que têm linhas excluídas
+        if config.DELETED_COL in df_part_new.columns and config.DELETED_COL not in df_part_old.columns and df_part_new[config.DELETED_COL].isna().all():
+            df_part_new = df_part_new.drop(columns=config.DELETED_COL)
+        if serialize_for_sheet(df_part_new) != serialize_for_sheet(df_part_old):
+            writes.append((name, df_part_new, df_part_old))
+    return writes
+
+
+def read_raw_table(sh, sheet_name):
+    """Lê a tabela lógica direto da planilha, sem cache nem conversões (todas as partições, se houver)."""
+    if sheet_name == 'servico' and config.SERVICE_PARTITIONING:
+        frames = [read_worksheet(name, sh, fresh=True) for name in list_service_partitions(sh).values()]
+        frames = [df for df in frames if not df.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=config.EXPECTED_COLS['servico'])
+    return read_worksheet(sheet_name, sh, fresh=True)
+
+
+def partition_service_sheet():
+    """Migração única: distribui a aba 'servico' nas partições anuais.
+
+    A aba original não é apagada; depois de conferir as partições ela pode ser
+    removida manualmente. Retorna {nome_da_partição: nº de linhas}.
+    """
+    df_servicos = read_worksheet('servico', fresh=True)
+    parts = split_service_partitions(df_servicos)
+    for name, df_part in parts.items():
+        write_sheet_data(name, df_part, clear_cache=False)
+    cache.clear_all()
+    return {name: len(df_part) for name, df_part in parts.items()}
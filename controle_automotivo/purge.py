@@ -0,0 +1,85 @@
+"""🪦 Limpeza das linhas excluídas logicamente (tombstones).
+
+Excluir só marca a linha (coluna DELETED_COL); aqui elas são removidas de fato,
+em lotes, depois de PURGE_AFTER_DAYS dias (a janela para desfazer). O worker em
+segundo plano roda só em períodos sem gravações, para não disputar a cota da API
+com os usuários.
+"""
+
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from . import config
+from .errors import DataAccessError
+from .sheets import get_id_col, is_configured
+from .tenants import list_tenants, use_tenant
+from .unit_of_work import UnitOfWork, idle_seconds
+
+logger = logging.getLogger(__name__)
+
+# Serviços primeiro: veículos/prestadores só saem quando nenhum serviço (nem excluído) aponta para eles
+_PURGE_ORDER = ('servico', 'veiculo', 'prestador')
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def purge_deleted(older_than_days=None, batch_size=None):
+    """Remove de fato até `batch_size` linhas excluídas há mais de `older_than_days` dias.
+
+    Tudo em uma única UnitOfWork (uma gravação por aba alterada). Retorna {aba: nº removido}.
+    """
+    older_than_days = config.PURGE_AFTER_DAYS if older_than_days is None else older_than_days
+    remaining = config.PURGE_BATCH_SIZE if batch_size is None else batch_size
+    cutoff = pd.Timestamp.now().normalize() - pd.Timedelta(days=older_than_days)
+
+    counts = {}
+    with UnitOfWork() as uow:
+        for sheet_name in _PURGE_ORDER:
+            df = uow.table(sheet_name)
+            if remaining <= 0 or df.empty or config.DELETED_COL not in df.columns:
+                continue
+            expired = df[df[config.DELETED_COL] <= cutoff]
+            if sheet_name != 'servico':
+                still_linked = uow.table('servico')[get_id_col(sheet_name)]
+                expired = expired[~expired[get_id_col(sheet_name)].isin(still_linked)]
+            n_removed = uow.purge(sheet_name, expired[get_id_col(sheet_name)].head(remaining), cutoff=cutoff)
+            if n_removed:
+                counts[sheet_name] = n_removed
+                remaining -= n_removed
+        if uow.has_changes:
+            uow.commit()
+    return counts
+
+
+def _purge_loop():
+    while True:
+        time.sleep(config.PURGE_INTERVAL)
+        if not (config.SOFT_DELETE and is_configured()) or idle_seconds() < config.PURGE_QUIET_SECONDS:
+            continue
+        # 🏢 Uma rodada por frota (None = planilha padrão); o erro de uma frota não para as demais
+        for tenant in list_tenants():
+            try:
+                with use_tenant(tenant):
+                    counts = purge_deleted()
+            except DataAccessError as e:
+                logger.warning("Limpeza dos excluídos adiada (frota %s): %s", tenant, e)
+                continue
+            except Exception:
+                logger.exception("Limpeza dos excluídos falhou (frota %s); tentando de novo na próxima rodada", tenant)
+                continue
+            if counts:
+                logger.info("Limpeza dos excluídos (frota %s): %s", tenant, counts)
+
+
+def start_purge_worker():
+    """Inicia (uma vez por processo) a thread que limpa os excluídos nos períodos sem gravações."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_purge_loop, name='purge-excluidos', daemon=True)
+            _worker.start()
+    return _worker
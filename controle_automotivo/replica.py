@@ -0,0 +1,244 @@
+"""💾 Réplica local (SQLite) das abas da planilha.
+
+Guarda a grade crua de cada aba (o mesmo texto de get_all_values): uma linha do
+SQLite por linha da aba, com o hash da linha. Com config.LOCAL_REPLICA as leituras
+vêm daqui, sem rede; as gravações feitas na planilha são espelhadas aqui e o worker
+de sync.py traz as alterações feitas fora deste processo, regravando só as linhas
+cujo hash mudou.
+
+Erros do SQLite nunca derrubam o app: a leitura volta para a planilha e um
+espelhamento que falha descarta a aba da réplica (ela é relida na próxima vez).
+"""
+
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import config, tenants
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS linhas (
+    planilha TEXT NOT NULL, aba TEXT NOT NULL, posicao INTEGER NOT NULL,
+    hash INTEGER NOT NULL, valores TEXT NOT NULL,
+    PRIMARY KEY (planilha, aba, posicao)
+);
+CREATE TABLE IF NOT EXISTS abas (
+    planilha TEXT NOT NULL, aba TEXT NOT NULL, largura INTEGER NOT NULL, sincronizada_em REAL NOT NULL,
+    PRIMARY KEY (planilha, aba)
+);
+CREATE TABLE IF NOT EXISTS marcadores (planilha TEXT PRIMARY KEY, valor TEXT NOT NULL);
+"""
+
+_connection = None
+_connection_path = None
+_lock = threading.RLock()
+
+
+def _connect():
+    global _connection, _connection_path
+    if _connection is None or _connection_path != config.REPLICA_PATH:
+        os.makedirs(os.path.dirname(config.REPLICA_PATH) or '.', exist_ok=True)
+        connection = sqlite3.connect(config.REPLICA_PATH, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(_SCHEMA)
+        _connection, _connection_path = connection, config.REPLICA_PATH
+    return _connection
+
+
+def _safe(default=None, drop=False):
+    """Erros do SQLite viram um aviso no log e o valor `default` (a réplica é só um atalho).
+
+    Com `drop=True` (espelhamento de uma gravação), a aba sai da réplica: a cópia
+    local pode ter ficado para trás da planilha. Nesse caso qualquer erro é contido,
+    pois a gravação na planilha já foi feita e não pode parecer que falhou.
+    """
+    def decorator(func):
+        errors = Exception if drop else sqlite3.Error
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            try:
+                with _lock:
+                    return func(*args)
+            except errors as e:
+                logger.warning("Réplica local indisponível em %s: %s", func.__name__, e)
+                if drop:
+                    drop_sheet(args[0])
+                return default
+        return wrapper
+    return decorator
+
+
+def _spreadsheet_key():
+    sheet_id, title = tenants.tenant_spreadsheet()
+    return sheet_id or title
+
+
+def _as_text(value):
+    return '' if value is None else str(value)
+
+
+def row_hashes(values, width):
+    """Hash (int64) de cada linha da grade, com as linhas completadas até `width` colunas."""
+    if not values:
+        return np.array([], dtype=np.int64)
+    frame = pd.DataFrame([list(row) + [''] * (width - len(row)) for row in values], dtype=object)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy().view(np.int64)
+
+
+def _width(values):
+    return max((len(row) for row in values), default=0)
+
+
+def _write_rows(connection, key, sheet_name, positions, rows, hashes):
+    connection.executemany(
+        'INSERT OR REPLACE INTO linhas VALUES (?, ?, ?, ?, ?)',
+        [(key, sheet_name, int(p), int(h), json.dumps(row, ensure_ascii=False)) for p, row, h in zip(positions, rows, hashes)],
+    )
+
+
+@_safe()
+def load_values(sheet_name):
+    """Grade da aba guardada na réplica, ou None se a aba ainda não foi replicada."""
+    connection = _connect()
+    key = _spreadsheet_key()
+    if connection.execute('SELECT 1 FROM abas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchone() is None:
+        return None
+    rows = connection.execute('SELECT valores FROM linhas WHERE planilha = ? AND aba = ? ORDER BY posicao', (key, sheet_name))
+    return [json.loads(valores) for valores, in rows]
+
+
+@_safe(default=0, drop=True)
+def store_values(sheet_name, values):
+    """Grava a grade da aba, regravando só as linhas cujo hash mudou. Retorna o nº de linhas alteradas."""
+    connection = _connect()
+    key = _spreadsheet_key()
+    values = [[_as_text(value) for value in row] for row in values]
+    width = _width(values)
+    hashes = row_hashes(values, width)
+    positions = np.arange(1, len(values) + 1)
+
+    stored = connection.execute('SELECT posicao, hash FROM linhas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchall()
+    old = pd.Series(dict(stored), dtype='Int64').reindex(positions)
+    changed = (old.isna() | (old.to_numpy(dtype=np.int64, na_value=0) != hashes)).to_numpy(dtype=bool)
+    n_removed = sum(1 for position, _ in stored if position > len(values))
+
+    with connection:
+        _write_rows(connection, key, sheet_name, positions[changed], [values[p - 1] for p in positions[changed]], hashes[changed])
+        connection.execute('DELETE FROM linhas WHERE planilha = ? AND aba = ? AND posicao > ?', (key, sheet_name, len(values)))
+        connection.execute('INSERT OR REPLACE INTO abas VALUES (?, ?, ?, ?)', (key, sheet_name, width, time.time()))
+    return int(changed.sum()) + n_removed
+
+
+@_safe(drop=True)
+def update_cells(sheet_name, cells):
+    """Espelha células gravadas [(linha, coluna, valor), 1-based]; abas fora da réplica são ignoradas.
+
+    Se a réplica está atrás da planilha (a linha gravada ainda não existe nela),
+    a aba sai da réplica e é relida inteira na próxima leitura/sincronização.
+    """
+    connection = _connect()
+    key = _spreadsheet_key()
+    sheet = connection.execute('SELECT largura FROM abas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchone()
+    if sheet is None:
+        return
+    last = connection.execute('SELECT COALESCE(MAX(posicao), 0) FROM linhas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchone()[0]
+    if max(row for row, _, _ in cells) > last:
+        logger.info("Réplica de '%s' atrás da planilha; a aba será relida inteira.", sheet_name)
+        drop_sheet(sheet_name)
+        return
+    width = sheet[0]
+    if max(col for _, col, _ in cells) > width:
+        # Coluna nova: todas as linhas mudam de largura, regrava a aba inteira
+        values = load_values(sheet_name)
+        for row, col, value in cells:
+            values[row - 1].extend([''] * (col - len(values[row - 1])))
+            values[row - 1][col - 1] = _as_text(value)
+        store_values(sheet_name, values)
+        return
+
+    positions = sorted({row for row, _, _ in cells})
+    placeholders = ','.join('?' * len(positions))
+    rows = dict(connection.execute(
+        f'SELECT posicao, valores FROM linhas WHERE planilha = ? AND aba = ? AND posicao IN ({placeholders})',
+        (key, sheet_name, *positions),
+    ))
+    rows = {position: json.loads(rows[position]) if position in rows else [] for position in positions}
+    for row, col, value in cells:
+        rows[row].extend([''] * (col - len(rows[row])))
+        rows[row][col - 1] = _as_text(value)
+    with connection:
+        _write_rows(connection, key, sheet_name, positions, [rows[p] for p in positions], row_hashes([rows[p] for p in positions], width))
+
+
+@_safe(drop=True)
+def append_rows(sheet_name, rows):
+    """Espelha linhas anexadas ao fim da aba; abas fora da réplica são ignoradas."""
+    connection = _connect()
+    key = _spreadsheet_key()
+    sheet = connection.execute('SELECT largura FROM abas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchone()
+    if sheet is None:
+        return
+    rows = [[_as_text(value) for value in row] for row in rows]
+    if _width(rows) > sheet[0]:
+        store_values(sheet_name, load_values(sheet_name) + rows)
+        return
+    last = connection.execute('SELECT COALESCE(MAX(posicao), 0) FROM linhas WHERE planilha = ? AND aba = ?', (key, sheet_name)).fetchone()[0]
+    with connection:
+        _write_rows(connection, key, sheet_name, range(last + 1, last + 1 + len(rows)), rows, row_hashes(rows, sheet[0]))
+
+
+@_safe()
+def drop_sheet(sheet_name):
+    """Tira a aba da réplica (a próxima leitura busca na planilha)."""
+    connection = _connect()
+    key = _spreadsheet_key()
+    with connection:
+        connection.execute('DELETE FROM linhas WHERE planilha = ? AND aba = ?', (key, sheet_name))
+        connection.execute('DELETE FROM abas WHERE planilha = ? AND aba = ?', (key, sheet_name))
+
+
+@_safe(default=())
+def list_sheets():
+    """Abas da planilha atual presentes na réplica."""
+    return [aba for aba, in _connect().execute('SELECT aba FROM abas WHERE planilha = ? ORDER BY aba', (_spreadsheet_key(),))]
+
+
+@_safe()
+def oldest_sync():
+    """Instante (time.time) da sincronização mais antiga entre as abas replicadas, ou None."""
+    return _connect().execute('SELECT MIN(sincronizada_em) FROM abas WHERE planilha = ?', (_spreadsheet_key(),)).fetchone()[0]
+
+
+@_safe()
+def mark_synced():
+    """Registra que todas as abas replicadas foram conferidas agora (sem alterações)."""
+    connection = _connect()
+    with connection:
+        connection.execute('UPDATE abas SET sincronizada_em = ? WHERE planilha = ?', (time.time(), _spreadsheet_key()))
+
+
+@_safe()
+def get_marker():
+    """Marcador de modificação da planilha na última sincronização (modifiedTime do Drive)."""
+    row = _connect().execute('SELECT valor FROM marcadores WHERE planilha = ?', (_spreadsheet_key(),)).fetchone()
+    return None if row is None else row[0]
+
+
+@_safe()
+def set_marker(value):
+    connection = _connect()
+    with connection:
+        if value is None:
+            connection.execute('DELETE FROM marcadores WHERE planilha = ?', (_spreadsheet_key(),))
+        else:
+            connection.execute('INSERT OR REPLACE INTO marcadores VALUES (?, ?)', (_spreadsheet_key(), value))
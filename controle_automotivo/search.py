@@ -0,0 +1,130 @@
+"""Índice de busca por prefixo de token para os seletores de veículo e prestador.
+
+O índice é construído uma vez por versão dos dados (impressão digital do
+DataFrame) e responde com os melhores resultados sem varrer a tabela; a
+resolução do rótulo escolhido para o ID é uma consulta O(1) em dicionário.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .cache import VersionedCache
+from .tables import data_version, get_data
+
+_indexes = VersionedCache(maxsize=8)
+
+
+def normalize_text(series):
+    """Minúsculas e sem acentos (vetorizado)."""
+    return (
+        series.fillna('').astype(str)
+        .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.lower()
+    )
+
+
+def _tokenize(query):
+    text = normalize_text(pd.Series([query])).iloc[0]
+    return pd.Series([text]).str.findall(r'[a-z0-9]+').iloc[0]
+
+
+class SearchIndex:
+    """Índice invertido (token ordenado -> documento) com busca por prefixo.
+
+    `labels` são os textos exibidos no seletor (um por documento) e `ids` os IDs
+    correspondentes. `fields` são as colunas de texto indexadas; em `compact_fields`
+    (ex.: placa, CNPJ) o valor também é indexado sem pontuação, para que
+    "12345678" encontre "12.345.678/0001-90".
+    """
+
+    def __init__(self, labels, ids, fields, compact_fields=()):
+        self.labels = np.asarray(labels, dtype=object)
+        self._id_by_label = dict(zip(self.labels, ids))
+        self._label_by_id = dict(zip(ids, self.labels))
+
+        tokens_per_field = []
+        for name, values in fields.items():
+            normalized = normalize_text(values).reset_index(drop=True)
+            tokens_per_field.append(normalized.str.findall(r'[a-z0-9]+'))
+            if name in compact_fields:
+                tokens_per_field.append(normalized.str.replace(r'[^a-z0-9]', '', regex=True).map(lambda t: [t] if t else []))
+
+        tokens = pd.concat(tokens_per_field).explode().dropna()
+        order = np.argsort(tokens.to_numpy(dtype=str), kind='stable')
+        self._tokens = tokens.to_numpy(dtype=str)[order]
+        self._docs = tokens.index.to_numpy()[order]
+        self._normalized_labels = normalize_text(pd.Series(self.labels)).to_numpy(dtype=str)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _prefix_docs(self, prefix):
+        lo = np.searchsorted(self._tokens, prefix, side='left')
+        hi = np.searchsorted(self._tokens, prefix + '\uffff', side='left')
+        return np.unique(self._docs[lo:hi])
+
+    def search(self, query, limit=20):
+        """Rótulos que contêm tokens começando por cada termo da busca (E lógico).
+
+        Sem termos, retorna os primeiros `limit` rótulos em ordem alfabética. Os
+        rótulos que começam pela busca vêm primeiro.
+        """
+        terms = _tokenize(query or '')
+        if not terms:
+            docs = np.arange(len(self.labels))
+        else:
+            docs = self._prefix_docs(terms[0])
+            for term in terms[1:]:
+                if docs.size == 0:
+                    break
+                docs = np.intersect1d(docs, self._prefix_docs(term), assume_unique=True)
+
+        if docs.size == 0:
+            return []
+        names = self._normalized_labels[docs]
+        starts = np.char.startswith(names, terms[0]) if terms else np.zeros(docs.size, dtype=bool)
+        ranked = docs[np.lexsort((names, ~starts))][:limit]
+        return self.labels[ranked].tolist()
+
+    def resolve(self, label):
+        """ID do rótulo escolhido (None se não existir)."""
+        return self._id_by_label.get(label)
+
+    def label(self, id_value):
+        """Rótulo de um ID (None se não existir)."""
+        return self._label_by_id.get(id_value)
+
+
+def vehicle_label(df_veiculos):
+    """Rótulo exibido para cada veículo: 'nome (placa)'."""
+    return df_veiculos['nome'].fillna('').astype(str) + ' (' + df_veiculos['placa'].fillna('').astype(str) + ')'
+
+
+def _build_vehicle_index(df_veiculos):
+    return SearchIndex(
+        labels=vehicle_label(df_veiculos), ids=df_veiculos['id_veiculo'].astype(int).tolist(),
+        fields={'nome': df_veiculos['nome'], 'placa': df_veiculos['placa']},
+        compact_fields=('placa',),
+    )
+
+
+def _build_prestador_index(df_prestadores):
+    return SearchIndex(
+        labels=df_prestadores['empresa'].fillna('').astype(str), ids=df_prestadores['id_prestador'].astype(int).tolist(),
+        fields={'empresa': df_prestadores['empresa'], 'cidade': df_prestadores['cidade'], 'cnpj': df_prestadores['cnpj']},
+        compact_fields=('cnpj',),
+    )
+
+
+def get_vehicle_index():
+    """Índice de busca de veículos (nome, placa) para a versão atual dos dados."""
+    return _indexes.get_or_build(
+        'veiculo', lambda: data_version('veiculo'), lambda: (get_data('veiculo'),), _build_vehicle_index,
+    )
+
+
+def get_prestador_index():
+    """Índice de busca de prestadores (empresa, cidade, CNPJ) para a versão atual dos dados."""
+    return _indexes.get_or_build(
+        'prestador', lambda: data_version('prestador'), lambda: (get_data('prestador'),), _build_prestador_index,
+    )
@@ -0,0 +1,292 @@
+"""Operações de negócio (CRUD com validação) sobre veículos, prestadores e serviços.
+
+As funções levantam ValidationError/RecordNotFoundError quando a regra de negócio
+recusa a operação e DataAccessError quando a planilha falha; cabe a quem chama
+(app Streamlit, CLI, jobs) decidir como exibir o erro.
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+
+from . import config
+from .bulk_edit import diff_table, has_changes, validate_table_edits
+from .errors import RecordNotFoundError, ValidationError
+from .sheets import get_id_col
+from .unit_of_work import UnitOfWork
+
+
+def execute_crud_operation(sheet_name, data=None, id_col=None, id_value=None, operation='insert'):
+    """Executa as operações CRUD no Google Sheets (Insert, Update, Delete).
+
+    Atalho para uma UnitOfWork com uma única operação (uma leitura e uma gravação).
+    Retorna (sucesso, id); falhas de gravação levantam DataAccessError.
+    """
+    with UnitOfWork() as uow:
+        if operation == 'insert':
+            new_id = uow.insert(sheet_name, data, id_col=id_col)
+            uow.commit()
+            return True, new_id
+
+        elif operation in ['update', 'delete']:
+            if operation == 'update':
+                found = uow.update(sheet_name, id_value, data, id_col=id_col)
+            else:
+                found = uow.delete(sheet_name, id_value, id_col=id_col)
+            if not found:
+                return False, None
+
+            uow.commit()
+            return True, id_value
+
+    return False, None
+
+
+# Veículo
+
+def _vehicle_record(nome, placa, ano, valor_pago, data_compra):
+    # 🛑 CORRIGIDO: usa .isoformat() para garantir a serialização da data
+    return {
+        'nome': nome, 'placa': placa,
+        'ano': ano, 'valor_pago': float(valor_pago), 'data_compra': pd.to_datetime(data_compra).date().isoformat()
+    }
+
+
+def insert_vehicle(nome, placa, ano, valor_pago, data_compra):
+    """Cadastra um veículo (placa, se informada, deve ser única). Retorna o novo ID."""
+    with UnitOfWork() as uow:
+        # A validação da placa usa a mesma leitura que será gravada
+        if placa and not uow.find('veiculo', 'placa', placa).empty:
+            raise ValidationError(f"Placa '{placa}' já cadastrada.")
+
+        new_id = uow.insert('veiculo', {'id_veiculo': 0, **_vehicle_record(nome, placa, ano, valor_pago, data_compra)}, id_col='id_veiculo')
+        uow.commit()
+    return new_id
+
+
+def update_vehicle(id_veiculo, nome, placa, ano, valor_pago, data_compra):
+    """Atualiza um veículo, recusando placa já usada por outro veículo."""
+    with UnitOfWork() as uow:
+        if placa:
+            df_check = uow.find('veiculo', 'placa', placa)
+            if not df_check.empty:
+                # Pega o ID do veículo encontrado (se houver) e converte para int
+                found_id = int(df_check.iloc[0]['id_veiculo'])
+                if found_id != int(id_veiculo):
+                    raise ValidationError(f"Placa '{placa}' já cadastrada para outro veículo (ID {found_id}).")
+
+        if not uow.update('veiculo', int(id_veiculo), _vehicle_record(nome, placa, ano, valor_pago, data_compra), id_col='id_veiculo'):
+            raise RecordNotFoundError(f"Veículo ID {id_veiculo} não encontrado.")
+        uow.commit()
+
+
+def delete_vehicle(id_veiculo):
+    """Remove um veículo sem serviços vinculados."""
+    with UnitOfWork() as uow:
+        # Simulação da verificação de chave estrangeira
+        if not uow.find('servico', 'id_veiculo', int(id_veiculo)).empty:
+            raise ValidationError("Não é possível remover o veículo. Existem serviços vinculados a ele.")
+
+        if not uow.delete('veiculo', int(id_veiculo), id_col='id_veiculo'):
+            raise RecordNotFoundError(f"Veículo ID {id_veiculo} não encontrado.")
+        uow.commit()
+
+
+# Prestador
+
+def _prestador_record(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
+    return {
+        'empresa': empresa, 'telefone': telefone, 'nome_prestador': nome_prestador,
+        'cnpj': cnpj, 'email': email, 'endereco': endereco, 'numero': numero,
+        'cidade': cidade, 'bairro': bairro, 'cep': cep
+    }
+
+
+def insert_new_prestador(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
+    """Cadastra um prestador novo (empresa deve ser única). Retorna o novo ID."""
+    with UnitOfWork() as uow:
+        if not uow.find("prestador", "empresa", empresa).empty:
+            raise ValidationError(f"A empresa '{empresa}' já está cadastrada.")
+
+        data = _prestador_record(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep)
+        new_id = uow.insert('prestador', {'id_prestador': 0, **data}, id_col='id_prestador')
+        uow.commit()
+    return new_id
+
+
+def update_prestador(id_prestador, empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep):
+    """Atualiza os dados de um prestador."""
+    data = _prestador_record(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep)
+    success, _ = execute_crud_operation('prestador', data=data, id_col='id_prestador', id_value=int(id_prestador), operation='update')
+    if not success:
+        raise RecordNotFoundError(f"Prestador ID {id_prestador} não encontrado.")
+
+
+def delete_prestador(id_prestador):
+    """Remove um prestador sem serviços vinculados."""
+    with UnitOfWork() as uow:
+        if not uow.find('servico', 'id_prestador', int(id_prestador)).empty:
+            raise ValidationError("Não é possível remover o prestador. Existem serviços vinculados a ele.")
+
+        if not uow.delete('prestador', int(id_prestador), id_col='id_prestador'):
+            raise RecordNotFoundError(f"Prestador ID {id_prestador} não encontrado.")
+        uow.commit()
+
+
+def insert_prestador(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep, uow=None):
+    """Insere ou atualiza um prestador (usado no cadastro de Serviço).
+
+    Se `uow` for informado, a alteração entra na transação do chamador (sem gravar);
+    caso contrário é gravada imediatamente. Retorna o ID do prestador.
+    """
+    own_uow = uow is None
+    uow = UnitOfWork() if own_uow else uow
+
+    data = _prestador_record(empresa, telefone, nome_prestador, cnpj, email, endereco, numero, cidade, bairro, cep)
+
+    df = uow.find("prestador", "empresa", empresa)
+    if not df.empty:
+        # Se existe, atualiza os dados na mesma transação e retorna o ID
+        id_prestador = int(df.iloc[0]['id_prestador'])
+        uow.update('prestador', id_prestador, data, id_col='id_prestador')
+    else:
+        # Se não existe, insere
+        id_prestador = uow.insert('prestador', {'id_prestador': 0, **data}, id_col='id_prestador')
+
+    if own_uow:
+        uow.commit()
+    return id_prestador
+
+
+# Serviço
+
+def build_service_record(id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro):
+    """Monta o registro de serviço (com data de vencimento calculada) no formato da planilha."""
+    data_servico_dt = pd.to_datetime(data_servico)
+    # Garante que garantia_dias é inteiro para o timedelta
+    garantia_dias_int = int(garantia_dias)
+    data_vencimento = data_servico_dt + timedelta(days=garantia_dias_int)
+
+    return {
+        'id_veiculo': int(id_veiculo), 'id_prestador': int(id_prestador),
+        'nome_servico': nome_servico, 'data_servico': data_servico_dt.date().isoformat(), # 🛑 CORRIGIDO: Armazena como ISO string
+        'garantia_dias': str(garantia_dias), 'valor': float(valor),
+        'km_realizado': str(km_realizado), 'km_proxima_revisao': str(km_proxima_revisao),
+        'registro': registro,
+        'data_vencimento': data_vencimento.date().isoformat() # 🛑 CORRIGIDO: Armazena como ISO string
+    }
+
+
+def insert_service(id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro):
+    """Cadastra um serviço. Retorna o novo ID."""
+    data = {'id_servico': 0, **build_service_record(
+        id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro
+    )}
+    _, new_id = execute_crud_operation('servico', data=data, id_col='id_servico', operation='insert')
+    return new_id
+
+
+def update_service(id_servico, id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro):
+    """Atualiza um serviço (recalculando a data de vencimento)."""
+    data = build_service_record(
+        id_veiculo, id_prestador, nome_servico, data_servico, garantia_dias, valor, km_realizado, km_proxima_revisao, registro
+    )
+    success, _ = execute_crud_operation('servico', data=data, id_col='id_servico', id_value=int(id_servico), operation='update')
+    if not success:
+        raise RecordNotFoundError(f"Serviço ID {id_servico} não encontrado.")
+
+
+def delete_service(id_servico):
+    """Remove um serviço."""
+    success, _ = execute_crud_operation('servico', id_col='id_servico', id_value=int(id_servico), operation='delete')
+    if not success:
+        raise RecordNotFoundError(f"Serviço ID {id_servico} não encontrado.")
+
+
+# Desfazer exclusão
+
+def restore_record(sheet_name, id_value):
+    """Desfaz a exclusão lógica de um registro (enquanto a limpeza não o removeu de fato)."""
+    id_col = get_id_col(sheet_name)
+    with UnitOfWork() as uow:
+        df = uow.table(sheet_name)
+        row = df[df[id_col] == int(id_value)] if not df.empty else df
+        if row.empty or config.DELETED_COL not in row.columns or row[config.DELETED_COL].isna().all():
+            raise RecordNotFoundError(f"Registro ID {id_value} não está entre os excluídos (ou já foi removido de vez).")
+
+        # Um serviço só volta se o veículo e o prestador ainda existirem
+        if sheet_name == 'servico':
+            for fk, parent in (('id_veiculo', 'veiculo'), ('id_prestador', 'prestador')):
+                if uow.find(parent, fk, int(row.iloc[0][fk])).empty:
+                    raise ValidationError(f"Não é possível restaurar o serviço: {parent} ID {int(row.iloc[0][fk])} foi excluído.")
+
+        uow.update(sheet_name, int(id_value), {config.DELETED_COL: None}, id_col=id_col)
+        uow.commit()
+
+
+# Importação em lote
+
+def bulk_upsert(sheet_name, df_rows):
+    """Insere/atualiza várias linhas em uma única transação (uma gravação por aba).
+
+    Linhas cujo ID já existe são atualizadas (só as células que mudaram); as demais
+    (ID vazio, 0 ou inexistente) são inseridas com ID novo. Para serviços,
+    data_vencimento é recalculada a partir de data_servico + garantia_dias. O lote
+    passa pelas mesmas validações da edição em lote (obrigatórios, placa/empresa
+    únicas, veículo e prestador existentes); IDs excluídos logicamente são recusados
+    (restaure-os antes). Retorna {'inserted': n, 'updated': m}.
+    """
+    if sheet_name not in config.EXPECTED_COLS:
+        raise ValidationError(f"Tabela desconhecida: '{sheet_name}'.")
+
+    id_col = get_id_col(sheet_name)
+    columns = [col for col in df_rows.columns if col in config.EXPECTED_COLS[sheet_name]]
+    df_rows = df_rows[columns].copy()
+    if id_col not in df_rows.columns:
+        df_rows[id_col] = 0
+    df_rows[id_col] = pd.to_numeric(df_rows[id_col], errors='coerce').fillna(0).astype(int)
+
+    with UnitOfWork() as uow:
+        df_live = uow.live(sheet_name)
+        live_ids = df_live[id_col] if id_col in df_live.columns else pd.Series(dtype=int)
+        all_ids = uow.table(sheet_name)[id_col] if id_col in df_live.columns else pd.Series(dtype=int)
+        tombstoned = df_rows.loc[df_rows[id_col].isin(all_ids) & ~df_rows[id_col].isin(live_ids), id_col]
+        if not tombstoned.empty:
+            raise ValidationError(f"IDs excluídos não podem ser atualizados (restaure-os antes): {', '.join(map(str, sorted(set(tombstoned))))}.")
+
+        # Mesmo caminho da edição em lote: diferença vetorizada contra as linhas existentes
+        changes = diff_table(sheet_name, df_live[live_ids.isin(df_rows[id_col])], df_rows)
+        updated = uow.update_cells(sheet_name, changes['updated'], id_col=id_col)
+        validate_table_edits(sheet_name, changes, uow.live(sheet_name), uow.live)
+        uow.insert_many(sheet_name, changes['inserted'], id_col=id_col)
+        uow.commit()
+    return {'inserted': len(changes['inserted']), 'updated': updated}
+
+
+# Edição em lote
+
+def apply_table_edits(sheet_name, df_base, df_edited):
+    """Grava a edição em lote de uma grade (df_base -> df_edited) em uma única transação.
+
+    Só as diferenças são aplicadas: células alteradas (gravadas uma a uma em um
+    único lote, quando a aba não ganhou nem perdeu linhas), linhas novas e linhas
+    excluídas. Tudo é validado antes de gravar. Retorna
+    {'inserted': n, 'updated': m, 'deleted': k}.
+    """
+    if sheet_name not in config.EXPECTED_COLS:
+        raise ValidationError(f"Tabela desconhecida: '{sheet_name}'.")
+
+    changes = diff_table(sheet_name, df_base, df_edited)
+    counts = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    if not has_changes(changes):
+        return counts
+
+    id_col = get_id_col(sheet_name)
+    with UnitOfWork() as uow:
+        counts['updated'] = uow.update_cells(sheet_name, changes['updated'], id_col=id_col)
+        counts['deleted'] = uow.delete_many(sheet_name, changes['deleted'], id_col=id_col)
+        validate_table_edits(sheet_name, changes, uow.live(sheet_name), uow.live)
+
+        counts['inserted'] = len(uow.insert_many(sheet_name, changes['inserted'], id_col=id_col))
+        uow.commit()
+    return counts
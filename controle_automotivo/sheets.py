@@ -0,0 +1,300 @@
+"""Conexão com o Google Sheets: cliente, abertura da planilha, leitura e escrita brutas.
+
+O gspread (e com ele google-auth e requests) só é importado no primeiro uso: a
+importação custa centenas de ms e não deve atrasar a renderização da página.
+"""
+
+import logging
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from . import cache, config, replica, tenants
+from .errors import CredentialsError, DataAccessError, SheetNotFoundError
+from .startup import timed
+
+logger = logging.getLogger(__name__)
+
+_credentials = None
+
+
+def configure(credentials=None, sheet_id=None, sheet_title=None, tenants=None):
+    """Define as credenciais da Service Account (dict) e, opcionalmente, outra planilha.
+
+    `tenants` ({nome: {'sheet_id': ..., 'title': ...}}) liga o modo de várias frotas.
+    """
+    global _credentials
+    if credentials is not None:
+        _credentials = dict(credentials)
+    if sheet_id is not None:
+        config.SHEET_ID = sheet_id
+    if sheet_title is not None:
+        config.PLANILHA_TITULO = sheet_title
+    if tenants is not None:
+        config.TENANTS = {name: dict(entry) for name, entry in tenants.items()}
+    cache.clear_all('client', all_tenants=True)
+    cache.clear_all(all_tenants=True)
+
+
+def is_configured():
+    """True se as credenciais já foram entregues via configure()."""
+    return _credentials is not None
+
+
+@cache.ttl_cache(ttl=lambda: config.CLIENT_CACHE_TTL, copy=False, group='client', per_tenant=False)
+def get_gspread_client():
+    """Retorna o cliente Gspread autenticado (um só, compartilhado por todas as frotas)."""
+    if _credentials is None:
+        raise CredentialsError("Credenciais do Google Sheets não configuradas (gcp_service_account).")
+    with timed('import_gspread'):
+        import gspread
+    try:
+        with timed('auth'):
+            return gspread.service_account_from_dict(_credentials)
+    except Exception as e:
+        raise CredentialsError(f"Erro de autenticação Gspread: {e}") from e
+
+
+@cache.ttl_cache(ttl=lambda: config.CLIENT_CACHE_TTL, copy=False, group='client')
+def open_spreadsheet():
+    """Abre a planilha por chave e, se falhar, por título (lógica dupla).
+
+    O objeto da planilha é reaproveitado enquanto o cliente for válido, evitando
+    uma abertura (requisição de metadados) a cada leitura. Com várias frotas, abre
+    a planilha da frota atual (um objeto em cache por frota).
+    """
+    gc = get_gspread_client()
+    sheet_id, title = tenants.tenant_spreadsheet()
+    try:
+        with timed('open'):
+            return gc.open_by_key(sheet_id)
+    except Exception:
+        logger.warning("Falha ao abrir por Chave. Tentando por Título: '%s'...", title)
+        try:
+            return gc.open(title)
+        except Exception as e:
+            # Falha crítica após esgotar as opções
+            raise DataAccessError(
+                f"Falha Crítica ao conectar à planilha. Verifique se a Service Account tem permissão de EDITOR: {e}"
+            ) from e
+
+
+@cache.ttl_cache(ttl=lambda: config.CLIENT_CACHE_TTL, copy=False, group='client')
+def get_worksheet(sh, sheet_name):
+    """Retorna a aba pelo nome, convertendo a exceção do gspread.
+
+    O objeto da aba fica em cache (por frota): cada leitura/gravação seguinte
+    dispensa a requisição de metadados de sh.worksheet().
+    """
+    import gspread
+    try:
+        return sh.worksheet(sheet_name)
+    except gspread.WorksheetNotFound as e:
+        raise SheetNotFoundError(f"A aba/sheet '{sheet_name}' não foi encontrada na planilha. Verifique a ortografia.") from e
+
+
+def get_table_name(sheet_name):
+    """Retorna a tabela lógica de uma aba (ex.: 'servico_2024' -> 'servico')."""
+    if config.SERVICE_PARTITION_PATTERN.match(sheet_name):
+        return 'servico'
+    return sheet_name
+
+
+def get_id_col(sheet_name):
+    """Retorna o nome da coluna de ID da aba (ex.: 'veiculo' -> 'id_veiculo')."""
+    return f'id_{get_table_name(sheet_name)}'
+
+
+def coerce_sheet_types(table_name, df):
+    """Leva as colunas ao tipo final do esquema da tabela (config.COLUMN_TYPES).
+
+    🚀 ESTABILIZAÇÃO DE TIPOS: numéricos vazios/inválidos viram 0 (inteiros ficam
+    int64) e datas inválidas viram NaT; quem lê não precisa converter de novo.
+    """
+    for col, kind in config.COLUMN_TYPES.get(table_name, {}).items():
+        if col not in df.columns:
+            continue
+        column = df[col]
+        if kind == 'date':
+            if not pd.api.types.is_datetime64_any_dtype(column):
+                df[col] = pd.to_datetime(column, errors='coerce')
+            continue
+        if not pd.api.types.is_numeric_dtype(column):
+            column = pd.to_numeric(column, errors='coerce')
+        df[col] = column.fillna(0).astype(int if kind == 'int' else float)
+
+    return df
+
+
+def parse_column(values, kind=None):
+    """Converte uma coluna de textos crus no array tipado ('int', 'float', 'date' ou texto)."""
+    column = pd.Series(values, dtype=object)
+    if kind in ('int', 'float'):
+        # Vazios/inválidos viram NaN (inteiros sem vazios continuam int64)
+        return pd.to_numeric(column, errors='coerce')
+    if kind == 'date':
+        return pd.to_datetime(column, errors='coerce')
+    return column
+
+
+def values_to_frame(values, column_types=None):
+    """Monta o DataFrame coluna a coluna a partir da grade crua (1ª linha = cabeçalho).
+
+    Sem um dicionário por linha: as linhas são transpostas em colunas e cada coluna
+    é convertida de uma vez para o tipo do esquema. Colunas sem cabeçalho são ignoradas.
+    """
+    if not values or not values[0]:
+        return pd.DataFrame()
+    header, rows = values[0], values[1:]
+    width = len(header)
+    if any(len(row) != width for row in rows):
+        rows = [(row + [''] * width)[:width] for row in rows]
+
+    columns = zip(*rows) if rows else [()] * width
+    column_types = column_types or {}
+    return pd.DataFrame({
+        name: parse_column(column, column_types.get(name))
+        for name, column in zip(header, columns) if name != ''
+    })
+
+
+def read_sheet_values(sheet_name, sh=None, fresh=False):
+    """Grade crua da aba (1ª linha = cabeçalho), sem cache.
+
+    💾 Com LOCAL_REPLICA vem da réplica local, sem rede; a aba ainda não replicada
+    (ou `fresh=True`, para jobs de manutenção, ou dentro de cache.fresh_reads(), para
+    quem grava) é lida da planilha e guardada na réplica.
+    """
+    if config.LOCAL_REPLICA and not fresh and not cache.reading_fresh():
+        values = replica.load_values(sheet_name)
+        if values is not None:
+            return values
+    sh = open_spreadsheet() if sh is None else sh
+    worksheet = get_worksheet(sh, sheet_name)
+    try:
+        with timed('first_fetch'):
+            values = worksheet.get_all_values()
+    except Exception as e:
+        raise DataAccessError(f"Erro ao ler a sheet '{sheet_name}': {e}") from e
+    if config.LOCAL_REPLICA:
+        replica.store_values(sheet_name, values)
+    return values
+
+
+def read_sheet_column(sheet_name, col_number):
+    """Valores de uma coluna da aba (1-based, com o cabeçalho), lidos direto da planilha."""
+    sh = open_spreadsheet()
+    worksheet = get_worksheet(sh, sheet_name)
+    try:
+        return worksheet.col_values(col_number)
+    except Exception as e:
+        raise DataAccessError(f"Erro ao ler a sheet '{sheet_name}': {e}") from e
+
+
+def _id_keys(values):
+    """IDs comparáveis: número quando o texto é numérico ('7' == 7), senão o texto sem espaços."""
+    values = pd.Series(list(values), dtype=object)
+    text = values.mask(values.isna(), '').astype(str).str.strip()
+    numbers = pd.to_numeric(text, errors='coerce')
+    return numbers.astype(object).where(numbers.notna(), text).to_numpy()
+
+
+def check_row_ids(sheet_name, id_col, col_number, rows, ids):
+    """Garante que as linhas `rows` da aba (1-based) ainda guardam os IDs `ids` antes de gravar nelas.
+
+    Lê só a coluna de ID (uma chamada). Se o cabeçalho ou algum ID não confere
+    (linhas inseridas/removidas/reordenadas desde a leitura), levanta
+    DataAccessError: gravar por posição alteraria outros registros.
+    """
+    values = read_sheet_column(sheet_name, col_number)
+    # col_values corta as células vazias do fim: linhas além dela têm ID em branco
+    found = pd.Series(values[1:], dtype=object).reindex(pd.Index(rows) - 2)
+    if not values or values[0] != id_col or not (_id_keys(found) == _id_keys(ids)).all():
+        raise DataAccessError(
+            f"A aba '{sheet_name}' foi alterada fora desta sessão (linhas mudaram de posição); "
+            "nada foi gravado. Recarregue os dados e tente de novo."
+        )
+
+
+def read_worksheet(sheet_name, sh=None, fresh=False):
+    """Lê a aba sem cache, com cada coluna já no tipo do esquema (config.COLUMN_TYPES)."""
+    # Grade crua em vez de get_all_records: nada de um dict por linha
+    values = read_sheet_values(sheet_name, sh, fresh)
+    return values_to_frame(values, config.COLUMN_TYPES.get(get_table_name(sheet_name)))
+
+
+def to_sheet_value(value):
+    """Converte um valor Python/NumPy/Pandas para o formato gravado na planilha."""
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.strftime('%Y-%m-%d') if pd.notna(value) else ''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return value
+
+
+def serialize_for_sheet(df):
+    """Converte o DataFrame em lista de linhas aceita pela API (datas em ISO, vazios como '')."""
+    df_out = df.copy()
+    for col in df_out.columns:
+        if pd.api.types.is_datetime64_any_dtype(df_out[col]):
+            df_out[col] = df_out[col].dt.strftime('%Y-%m-%d')
+    df_out = df_out.astype(object).where(pd.notna(df_out), '')
+    return [df_out.columns.tolist()] + df_out.values.tolist()
+
+
+def write_sheet_data(sheet_name, df_new, clear_cache=True):
+    """Sobrescreve a aba/sheet com o novo DataFrame (usado em Update/Delete)."""
+    sh = open_spreadsheet()
+    try:
+        try:
+            worksheet = get_worksheet(sh, sheet_name)
+        except SheetNotFoundError:
+            # Partições de serviço são criadas na primeira gravação do ano, já do tamanho dos dados
+            if not config.SERVICE_PARTITION_PATTERN.match(sheet_name):
+                raise
+            worksheet = sh.add_worksheet(title=sheet_name, rows=len(df_new) + 1, cols=max(len(df_new.columns), 1))
+
+        data_to_write = serialize_for_sheet(df_new)
+
+        # O update não expande a grade da aba: ela cresce antes, se os dados não couberem
+        if worksheet.row_count < len(data_to_write):
+            worksheet.add_rows(len(data_to_write) - worksheet.row_count)
+        if worksheet.col_count < len(df_new.columns):
+            worksheet.add_cols(len(df_new.columns) - worksheet.col_count)
+
+        # Operação de reescrever TUDO (o gargalo)
+        worksheet.clear()
+        worksheet.update('A1', data_to_write, value_input_option='USER_ENTERED')
+    except Exception as e:
+        raise DataAccessError(f"Erro ao escrever na sheet '{sheet_name}': {e}") from e
+
+    if config.LOCAL_REPLICA:
+        replica.store_values(sheet_name, data_to_write)
+
+    if clear_cache:
+        cache.clear_all()
+
+
+def write_sheet_cells(sheet_name, cells, clear_cache=True):
+    """Grava só as células informadas [(linha, coluna, valor), 1-based] em uma única chamada."""
+    import gspread
+    if not cells:
+        return
+    sh = open_spreadsheet()
+    try:
+        worksheet = get_worksheet(sh, sheet_name)
+        worksheet.batch_update(
+            [{'range': gspread.utils.rowcol_to_a1(row, col), 'values': [[to_sheet_value(value)]]} for row, col, value in cells],
+            value_input_option='USER_ENTERED',
+        )
+    except Exception as e:
+        raise DataAccessError(f"Erro ao escrever na sheet '{sheet_name}': {e}") from e
+
+    if config.LOCAL_REPLICA:
+        replica.update_cells(sheet_name, [(row, col, to_sheet_value(value)) for row, col, value in cells])
+
+    if clear_cache:
+        cache.clear_all()
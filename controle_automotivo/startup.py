@@ -0,0 +1,98 @@
+"""⏱️ Tempo de inicialização: importação, autenticação, abertura da planilha e primeira leitura.
+
+Cada fase é medida só na primeira vez em que acontece no processo. O app registra
+o relatório no log após a primeira renderização, e `python -m controle_automotivo
+startup-report` mede uma inicialização a frio em um interpretador novo, para
+acompanhar o tempo de release em release.
+"""
+
+import json
+import logging
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from .errors import DataAccessError
+
+logger = logging.getLogger(__name__)
+
+# Ordem de exibição das fases conhecidas (outras fases vêm depois, na ordem em que ocorreram)
+PHASES = ('import', 'import_gspread', 'auth', 'open', 'first_fetch', 'first_render')
+# Fases que acontecem dentro da primeira renderização do app (não somam de novo no total)
+_RENDER_PHASES = ('import_gspread', 'auth', 'open', 'first_fetch')
+
+_phases = {}
+_logged = False
+
+# Executado em um interpretador novo: a importação do pacote faz parte da medição
+_COLD_START_SCRIPT = (
+    "import time; _t0 = time.perf_counter()\n"
+    "import controle_automotivo\n"
+    "from controle_automotivo.startup import _run_cold_start\n"
+    "_run_cold_start(_t0)\n"
+)
+
+
+def record(phase, seconds):
+    """Registra a duração de uma fase (só a primeira medição de cada fase vale)."""
+    _phases.setdefault(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """Mede o bloco como `phase`, se a fase ainda não foi medida neste processo."""
+    if phase in _phases:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def startup_report():
+    """Duração (ms) de cada fase já medida e o total: {fase: ms}."""
+    order = [p for p in PHASES if p in _phases] + [p for p in _phases if p not in PHASES]
+    report = {phase: round(_phases[phase] * 1000, 1) for phase in order}
+    nested = _RENDER_PHASES if 'first_render' in report else ()
+    report['total'] = round(sum(ms for phase, ms in report.items() if phase not in nested), 1)
+    return report
+
+
+def log_startup_report():
+    """Registra o relatório no log uma única vez, quando a primeira leitura já aconteceu."""
+    global _logged
+    if _logged or 'first_fetch' not in _phases:
+        return
+    _logged = True
+    logger.info("Inicialização (ms): %s", ', '.join(f'{phase}={ms}' for phase, ms in startup_report().items()))
+
+
+def _run_cold_start(t0):
+    from .cli import load_credentials
+    from .sheets import configure
+    from .tables import get_data
+
+    record('import', time.perf_counter() - t0)
+    credentials_path, sheet_id, table = (sys.argv[1:] + ['', '', 'veiculo'])[:3]
+    configure(credentials=load_credentials(credentials_path or None), sheet_id=sheet_id or None)
+    get_data(table)
+    print(json.dumps(startup_report()))
+
+
+def measure_cold_start(credentials_path=None, sheet_id=None, table='veiculo', runs=3):
+    """Mede `runs` inicializações a frio (cada uma em um processo novo) e retorna a mediana por fase."""
+    reports = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-c', _COLD_START_SCRIPT, credentials_path or '', sheet_id or '', table],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            detail = (result.stderr.strip().splitlines() or ['sem saída'])[-1]
+            raise DataAccessError(f"Falha na medição de inicialização: {detail}")
+        reports.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {phase: round(statistics.median(r[phase] for r in reports if phase in r), 1) for phase in reports[0]}
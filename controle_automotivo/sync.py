@@ -0,0 +1,100 @@
+"""🔄 Sincronização da réplica local (replica.py) com a planilha.
+
+A cada REPLICA_SYNC_INTERVAL segundos o worker confere o modifiedTime da planilha
+no Drive (uma chamada leve): sem mudança, nada é lido. Com mudança, todas as abas
+replicadas vêm em uma única chamada (values_batch_get) e só as linhas cujo hash
+mudou são regravadas no SQLite; os caches em memória só são descartados se algo
+mudou. A API do Sheets não entrega só as linhas alteradas, então a leitura de rede
+é da aba inteira, mas apenas quando a planilha mudou.
+"""
+
+import logging
+import threading
+import time
+
+from . import cache, config, replica
+from .errors import DataAccessError
+from .sheets import is_configured, open_spreadsheet
+from .tenants import list_tenants, use_tenant
+
+logger = logging.getLogger(__name__)
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def is_replicated(title):
+    """True para as abas que a réplica guarda (tabelas, partições e log de alterações)."""
+    return (
+        title in config.EXPECTED_COLS or title == config.CHANGE_LOG_SHEET
+        or config.SERVICE_PARTITION_PATTERN.match(title) is not None
+    )
+
+
+def _modified_time(sh):
+    """modifiedTime da planilha no Drive, ou None se não estiver disponível (escopo/permissão)."""
+    try:
+        return sh.get_lastUpdateTime()
+    except Exception as e:
+        logger.debug("modifiedTime indisponível; comparando as abas: %s", e)
+        return None
+
+
+def sync_replica():
+    """Traz para a réplica as alterações da planilha da frota atual.
+
+    Retorna {aba: nº de linhas alteradas} (vazio se nada mudou).
+    """
+    sh = open_spreadsheet()
+    try:
+        marker = _modified_time(sh)
+        if marker is not None and marker == replica.get_marker():
+            replica.mark_synced()
+            return {}
+        titles = [worksheet.title for worksheet in sh.worksheets() if is_replicated(worksheet.title)]
+        # Todas as abas em uma única requisição
+        ranges = ["'{}'".format(title.replace("'", "''")) for title in titles]
+        value_ranges = sh.values_batch_get(ranges).get('valueRanges', []) if ranges else []
+    except Exception as e:
+        raise DataAccessError(f"Erro ao sincronizar a réplica local: {e}") from e
+
+    changes = {}
+    for title, value_range in zip(titles, value_ranges):
+        n_changed = replica.store_values(title, value_range.get('values', []))
+        if n_changed:
+            changes[title] = n_changed
+    for title in set(replica.list_sheets()) - set(titles):
+        replica.drop_sheet(title)
+        changes[title] = 0
+    replica.set_marker(marker or '')
+
+    if changes:
+        cache.clear_all()
+    return changes
+
+
+def _sync_loop():
+    while True:
+        time.sleep(config.REPLICA_SYNC_INTERVAL)
+        if not (config.LOCAL_REPLICA and is_configured()):
+            continue
+        for tenant in list_tenants():
+            try:
+                with use_tenant(tenant):
+                    changes = sync_replica()
+            except DataAccessError as e:
+                # A réplica continua servindo a última cópia
+                logger.warning("Sincronização da réplica adiada (frota %s): %s", tenant, e)
+                continue
+            if changes:
+                logger.info("Réplica sincronizada (frota %s): %s", tenant, changes)
+
+
+def start_sync_worker():
+    """Inicia (uma vez por processo) a thread que mantém a réplica local em dia."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_sync_loop, name='sync-replica', daemon=True)
+            _worker.start()
+    return _worker
@@ -0,0 +1,263 @@
+"""Leitura das tabelas (com cache), filtros e a simulação do JOIN do SQL."""
+
+import threading
+import time
+from datetime import date
+
+import pandas as pd
+
+from . import cache, config, replica, tenants
+from .changelog import apply_change_log, get_change_log
+from .partitions import get_service_partitions
+from .sheets import coerce_sheet_types, get_table_name, read_worksheet
+
+
+# Visão "só ativas" de cada aba, refeita apenas quando a leitura em cache muda
+_live_views = {}  # (frota, sheet_name) -> (stored_at da leitura, DataFrame)
+_live_views_lock = threading.Lock()
+
+
+@cache.on_tenant_evicted
+def _drop_live_views(tenant):
+    with _live_views_lock:
+        for key in [key for key in _live_views if key[0] == tenant]:
+            del _live_views[key]
+
+
+@cache.ttl_cache(ttl=cache.data_ttl, max_stale=lambda: config.DATA_MAX_STALENESS)
+def get_sheet_rows(sheet_name):
+    """Todas as linhas gravadas na aba (inclusive as excluídas logicamente), com conversões iniciais.
+
+    Vencido o TTL, a última leitura continua sendo servida (até DATA_MAX_STALENESS)
+    enquanto a aba é relida em segundo plano.
+    """
+    table_name = get_table_name(sheet_name)
+    df = read_worksheet(sheet_name)
+
+    # 📝 Estado atual = snapshot compactado + cauda do log de alterações
+    if config.CHANGE_LOG_MODE and sheet_name in config.EXPECTED_COLS:
+        df = apply_change_log(sheet_name, df, get_change_log())
+
+    if df.empty:
+        return pd.DataFrame(columns=config.EXPECTED_COLS.get(table_name, []))
+
+    return coerce_sheet_types(table_name, df)
+
+
+def live_rows(df):
+    """Só as linhas ativas (sem data de exclusão), sem a coluna de controle."""
+    if config.DELETED_COL not in df.columns:
+        return df
+    return df[df[config.DELETED_COL].isna()].drop(columns=config.DELETED_COL).reset_index(drop=True)
+
+
+def get_sheet_data(sheet_name):
+    """Lê os dados de uma aba/sheet e retorna um DataFrame, com conversões iniciais.
+
+    Os registros excluídos logicamente já vêm filtrados (uma vez por leitura, não a cada chamada).
+    """
+    df_rows = get_sheet_rows(sheet_name)
+    stored_at = get_sheet_rows.stored_at(sheet_name)
+    key = (tenants.current_tenant(), sheet_name)
+    with _live_views_lock:
+        view = _live_views.get(key)
+    if view is None or view[0] != stored_at:
+        live = live_rows(df_rows)
+        # Compartilhada entre chamadas como as abas em cache: somente leitura
+        view = (stored_at, live if live is df_rows else cache.freeze(live))
+        with _live_views_lock:
+            _live_views[key] = view
+    return view[1].copy(deep=False)
+
+
+def data_version(*sheet_names):
+    """Versão dos dados que get_data(sheet_name) devolveria, sem ler nem percorrer as tabelas.
+
+    É a versão das entradas em cache de onde eles saem (as partições de serviço e o
+    log de alterações, quando ativos): muda a cada releitura, gravação ou descarte.
+    """
+    versions = []
+    for sheet_name in sheet_names:
+        if sheet_name == 'servico' and config.SERVICE_PARTITIONING:
+            versions.append(get_service_partitions.version())
+            versions.extend(get_sheet_rows.version(name) for name in (get_service_partitions.peek() or {}).values())
+        else:
+            versions.append(get_sheet_rows.version(sheet_name))
+    if config.CHANGE_LOG_MODE:
+        versions.append(get_change_log.version())
+    return tuple(versions)
+
+
+def get_data_age():
+    """Idade (segundos) da leitura mais antiga entre as abas em cache; None se nada foi lido.
+
+    💾 Com LOCAL_REPLICA, a idade da sincronização mais antiga da réplica.
+    """
+    if config.LOCAL_REPLICA:
+        synced = replica.oldest_sync()
+        return None if synced is None else time.time() - synced
+    names = list(config.EXPECTED_COLS)
+    if config.SERVICE_PARTITIONING:
+        names += list((get_service_partitions.peek() or {}).values())
+    stored = [t for t in (get_sheet_rows.stored_at(name) for name in names) if t is not None]
+    return time.monotonic() - min(stored) if stored else None
+
+
+def get_service_data(years=None, include_deleted=False):
+    """Retorna a tabela de serviços; com particionamento, lê só as partições dos anos pedidos.
+
+    `years=None` lê todas as partições. Com CHANGE_LOG_MODE a cauda do log é
+    reaplicada sobre as partições lidas. `include_deleted=True` mantém as linhas
+    excluídas logicamente (e a coluna DELETED_COL), como estão gravadas.
+    """
+    if not config.SERVICE_PARTITIONING:
+        return get_sheet_rows('servico') if include_deleted else get_sheet_data('servico')
+
+    partitions = get_service_partitions()
+    names = [name for year, name in partitions.items() if years is None or year in years]
+    frames = [get_sheet_rows(name) for name in names]
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        df = pd.DataFrame(columns=config.EXPECTED_COLS['servico'])
+    else:
+        df = pd.concat(frames, ignore_index=True)
+
+    if config.CHANGE_LOG_MODE:
+        df = coerce_sheet_types('servico', apply_change_log('servico', df, get_change_log()))
+        if years is not None and not df.empty:
+            df = df[df['data_servico'].dt.year.isin(years)].reset_index(drop=True)
+    return df if include_deleted else live_rows(df)
+
+
+def get_data(sheet_name, filter_col=None, filter_value=None, include_deleted=False):
+    """Busca dados de uma aba/sheet e retorna um DataFrame do Pandas, com filtro opcional.
+
+    Registros excluídos logicamente ficam de fora, a menos que `include_deleted=True`.
+    """
+    if sheet_name == 'servico' and config.SERVICE_PARTITIONING:
+        df = get_service_data(include_deleted=include_deleted)
+    elif include_deleted:
+        df = get_sheet_rows(sheet_name)
+    else:
+        df = get_sheet_data(sheet_name)
+    if df.empty:
+        return df
+
+    if filter_col and filter_value is not None:
+        try:
+            column = df[filter_col]
+            # Garante que o ID é inteiro para comparação (sem alterar a tabela em cache)
+            if filter_col.startswith('id_'):
+                if not pd.api.types.is_integer_dtype(column):
+                    column = pd.to_numeric(column, errors='coerce').fillna(0).astype(int)
+                # Garante que o valor de filtro seja inteiro
+                filter_value = int(filter_value) if pd.notna(filter_value) else 0
+
+            df_filtered = df[column == filter_value]
+            return df_filtered
+        except (KeyError, TypeError, ValueError):
+            return pd.DataFrame()
+
+    return df
+
+
+def patch_cached_tables(frames):
+    """Atualiza o cache com as abas recém-gravadas ({aba: DataFrame}), sem reler a planilha.
+
+    Só os agregados derivados dessas abas são descartados; as demais abas continuam em cache.
+    """
+    for sheet_name, df in frames.items():
+        table_name = get_table_name(sheet_name)
+        if df.empty:
+            df_typed = pd.DataFrame(columns=config.EXPECTED_COLS.get(table_name, []))
+        else:
+            df_typed = coerce_sheet_types(table_name, df.copy(deep=False))
+        get_sheet_rows.set_entry((sheet_name,), df_typed)
+        get_partition_spend.discard(sheet_name)
+
+        # Partição criada nesta gravação (ano novo): a lista de partições mudou
+        partitions = get_service_partitions.peek()
+        if sheet_name != table_name and (partitions is None or sheet_name not in partitions.values()):
+            get_service_partitions.clear()
+
+
+@cache.ttl_cache(ttl=cache.data_ttl)
+def get_partition_spend(sheet_name):
+    """Total gasto por id_veiculo em uma partição (agregado em cache por partição)."""
+    df = get_sheet_data(sheet_name)
+    if df.empty:
+        return pd.Series(dtype=float)
+    return df.groupby('id_veiculo')['valor'].sum()
+
+
+def get_spend_by_vehicle():
+    """Total gasto em serviços por veículo, combinando os agregados de cada partição."""
+    has_pending_log = config.CHANGE_LOG_MODE and (get_change_log()['sheet'] == 'servico').any()
+    if config.SERVICE_PARTITIONING and not has_pending_log:
+        partials = [get_partition_spend(name) for name in get_service_partitions().values()]
+        partials = [s for s in partials if not s.empty]
+        totals = pd.concat(partials).groupby(level=0).sum() if partials else pd.Series(dtype=float)
+    else:
+        df_servicos = get_data('servico')
+        totals = df_servicos.groupby('id_veiculo')['valor'].sum() if not df_servicos.empty else pd.Series(dtype=float)
+
+    df_veiculos = get_data('veiculo')
+    if totals.empty or df_veiculos.empty:
+        return pd.DataFrame(columns=['Veículo', 'Total Gasto em Serviços'])
+
+    df_totals = totals.rename('Total Gasto em Serviços').rename_axis('id_veiculo').reset_index()
+    df_totals = df_totals.merge(df_veiculos[['id_veiculo', 'nome']], on='id_veiculo', how='inner')
+    resumo = df_totals.groupby('nome')['Total Gasto em Serviços'].sum().sort_values(ascending=False).reset_index()
+    return resumo.rename(columns={'nome': 'Veículo'})
+
+
+# --- FUNÇÃO QUE SIMULA O JOIN DO SQL ---
+
+
+def get_full_service_data(date_start=None, date_end=None):
+    """Lê todos os dados e simula a operação JOIN do SQL no Pandas."""
+
+    # 🗂️ Com particionamento, lê só as partições dos anos do filtro
+    years = set(range(date_start.year, date_end.year + 1)) if date_start and date_end else None
+    df_servicos = get_service_data(years)
+    df_veiculos = get_data('veiculo')
+    df_prestadores = get_data('prestador')
+
+    if df_servicos.empty or df_veiculos.empty or df_prestadores.empty:
+        return pd.DataFrame()
+
+    # IDs e numéricos já chegam convertidos (coerce_sheet_types); as tabelas em
+    # cache são compartilhadas e não são alteradas aqui.
+    # -----------------------------------------------
+    # 1. JOIN com Veículo
+    df_merged = pd.merge(df_servicos, df_veiculos[['id_veiculo', 'nome', 'placa']], on='id_veiculo', how='left')
+
+    # 2. JOIN com Prestador
+    df_merged = pd.merge(df_merged, df_prestadores[['id_prestador', 'empresa', 'cidade']], on='id_prestador', how='left')
+
+    # Renomeia colunas para o display
+    df_merged = df_merged.rename(columns={'nome': 'Veículo', 'placa': 'Placa', 'empresa': 'Empresa', 'cidade': 'Cidade', 'nome_servico': 'Serviço', 'data_servico': 'Data', 'valor': 'Valor'})
+
+    # Converte colunas de data (sem NaT)
+    df_merged['Data'] = pd.to_datetime(df_merged['Data'], errors='coerce')
+    df_merged['data_vencimento'] = pd.to_datetime(df_merged['data_vencimento'], errors='coerce')
+
+    # CÁLCULO: Dias para Vencer (Dias Restantes)
+    df_merged['Dias para Vencer'] = (df_merged['data_vencimento'] - pd.to_datetime(date.today())).dt.days
+
+
+    # 3. Filtragem por Data (se necessário)
+
+    if date_start and date_end:
+        df_merged = df_merged[(df_merged['Data'] >= pd.to_datetime(date_start)) & (df_merged['Data'] <= pd.to_datetime(date_end))]
+
+    return df_merged.sort_values(by='Data', ascending=False)
+
+
+def get_due_services(days=30):
+    """Serviços cuja garantia vence nos próximos `days` dias (inclui os que vencem hoje)."""
+    df_merged = get_full_service_data()
+    if df_merged.empty:
+        return df_merged
+    due = df_merged['Dias para Vencer'].between(0, days)
+    return df_merged[due].sort_values(by='Dias para Vencer')
@@ -0,0 +1,77 @@
+"""🏢 Várias frotas (uma planilha cada) servidas pelo mesmo processo.
+
+As frotas ficam em config.TENANTS ({nome: {'sheet_id': ..., 'title': ...}}). A frota
+em uso fica em uma ContextVar: cada sessão do Streamlit roda na sua própria thread,
+e as releituras em segundo plano herdam o contexto de quem as disparou. Sem frota
+selecionada vale a planilha padrão (config.SHEET_ID / PLANILHA_TITULO).
+
+🔒 A frota é só uma escolha da sessão, não uma barreira de segurança: uma frota
+sem a chave 'usuarios' pode ser aberta por qualquer sessão. Com 'usuarios' (lista
+de e-mails), só os usuários listados a veem (ver allowed_tenants()).
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import config
+from .errors import ValidationError
+
+_current = ContextVar('controle_automotivo_tenant', default=None)
+
+
+def list_tenants():
+    """Frotas configuradas; [None] quando só existe a planilha padrão."""
+    return list(config.TENANTS) or [None]
+
+
+def allowed_tenants(user=None):
+    """Frotas que o usuário (e-mail, ou None sem login) pode selecionar.
+
+    Frotas com 'usuarios' na configuração só valem para os e-mails listados
+    (sem diferenciar maiúsculas); as demais ficam abertas a qualquer sessão.
+    """
+    user = (user or '').strip().lower()
+    return [
+        name for name, entry in config.TENANTS.items()
+        if 'usuarios' not in entry or (user and user in {str(email).strip().lower() for email in entry['usuarios']})
+    ]
+
+
+def restricted_tenants():
+    """True se alguma frota restringe o acesso a uma lista de usuários."""
+    return any('usuarios' in entry for entry in config.TENANTS.values())
+
+
+def _check(tenant):
+    if tenant is not None and tenant not in config.TENANTS:
+        raise ValidationError(f"Frota '{tenant}' não configurada.")
+    return tenant
+
+
+def current_tenant():
+    """Frota do contexto atual (None = planilha padrão)."""
+    return _current.get()
+
+
+def set_tenant(tenant):
+    """Seleciona a frota do contexto atual (a thread da sessão, no Streamlit)."""
+    _current.set(_check(tenant))
+
+
+@contextmanager
+def use_tenant(tenant):
+    """Usa a frota só dentro do bloco `with` (jobs que percorrem várias frotas)."""
+    token = _current.set(_check(tenant))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def tenant_spreadsheet():
+    """(ID, título) da planilha da frota atual."""
+    tenant = current_tenant()
+    if tenant is None:
+        return config.SHEET_ID, config.PLANILHA_TITULO
+    entry = config.TENANTS[tenant]
+    return entry.get('sheet_id'), entry.get('title')
@@ -0,0 +1,397 @@
+"""Unidade de trabalho: lê cada aba uma vez e grava um lote por aba alterada."""
+
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import cache, config
+from .changelog import append_change_events, build_change_event, maybe_compact_change_log, patch_cached_change_log
+from .errors import DataAccessError
+from .partitions import plan_table_writes
+from .sheets import check_row_ids, get_id_col, write_sheet_cells, write_sheet_data
+from .tables import get_data, live_rows, patch_cached_tables
+
+logger = logging.getLogger(__name__)
+
+# Instante (time.monotonic) do último commit gravado neste processo
+_last_commit_at = time.monotonic()
+
+
+def idle_seconds():
+    """Segundos desde o último commit gravado neste processo (usado para achar períodos calmos)."""
+    return time.monotonic() - _last_commit_at
+
+
+class UnitOfWork:
+    """Agrupa várias alterações (em uma ou mais abas) em uma única transação.
+
+    Cada aba é lida uma única vez, na primeira vez em que é usada, e as
+    alterações são aplicadas em memória. O commit grava um único lote por
+    worksheet alterada; se alguma gravação falhar, as abas já gravadas são
+    restauradas ao conteúdo original (rollback) e a DataAccessError é propagada.
+    Abas que só tiveram atualizações (sem inserir/excluir linhas) gravam apenas
+    as células alteradas. Com SOFT_DELETE, excluir é uma atualização da coluna
+    DELETED_COL (a tabela de trabalho mantém as linhas excluídas, como na planilha).
+    Com CHANGE_LOG_MODE ativo, o commit anexa todos os eventos ao log em uma
+    única chamada.
+
+    Uso:
+        with UnitOfWork() as uow:
+            id_prestador = uow.insert('prestador', dados_prestador)
+            uow.insert('servico', {..., 'id_prestador': id_prestador})
+            uow.commit()
+    """
+
+    def __init__(self):
+        self._originals = {}  # sheet_name -> DataFrame como foi lido
+        self._tables = {}     # sheet_name -> DataFrame de trabalho
+        self._dirty = []      # abas alteradas, na ordem da primeira alteração
+        self._events = []     # linhas do log de alterações (CHANGE_LOG_MODE)
+        self._cells = {}      # sheet_name -> {(id, coluna)} atualizados
+        self._structural = set()  # abas com linhas inseridas/excluídas
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Uma exceção dentro do bloco descarta as alterações pendentes
+        if exc_type is not None:
+            self.rollback()
+        return False
+
+    @property
+    def has_changes(self):
+        """True se há alterações ainda não gravadas."""
+        return bool(self._dirty)
+
+    def table(self, sheet_name):
+        """Retorna o DataFrame de trabalho da aba, lendo a planilha só na primeira chamada.
+
+        A leitura ignora o cache (e a réplica local): novos IDs (máximo + 1) e as
+        posições das linhas gravadas vêm do estado atual da planilha, não de uma
+        cópia servida enquanto é revalidada. A leitura nova também renova o cache.
+        """
+        if sheet_name not in self._tables:
+            # Visão rasa da tabela em cache (somente leitura): update()/update_cells()
+            # copiam cada coluna antes de alterá-la
+            with cache.fresh_reads():
+                df = get_data(sheet_name, include_deleted=True)
+            id_col = get_id_col(sheet_name)
+            if id_col in df.columns and not pd.api.types.is_integer_dtype(df[id_col]):
+                df[id_col] = pd.to_numeric(df[id_col], errors='coerce').fillna(0).astype(int)
+            self._originals[sheet_name] = df.copy(deep=False)
+            self._tables[sheet_name] = df
+        return self._tables[sheet_name]
+
+    def live(self, sheet_name):
+        """Tabela de trabalho sem as linhas excluídas logicamente (o que os leitores enxergam)."""
+        return live_rows(self.table(sheet_name))
+
+    def find(self, sheet_name, filter_col, filter_value):
+        """Filtra a tabela em memória (mesma semântica de get_data)."""
+        df = self.live(sheet_name)
+        if df.empty or filter_col not in df.columns:
+            return df.iloc[0:0]
+        if filter_col.startswith('id_'):
+            filter_value = int(filter_value) if pd.notna(filter_value) else 0
+        return df[df[filter_col] == filter_value]
+
+    def _touch(self, sheet_name):
+        if sheet_name not in self._dirty:
+            self._dirty.append(sheet_name)
+
+    def _mark_dirty(self, sheet_name, operation, id_value, data=None):
+        self._touch(sheet_name)
+        self._events.append(build_change_event(sheet_name, operation, id_value, data))
+
+    def insert(self, sheet_name, data, id_col=None):
+        """Insere uma linha (ID = máximo + 1, simulando AUTO_INCREMENT) e retorna o novo ID."""
+        return self.insert_many(sheet_name, pd.DataFrame([dict(data)]), id_col=id_col)[0]
+
+    def insert_many(self, sheet_name, df_rows, id_col=None):
+        """Insere todas as linhas de `df_rows` de uma vez e retorna a lista dos novos IDs.
+
+        Os IDs são sequenciais a partir do máximo + 1 (o ID que vier em `df_rows` é
+        ignorado) e a tabela de trabalho recebe as linhas em um único concat.
+        """
+        id_col = get_id_col(sheet_name) if id_col is None else id_col
+        df = self.table(sheet_name)
+        if df_rows.empty:
+            return []
+
+        start = 1 if df.empty else int(df[id_col].max()) + 1
+        new_ids = np.arange(start, start + len(df_rows))
+        df_new = df_rows.reset_index(drop=True).assign(**{id_col: new_ids})
+
+        if df.columns.empty:
+            df_updated = df_new
+        else:
+            df_updated = pd.concat([df, df_new], ignore_index=True)[df.columns] # Reordena colunas
+            for col in df.columns:
+                if pd.api.types.is_datetime64_any_dtype(df[col]):
+                    df_updated[col] = pd.to_datetime(df_updated[col], errors='coerce')
+
+        self._tables[sheet_name] = df_updated
+        self._structural.add(sheet_name)
+        for new_id, row in zip(new_ids.tolist(), df_new.to_dict('records')):
+            self._mark_dirty(sheet_name, 'insert', new_id, row)
+        return new_ids.tolist()
+
+    def update(self, sheet_name, id_value, data, id_col=None):
+        """Atualiza os campos informados da linha com o ID dado. Retorna False se não existir."""
+        id_col = get_id_col(sheet_name) if id_col is None else id_col
+        df = self.table(sheet_name)
+        if df.empty or id_value is None:
+            return False
+
+        index_to_modify = df[df[id_col] == int(id_value)].index
+        if index_to_modify.empty:
+            return False
+
+        for key, value in data.items():
+            if key not in df.columns:
+                continue
+            # Mantém colunas de data como datetime; as demais aceitam qualquer valor
+            if pd.api.types.is_datetime64_any_dtype(df[key]):
+                value = pd.to_datetime(value, errors='coerce')
+                column = df[key].copy()
+            else:
+                column = df[key].astype(object, copy=True)
+            column.loc[index_to_modify] = value
+            df[key] = column
+            self._cells.setdefault(sheet_name, set()).add((int(id_value), key))
+        self._mark_dirty(sheet_name, 'update', id_value, data)
+        return True
+
+    def update_cells(self, sheet_name, changes, id_col=None):
+        """Aplica várias células de uma vez. `changes` é uma Series indexada por (id, coluna).
+
+        A atribuição é vetorizada por coluna; cada linha alterada gera um evento
+        de update só com os campos que mudaram. Retorna o nº de linhas alteradas.
+        """
+        id_col = get_id_col(sheet_name) if id_col is None else id_col
+        df = self.table(sheet_name)
+        if df.empty or changes.empty:
+            return 0
+
+        ids = changes.index.get_level_values(0).astype(int)
+        cols = changes.index.get_level_values(1)
+        changes = changes[ids.isin(df[id_col]) & cols.isin(df.columns)]
+        if changes.empty:
+            return 0
+
+        # Por coluna, o novo valor de cada ID é levado às linhas pelo map (IDs repetidos
+        # na aba recebem o mesmo valor, como em update())
+        for col, values in changes.groupby(level=1, sort=False):
+            values = values.droplevel(1)
+            values.index = values.index.astype(int)
+            rows = df[id_col].isin(values.index)
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                new_values = pd.to_datetime(values, errors='coerce')
+                column = df[col].copy()
+            else:
+                new_values = values.astype(object)
+                column = df[col].astype(object, copy=True)
+            column.loc[rows] = df.loc[rows, id_col].map(new_values)
+            df[col] = column
+
+        cells = self._cells.setdefault(sheet_name, set())
+        for id_value, values in changes.groupby(level=0, sort=False):
+            fields = dict(zip(values.index.get_level_values(1), values.to_numpy(dtype=object)))
+            cells.update((int(id_value), col) for col in fields)
+            self._mark_dirty(sheet_name, 'update', int(id_value), fields)
+        return changes.index.get_level_values(0).nunique()
+
+    def delete(self, sheet_name, id_value, id_col=None):
+        """Exclui a linha com o ID dado. Retorna False se não existir (ou já estiver excluída).
+
+        Com SOFT_DELETE a linha só recebe a data da exclusão (uma célula gravada).
+        """
+        if id_value is None:
+            return False
+        return self.delete_many(sheet_name, [id_value], id_col=id_col) > 0
+
+    def delete_many(self, sheet_name, ids, id_col=None):
+        """Exclui de uma vez as linhas com os IDs dados. Retorna quantos IDs foram excluídos.
+
+        Uma única máscara (isin) para todos os IDs: com SOFT_DELETE a coluna
+        DELETED_COL recebe a data em uma atribuição; sem ela as linhas saem em um
+        único drop. IDs inexistentes ou já excluídos são ignorados.
+        """
+        id_col = get_id_col(sheet_name) if id_col is None else id_col
+        df = self.table(sheet_name)
+        ids = pd.Index(pd.to_numeric(pd.Series(list(ids), dtype=object), errors='coerce')).dropna().astype(int)
+        if df.empty or ids.empty:
+            return 0
+
+        mask = df[id_col].isin(ids)
+        if config.DELETED_COL in df.columns:
+            mask &= df[config.DELETED_COL].isna()
+        if not mask.any():
+            return 0
+        deleted_ids = df.loc[mask, id_col].unique()
+
+        if config.SOFT_DELETE:
+            deleted_at = pd.Timestamp.now().normalize()
+            if config.DELETED_COL in df.columns:
+                column = pd.to_datetime(df[config.DELETED_COL], errors='coerce')
+            else:
+                column = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+            # Nova coluna (mask devolve cópia): a tabela em cache é somente leitura
+            df[config.DELETED_COL] = column.mask(mask, deleted_at)
+            self._cells.setdefault(sheet_name, set()).update((int(id_value), config.DELETED_COL) for id_value in deleted_ids)
+            for id_value in deleted_ids:
+                self._mark_dirty(sheet_name, 'update', int(id_value), {config.DELETED_COL: deleted_at})
+            return len(deleted_ids)
+
+        self._tables[sheet_name] = df[~mask].reset_index(drop=True)
+        self._structural.add(sheet_name)
+        for id_value in deleted_ids:
+            self._mark_dirty(sheet_name, 'delete', int(id_value))
+        return len(deleted_ids)
+
+    def purge(self, sheet_name, ids, id_col=None, cutoff=None):
+        """Remove de fato as linhas excluídas com os IDs dados (limpeza dos excluídos).
+
+        Só saem linhas com DELETED_COL preenchida (e, com `cutoff`, excluídas até
+        essa data): uma linha ativa com o mesmo ID (IDs repetidos) fica. Como o
+        evento delete do log remove todas as linhas do ID, ele só é gravado para IDs
+        sem linha ativa; com CHANGE_LOG_MODE os demais ficam para depois.
+        Retorna quantas linhas saíram.
+        """
+        id_col = get_id_col(sheet_name) if id_col is None else id_col
+        df = self.table(sheet_name)
+        if df.empty or config.DELETED_COL not in df.columns:
+            return 0
+
+        tombstone = df[config.DELETED_COL].notna()
+        live_ids = set(df.loc[~tombstone, id_col])
+        mask = tombstone & df[id_col].isin(list(ids))
+        if cutoff is not None:
+            mask &= df[config.DELETED_COL] <= cutoff
+        if config.CHANGE_LOG_MODE:
+            mask &= ~df[id_col].isin(live_ids)
+        if not mask.any():
+            return 0
+        self._tables[sheet_name] = df[~mask].reset_index(drop=True)
+        self._structural.add(sheet_name)
+        self._touch(sheet_name)
+        for id_value in df.loc[mask, id_col].unique():
+            if id_value not in live_ids:
+                self._mark_dirty(sheet_name, 'delete', int(id_value))
+        return int(mask.sum())
+
+    def commit(self):
+        """Grava um lote por aba alterada. Em caso de falha, restaura as abas já gravadas (e a reescrita interrompida)."""
+        if config.CHANGE_LOG_MODE:
+            # Um único append com todos os eventos: não há gravação parcial a desfazer
+            try:
+                append_change_events(self._events, clear_cache=False)
+            except DataAccessError:
+                self.rollback()
+                raise
+            # O cache passa a refletir o commit sem reler a planilha: o log ganha os
+            # eventos e as abas lógicas (exceto serviços particionados, que são
+            # reaplicados a partir do log) recebem o estado novo
+            patch_cached_change_log(self._events)
+            patch_cached_tables({
+                name: self._tables[name] for name in self._dirty
+                if not (name == 'servico' and config.SERVICE_PARTITIONING)
+            })
+            self._accept()
+            try:
+                maybe_compact_change_log()
+            except DataAccessError as e:
+                # O commit já foi gravado no log; a compactação fica para a próxima vez
+                logger.warning("Compactação do log adiada: %s", e)
+            return
+
+        # Uma gravação por worksheet alterada (com particionamento, por partição alterada)
+        writes = []
+        for sheet_name in self._dirty:
+            if self._cell_writes_allowed(sheet_name):
+                writes.append((sheet_name, self._tables[sheet_name], self._originals[sheet_name]))
+            else:
+                writes.extend(plan_table_writes(sheet_name, self._tables[sheet_name], self._originals[sheet_name]))
+
+        written = []
+        try:
+            for target, df_new, df_old in writes:
+                if self._rewrites_sheet(target, df_old):
+                    # A reescrita limpa a aba antes de gravar: se falhar no meio, ela
+                    # também volta ao conteúdo original
+                    written.append((target, df_old, df_new))
+                    self._write(target, df_new, df_old)
+                else:
+                    self._write(target, df_new, df_old)
+                    written.append((target, df_old, df_new))
+        except DataAccessError:
+            for done, df_done_old, df_done_new in written:
+                try:
+                    self._write(done, df_done_old, df_done_new)
+                except DataAccessError as e:
+                    logger.error("Falha ao restaurar a aba '%s' no rollback: %s", done, e)
+            cache.clear_all()
+            self.rollback()
+            raise
+
+        # Atualiza o cache com o que foi gravado, em vez de reler todas as abas
+        patch_cached_tables({target: df_new for target, df_new, _ in writes})
+        self._accept()
+
+    def _cell_writes_allowed(self, sheet_name):
+        # Só atualizações (as linhas continuam nas mesmas posições) em uma aba física
+        return (
+            sheet_name in self._cells
+            and sheet_name not in self._structural
+            and not (sheet_name == 'servico' and config.SERVICE_PARTITIONING)
+        )
+
+    def _rewrites_sheet(self, target, df_old):
+        # IDs repetidos na aba: a posição de um ID é ambígua, então a aba é reescrita
+        return not self._cell_writes_allowed(target) or not df_old[get_id_col(target)].is_unique
+
+    def _write(self, target, df_new, df_old):
+        """Grava `df_new` na aba: só as células alteradas ou a aba inteira.
+
+        Antes de gravar células, confere na planilha se cada linha-alvo ainda tem o
+        ID esperado; se a aba mudou desde a leitura, nada é gravado (DataAccessError).
+        """
+        id_col = get_id_col(target)
+        if self._rewrites_sheet(target, df_old):
+            write_sheet_data(target, df_new, clear_cache=False)
+            return
+
+        # Linha na planilha = posição no DataFrame + 2 (cabeçalho e base 1); colunas
+        # novas (ex.: a 1ª exclusão lógica) entram depois das existentes, com cabeçalho
+        columns = pd.Index(list(dict.fromkeys([*df_old.columns, *df_new.columns])))
+        keys = sorted(self._cells[target], key=lambda key: (key[0], str(key[1])))
+        key_ids = [id_value for id_value, _ in keys]
+        positions = pd.Index(df_old[id_col]).get_indexer(key_ids)
+        col_numbers = columns.get_indexer([col for _, col in keys])
+        check_row_ids(target, id_col, int(columns.get_loc(id_col)) + 1, positions + 2, key_ids)
+        cells = [(1, int(columns.get_loc(col)) + 1, col) for col in df_new.columns if col not in df_old.columns]
+        cells += [
+            (int(position) + 2, int(col_number) + 1, df_new[col].iloc[position] if col in df_new.columns else '')
+            for (_, col), position, col_number in zip(keys, positions, col_numbers)
+        ]
+        write_sheet_cells(target, cells, clear_cache=False)
+
+    def _accept(self):
+        global _last_commit_at
+        _last_commit_at = time.monotonic()
+        self._originals = {name: df.copy(deep=False) for name, df in self._tables.items()}
+        self._dirty = []
+        self._events = []
+        self._cells = {}
+        self._structural = set()
+
+    def rollback(self):
+        """Descarta as alterações pendentes (nada é gravado)."""
+        self._tables = {name: df.copy(deep=False) for name, df in self._originals.items()}
+        self._dirty = []
+        self._events = []
+        self._cells = {}
+        self._structural = set()
@@ -0,0 +1,7 @@
+"""🧪 Teste de carga: N sessões simuladas do app (AppTest) contra uma planilha falsa.
+
+Mede a latência por interação (percentis), as chamadas à API por sessão (para
+comparar com a cota do Google Sheets) e a memória por sessão. Uso:
+
+    python -m loadtest --sessions 20 --latency 0.2
+"""
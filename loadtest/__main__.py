@@ -0,0 +1,43 @@
+"""Teste de carga do app Streamlit contra uma planilha falsa.
+
+Exemplos (na raiz do repositório):
+    python -m loadtest --sessions 20
+    python -m loadtest --sessions 50 --workers 4 --latency 0.2 --json resultado.json
+"""
+
+import argparse
+import json
+import sys
+
+from .runner import format_report, run_load_test
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='loadtest', description="Simula N sessões do app contra uma planilha falsa.")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=1, help="Processos (réplicas do servidor) em paralelo.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latência simulada por chamada à API (segundos).")
+    parser.add_argument('--veiculos', type=int, default=20)
+    parser.add_argument('--prestadores', type=int, default=10)
+    parser.add_argument('--servicos', type=int, default=500)
+    parser.add_argument('--read-quota', type=int, default=60, help="Cota de leituras por minuto (por usuário da API).")
+    parser.add_argument('--write-quota', type=int, default=60, help="Cota de escritas por minuto (por usuário da API).")
+    parser.add_argument('--no-memory', action='store_true', help="Não mede memória (tracemalloc deixa a execução mais lenta).")
+    parser.add_argument('--timeout', type=int, default=60, help="Tempo máximo de cada rerun (segundos).")
+    parser.add_argument('--json', help="Grava o resultado completo neste arquivo JSON.")
+    args = parser.parse_args(argv)
+
+    summary = run_load_test(
+        sessions=args.sessions, workers=args.workers, latency=args.latency,
+        memory=not args.no_memory, timeout=args.timeout,
+        seed={'n_veiculos': args.veiculos, 'n_prestadores': args.prestadores, 'n_servicos': args.servicos},
+    )
+    print(format_report(summary, args.read_quota, args.write_quota))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""Planilha falsa em memória com a parte da API do gspread usada pelo app.
+
+Cada chamada é contada por sessão (leitura ou escrita), como seria cobrada pela
+cota da API do Google Sheets, e pode receber uma latência simulada.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+
+import gspread
+import numpy as np
+
+from controle_automotivo.config import EXPECTED_COLS
+
+READ_CALLS = {'open_by_key', 'open', 'worksheet', 'worksheets', 'get_all_records', 'get_all_values', 'col_values', 'values_batch_get'}
+WRITE_CALLS = {'add_worksheet', 'add_rows', 'add_cols', 'clear', 'update', 'append_rows', 'delete_rows', 'batch_update'}
+
+
+class FakeWorksheet:
+    def __init__(self, backend, title, rows, row_count=1000, col_count=26):
+        self._backend = backend
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        # Tamanho da grade: como na API real, o update não grava fora dela
+        self.row_count = max(row_count, len(self.rows))
+        self.col_count = max([col_count] + [len(row) for row in self.rows])
+
+    def get_all_records(self):
+        self._backend.call('get_all_records')
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [dict(zip(header, row + [''] * (len(header) - len(row)))) for row in self.rows[1:]]
+
+    def get_all_values(self):
+        self._backend.call('get_all_values')
+        return [['' if value is None else str(value) for value in row] for row in self.rows]
+
+    def col_values(self, col):
+        self._backend.call('col_values')
+        values = [str(row[col - 1]) if len(row) >= col and row[col - 1] is not None else '' for row in self.rows]
+        while values and values[-1] == '':
+            values.pop()
+        return values
+
+    def clear(self):
+        self._backend.call('clear')
+        self.rows = []
+
+    def update(self, range_name, values, value_input_option=None):
+        self._backend.call('update')
+        if range_name != 'A1':
+            raise NotImplementedError(f"Intervalo não suportado pela planilha falsa: {range_name}")
+        if len(values) > self.row_count or any(len(row) > self.col_count for row in values):
+            raise gspread.exceptions.GSpreadException(f"Range exceeds grid limits: {self.title} ({self.row_count}x{self.col_count})")
+        self.rows = [list(row) for row in values]
+
+    def add_rows(self, rows):
+        self._backend.call('add_rows')
+        self.row_count += rows
+
+    def add_cols(self, cols):
+        self._backend.call('add_cols')
+        self.col_count += cols
+
+    def batch_update(self, data, value_input_option=None, **kwargs):
+        self._backend.call('batch_update')
+        for item in data:
+            row, col = gspread.utils.a1_to_rowcol(item['range'])
+            for i, values in enumerate(item['values']):
+                target = self.rows[row - 1 + i]
+                for j, value in enumerate(values):
+                    target.extend([''] * (col + j - len(target)))
+                    target[col - 1 + j] = value
+
+    def append_rows(self, values, value_input_option=None, **kwargs):
+        self._backend.call('append_rows')
+        self.rows.extend(list(row) for row in values)
+        self.row_count = max(self.row_count, len(self.rows))
+
+    def delete_rows(self, start_index, end_index=None):
+        self._backend.call('delete_rows')
+        end_index = start_index if end_index is None else end_index
+        del self.rows[start_index - 1:end_index]
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend, tables):
+        self._backend = backend
+        self._worksheets = {title: FakeWorksheet(backend, title, rows) for title, rows in tables.items()}
+
+    def worksheet(self, title):
+        self._backend.call('worksheet')
+        if title not in self._worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self._backend.call('worksheets')
+        return list(self._worksheets.values())
+
+    def values_batch_get(self, ranges, params=None):
+        self._backend.call('values_batch_get')
+        titles = [name.strip("'").replace("''", "'") for name in ranges]
+        return {'valueRanges': [
+            {'range': name, 'values': [['' if value is None else str(value) for value in row] for row in self._worksheets[title].rows]}
+            for name, title in zip(ranges, titles)
+        ]}
+
+    def add_worksheet(self, title, rows=100, cols=20):
+        self._backend.call('add_worksheet')
+        self._worksheets[title] = FakeWorksheet(self._backend, title, [], row_count=rows, col_count=cols)
+        return self._worksheets[title]
+
+
+class FakeClient:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def open_by_key(self, key):
+        self._backend.call('open_by_key')
+        return self._backend.spreadsheet
+
+    def open(self, title):
+        self._backend.call('open')
+        return self._backend.spreadsheet
+
+
+class FakeSheetsBackend:
+    """Backend falso: uma planilha em memória compartilhada por todas as sessões do processo.
+
+    `current_session` identifica a sessão a quem as chamadas seguintes são atribuídas.
+    """
+
+    def __init__(self, tables, latency=0.0):
+        self.latency = latency
+        self.current_session = 'setup'
+        self.calls = defaultdict(Counter)   # sessão -> {método: nº de chamadas}
+        self.timeline = []                  # (instante, 'read'|'write') de cada chamada
+        self._lock = threading.Lock()
+        self.spreadsheet = FakeSpreadsheet(self, tables)
+
+    def call(self, method):
+        kind = 'write' if method in WRITE_CALLS else 'read'
+        with self._lock:
+            self.calls[self.current_session][method] += 1
+            self.timeline.append((time.perf_counter(), kind))
+        if self.latency:
+            time.sleep(self.latency)
+
+    def session_calls(self, session):
+        """{'read': n, 'write': m} de uma sessão."""
+        counter = self.calls.get(session, Counter())
+        return {
+            'read': sum(n for method, n in counter.items() if method in READ_CALLS),
+            'write': sum(n for method, n in counter.items() if method in WRITE_CALLS),
+        }
+
+    def find_id(self, sheet_name, column, value):
+        """ID da última linha da aba com `column == value` (None se não houver)."""
+        rows = self.spreadsheet._worksheets[sheet_name].rows
+        if not rows:
+            return None
+        header = rows[0]
+        col, id_col = header.index(column), header.index(f'id_{sheet_name}')
+        matches = [row[id_col] for row in rows[1:] if str(row[col]) == str(value)]
+        return int(matches[-1]) if matches else None
+
+    def install(self):
+        """Faz o gspread devolver o cliente falso no lugar da autenticação real."""
+        gspread.service_account_from_dict = lambda info, *args, **kwargs: FakeClient(self)
+
+
+def seed_tables(n_veiculos=20, n_prestadores=10, n_servicos=500, seed=0):
+    """Gera as abas veiculo/prestador/servico com dados sintéticos (determinísticos)."""
+    rng = np.random.default_rng(seed)
+    today = date.today()
+
+    veiculos = [list(EXPECTED_COLS['veiculo'])] + [
+        [i, f'Veículo {i}', f'SEED{i:04d}', '', int(rng.integers(2005, today.year + 1)),
+         float(rng.integers(20, 200) * 1000), (today - timedelta(days=int(rng.integers(365, 3650)))).isoformat()]
+        for i in range(1, n_veiculos + 1)
+    ]
+    prestadores = [list(EXPECTED_COLS['prestador'])] + [
+        [i, f'Oficina {i}', '', f'Contato {i}', '', '', '', '', f'Cidade {i % 5}', '', '']
+        for i in range(1, n_prestadores + 1)
+    ]
+    servicos = [list(EXPECTED_COLS['servico'])]
+    for i in range(1, n_servicos + 1):
+        data_servico = today - timedelta(days=int(rng.integers(0, 730)))
+        garantia = int(rng.choice([30, 90, 180, 365]))
+        km = int(rng.integers(1000, 200000))
+        servicos.append([
+            i, int(rng.integers(1, n_veiculos + 1)), int(rng.integers(1, n_prestadores + 1)), f'Serviço {i}',
+            data_servico.isoformat(), garantia, float(rng.integers(50, 3000)), km, km + 10000, '',
+            (data_servico + timedelta(days=garantia)).isoformat(),
+        ])
+    return {'veiculo': veiculos, 'prestador': prestadores, 'servico': servicos}
@@ -0,0 +1,137 @@
+"""Fluxos realistas de uma sessão: abrir os painéis, filtrar serviços e o CRUD de veículo/serviço.
+
+Cada etapa é uma lista de interações (um rerun do script cada); a latência é
+medida por interação. Os registros criados levam a marca da sessão (ex.:
+'LT0003') para que a sessão encontre os próprios IDs na planilha falsa.
+"""
+
+import time
+from datetime import date, timedelta
+
+from streamlit.testing.v1 import AppTest
+
+
+class FlowError(Exception):
+    """A tela não tinha o elemento esperado (ou o script levantou exceção)."""
+
+
+def _by_label(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise FlowError(f"Elemento '{label}' não encontrado na tela.")
+
+
+def _by_key(elements, key):
+    try:
+        return elements(key=key)
+    except KeyError as e:
+        raise FlowError(f"Elemento com key '{key}' não encontrado na tela.") from e
+
+
+class Session:
+    """Uma sessão simulada do app (um AppTest com estado próprio)."""
+
+    def __init__(self, number, backend, app_path, timeout=60):
+        self.number = number
+        self.name = f'sessao_{number}'
+        self.tag = f'LT{number:04d}'
+        self.backend = backend
+        self.at = AppTest.from_file(app_path, default_timeout=timeout)
+        self.at.secrets['gcp_service_account'] = {'type': 'loadtest'}
+        self.vehicle_id = None
+        self.service_id = None
+        self.interactions = []  # (etapa, segundos, erro)
+
+    def interact(self, step, action):
+        """Executa uma interação (que termina em at.run()) medindo o tempo."""
+        self.backend.current_session = self.name
+        start = time.perf_counter()
+        error = None
+        try:
+            action(self.at)
+            if len(self.at.exception):
+                error = self.at.exception[0].message
+        except FlowError as e:
+            error = str(e)
+        self.interactions.append((step, time.perf_counter() - start, error))
+        if error:
+            raise FlowError(error)
+
+    def select_table(self, step, table):
+        self.interact(step, lambda at: _by_key(at.radio, 'cadastro_choice_unificado').set_value(table).run())
+
+
+# --- Etapas (cada uma recebe a sessão) ---
+
+def open_dashboards(s):
+    s.interact('abrir_dashboards', lambda at: at.run())
+
+
+def filter_services(s):
+    s.select_table('filtrar_servicos', 'Serviço')
+    s.interact('filtrar_servicos', lambda at: _by_label(at.date_input, "Filtrar por Data de Início").set_value(date.today() - timedelta(days=365)).run())
+
+
+def insert_vehicle(s):
+    s.select_table('inserir_veiculo', 'Veículo')
+    s.interact('inserir_veiculo', lambda at: _by_key(at.button, 'btn_novo_veiculo_lista').click().run())
+
+    def submit(at):
+        _by_label(at.text_input, "Nome Amigável do Veículo (Obrigatório)").input(f'Carro {s.tag}')
+        _by_label(at.text_input, "Placa (Opcional)").input(s.tag)
+        _by_label(at.button, 'Cadastrar Veículo').click().run()
+    s.interact('inserir_veiculo', submit)
+    s.vehicle_id = s.backend.find_id('veiculo', 'placa', s.tag)
+    if s.vehicle_id is None:
+        raise FlowError("Veículo cadastrado não encontrado na planilha.")
+
+
+def edit_vehicle(s):
+    s.interact('editar_veiculo', lambda at: _by_key(at.button, f'edit_v_{s.vehicle_id}').click().run())
+
+    def submit(at):
+        _by_label(at.text_input, "Nome Amigável do Veículo (Obrigatório)").input(f'Carro {s.tag} (editado)')
+        _by_label(at.button, 'Atualizar Veículo').click().run()
+    s.interact('editar_veiculo', submit)
+
+
+def insert_service(s):
+    s.select_table('inserir_servico', 'Serviço')
+    s.interact('inserir_servico', lambda at: _by_key(at.button, 'btn_novo_servico_lista').click().run())
+    s.interact('inserir_servico', lambda at: _by_key(at.text_input, 'service_vehicle_query').input(s.tag).run())
+
+    def submit(at):
+        _by_label(at.text_input, "Nome do Serviço").input(f'Revisão {s.tag}')
+        _by_label(at.button, 'Cadastrar Serviço').click().run()
+    s.interact('inserir_servico', submit)
+    s.service_id = s.backend.find_id('servico', 'nome_servico', f'Revisão {s.tag}')
+    if s.service_id is None:
+        raise FlowError("Serviço cadastrado não encontrado na planilha.")
+
+
+def edit_service(s):
+    s.interact('editar_servico', lambda at: _by_key(at.button, f'edit_{s.service_id}').click().run())
+
+    def submit(at):
+        _by_label(at.text_input, "Nome do Serviço").input(f'Revisão {s.tag} (editada)')
+        _by_label(at.button, 'Atualizar Serviço').click().run()
+    s.interact('editar_servico', submit)
+
+
+def delete_service(s):
+    # Primeiro clique pede confirmação, o segundo exclui
+    for _ in range(2):
+        s.interact('excluir_servico', lambda at: _by_key(at.button, f'delete_{s.service_id}').click().run())
+
+
+def delete_vehicle(s):
+    s.select_table('excluir_veiculo', 'Veículo')
+    for _ in range(2):
+        s.interact('excluir_veiculo', lambda at: _by_key(at.button, f'delete_v_{s.vehicle_id}').click().run())
+
+
+FLOW = [
+    open_dashboards, filter_services, insert_vehicle, edit_vehicle,
+    insert_service, edit_service, delete_service, delete_vehicle,
+]
@@ -0,0 +1,160 @@
+"""Execução das sessões simuladas e consolidação das métricas.
+
+O AppTest não roda sessões em paralelo dentro do mesmo processo, então cada
+processo de trabalho mantém todas as suas sessões vivas e executa as etapas
+intercaladas (etapa 1 de todas as sessões, depois a etapa 2...), como usuários
+simultâneos de um mesmo servidor: caches compartilhados, estados separados.
+Com mais de um processo (`workers`), cada um funciona como uma réplica do
+servidor com a sua própria planilha falsa.
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'app.py')
+PERCENTILES = (50, 90, 95, 99)
+
+
+def run_worker(worker, session_numbers, options):
+    """Roda as sessões de um processo e devolve as métricas brutas."""
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from loadtest.fake_sheets import FakeSheetsBackend, seed_tables
+    from loadtest.flows import FLOW, FlowError, Session
+
+    backend = FakeSheetsBackend(seed_tables(**options['seed']), latency=options['latency'])
+    backend.install()
+
+    if options['memory']:
+        tracemalloc.start()
+    memory_start = tracemalloc.get_traced_memory()[0] if options['memory'] else 0
+
+    sessions = [Session(number, backend, APP_PATH, timeout=options['timeout']) for number in session_numbers]
+    failed = {}
+    start = time.perf_counter()
+    for step in FLOW:
+        for s in sessions:
+            if s.name in failed:
+                continue
+            try:
+                step(s)
+            except FlowError as e:
+                failed[s.name] = f"{step.__name__}: {e}"
+    duration = time.perf_counter() - start
+
+    memory = None
+    if options['memory']:
+        current, peak = tracemalloc.get_traced_memory()
+        memory = {'per_session': (current - memory_start) / max(len(sessions), 1), 'peak': peak}
+        tracemalloc.stop()
+
+    return {
+        'worker': worker,
+        'duration': duration,
+        'interactions': [(step, seconds, error) for s in sessions for step, seconds, error in s.interactions],
+        'calls': {s.name: backend.session_calls(s.name) for s in sessions},
+        'timeline': backend.timeline,
+        'failed': failed,
+        'memory': memory,
+    }
+
+
+def run_load_test(sessions=10, workers=1, latency=0.0, memory=True, timeout=60, seed=None):
+    """Distribui `sessions` sessões entre `workers` processos e consolida o resultado."""
+    options = {'latency': latency, 'memory': memory, 'timeout': timeout, 'seed': seed or {}}
+    batches = [list(range(w + 1, sessions + 1, workers)) for w in range(workers)]
+    batches = [batch for batch in batches if batch]
+
+    if len(batches) == 1:
+        results = [run_worker(0, batches[0], options)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+            results = list(pool.map(run_worker, range(len(batches)), batches, [options] * len(batches)))
+    return summarize(results)
+
+
+def _percentiles(seconds):
+    values = np.asarray(seconds) * 1000
+    summary = {f'p{p}': float(np.percentile(values, p)) for p in PERCENTILES}
+    summary.update(n=int(values.size), max=float(values.max()), mean=float(values.mean()))
+    return summary
+
+
+def _peak_rate(timeline, kind, window=60.0):
+    """Maior nº de chamadas de um tipo em qualquer janela de `window` segundos."""
+    times = np.sort(np.array([t for t, k in timeline if k == kind]))
+    if times.size == 0:
+        return 0
+    ends = np.searchsorted(times, times + window, side='left')
+    return int((ends - np.arange(times.size)).max())
+
+
+def summarize(results):
+    """Latência por etapa, chamadas à API por sessão, memória por sessão e pico de chamadas/min."""
+    interactions = [i for r in results for i in r['interactions']]
+    steps = list(dict.fromkeys(step for step, _, _ in interactions))
+    calls = [c for r in results for c in r['calls'].values()]
+
+    summary = {
+        'sessions': len(calls),
+        'workers': len(results),
+        'duration': max(r['duration'] for r in results),
+        'interactions': len(interactions),
+        'errors': sum(1 for _, _, error in interactions if error),
+        'failed_sessions': {name: reason for r in results for name, reason in r['failed'].items()},
+        'latency_ms': {'todas': _percentiles([s for _, s, _ in interactions])} if interactions else {},
+        'calls_per_session': {
+            kind: {'mean': float(np.mean([c[kind] for c in calls])), 'max': int(max(c[kind] for c in calls))}
+            for kind in ('read', 'write')
+        } if calls else {},
+        # Pico por processo: cada réplica tem a sua própria cota/planilha
+        'peak_calls_per_minute': {
+            kind: max(_peak_rate(r['timeline'], kind) for r in results) for kind in ('read', 'write')
+        },
+        'memory_per_session_mb': None,
+    }
+    for step in steps:
+        summary['latency_ms'][step] = _percentiles([s for name, s, _ in interactions if name == step])
+
+    memories = [r['memory'] for r in results if r['memory']]
+    if memories:
+        summary['memory_per_session_mb'] = float(np.mean([m['per_session'] for m in memories])) / 1e6
+        summary['memory_peak_mb'] = max(m['peak'] for m in memories) / 1e6
+    return summary
+
+
+def format_report(summary, read_quota=60, write_quota=60):
+    """Relatório em texto do resultado de summarize()."""
+    lines = [
+        f"Sessões: {summary['sessions']} em {summary['workers']} processo(s) | "
+        f"interações: {summary['interactions']} | erros: {summary['errors']} | duração: {summary['duration']:.1f} s",
+        "",
+        f"{'Latência (ms)':<20}{'n':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'máx':>9}",
+    ]
+    for step, p in summary['latency_ms'].items():
+        lines.append(f"{step:<20}{p['n']:>6}{p['p50']:>9.0f}{p['p90']:>9.0f}{p['p95']:>9.0f}{p['p99']:>9.0f}{p['max']:>9.0f}")
+
+    calls = summary['calls_per_session']
+    if calls:
+        lines += [
+            "",
+            f"Chamadas à API por sessão: leitura {calls['read']['mean']:.1f} (máx {calls['read']['max']}), "
+            f"escrita {calls['write']['mean']:.1f} (máx {calls['write']['max']})",
+        ]
+    peak = summary['peak_calls_per_minute']
+    lines.append(
+        f"Pico de chamadas em 60 s (por processo): leitura {peak['read']} / cota {read_quota}, "
+        f"escrita {peak['write']} / cota {write_quota}"
+    )
+    if summary['memory_per_session_mb'] is not None:
+        lines.append(f"Memória por sessão: {summary['memory_per_session_mb']:.2f} MB (pico do processo: {summary['memory_peak_mb']:.1f} MB)")
+        lines.append("(com medição de memória as latências incluem o custo do tracemalloc; use --no-memory para medi-las)")
+    for name, reason in summary['failed_sessions'].items():
+        lines.append(f"⚠️ {name} interrompida em {reason}")
+    return '\n'.join(lines)
@@ -0,0 +1,41 @@
+"""Fixtures dos testes: a planilha falsa em memória (loadtest.fake_sheets) no lugar do Google Sheets."""
+
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import cache, config
+from loadtest.fake_sheets import FakeSheetsBackend, seed_tables
+
+
+@pytest.fixture(autouse=True)
+def data_config(monkeypatch, tmp_path):
+    """Cada teste começa com os modos opcionais desligados e termina com os caches limpos."""
+    monkeypatch.setattr(config, 'CHANGE_LOG_MODE', False)
+    monkeypatch.setattr(config, 'SERVICE_PARTITIONING', False)
+    monkeypatch.setattr(config, 'LOCAL_REPLICA', False)
+    monkeypatch.setattr(config, 'SOFT_DELETE', False)
+    monkeypatch.setattr(config, 'TENANTS', {})
+    monkeypatch.setattr(config, 'REPLICA_PATH', str(tmp_path / 'replica.sqlite3'))
+    yield
+    cache.clear_all(all_tenants=True)
+
+
+@pytest.fixture
+def make_backend():
+    """Instala uma planilha falsa com as abas dadas (padrão: seed_tables pequeno) e configura o pacote."""
+    def make(tables=None):
+        backend = FakeSheetsBackend(seed_tables(5, 3, 30) if tables is None else tables)
+        backend.install()
+        ca.configure(credentials={'type': 'fake'})
+        return backend
+    return make
+
+
+@pytest.fixture
+def backend(make_backend):
+    return make_backend()
+
+
+def sheet_rows(backend, sheet_name):
+    """Grade atual da aba na planilha falsa (cabeçalho incluído)."""
+    return backend.spreadsheet._worksheets[sheet_name].rows
@@ -0,0 +1,36 @@
+"""Relatórios de custo da frota (controle_automotivo.analytics)."""
+
+import pandas as pd
+
+from controle_automotivo.analytics import cost_per_km
+
+VEICULOS = pd.DataFrame({'id_veiculo': [1, 2], 'nome': ['Carro', 'Moto']})
+
+
+def services_frame(rows):
+    return pd.DataFrame(rows, columns=['id_veiculo', 'data', 'valor', 'km']).assign(data=lambda df: pd.to_datetime(df['data']))
+
+
+def test_cost_per_km_skips_missing_readings():
+    df = services_frame([
+        (1, '2024-01-01', 100.0, 1000),
+        (1, '2024-02-01', 50.0, 0),      # km não informado (padrão do formulário)
+        (1, '2024-03-01', 50.0, 3000),
+        (2, '2024-01-01', 30.0, 0),
+    ])
+    result = cost_per_km(df, VEICULOS).set_index('Veículo')
+
+    assert result.loc['Carro', 'KM Rodados'] == 2000
+    assert result.loc['Carro', 'Custo por KM'] == 0.10
+    assert result.loc['Carro', 'Serviços'] == 3
+    assert result.loc['Moto', 'KM Rodados'] == 0
+    assert pd.isna(result.loc['Moto', 'Custo por KM'])
+
+
+def test_cost_per_km_ignores_lower_readings():
+    df = services_frame([
+        (1, '2024-01-01', 10.0, 5000),
+        (1, '2024-02-01', 10.0, 4000),   # digitado errado
+        (1, '2024-03-01', 10.0, 6000),
+    ])
+    assert cost_per_km(df, VEICULOS)['KM Rodados'].tolist() == [1000]
@@ -0,0 +1,46 @@
+"""Diferença e validação da edição em lote."""
+
+import pandas as pd
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import config, services
+from controle_automotivo.bulk_edit import diff_table
+
+from .conftest import sheet_rows
+
+COLUMNS = config.EXPECTED_COLS['veiculo']
+
+
+def vehicles(*rows):
+    return pd.DataFrame(
+        [[id_value, nome, f'PLC{i}', '', 2020, 1000.0, pd.Timestamp('2020-01-01')] for i, (id_value, nome) in enumerate(rows)],
+        columns=COLUMNS,
+    )
+
+
+def test_diff_reports_only_changed_cells_new_and_removed_rows():
+    df_base = vehicles((1, 'A'), (2, 'B'), (3, 'C'))
+    df_edited = vehicles((1, 'A'), (3, 'C2'), (0, 'Novo'))
+    df_edited.loc[1, 'placa'] = 'PLC2'  # a linha 3 mantém a placa original
+    changes = diff_table('veiculo', df_base, df_edited)
+    assert changes['updated'].to_dict() == {(3, 'nome'): 'C2'}
+    assert changes['deleted'] == [2]
+    assert changes['inserted']['nome'].tolist() == ['Novo']
+
+
+@pytest.mark.parametrize('ids', [(1, 2, 2), (1, 0, 3)])
+def test_diff_rejects_repeated_or_blank_base_ids(ids):
+    df_base = vehicles(*[(id_value, f'V{i}') for i, id_value in enumerate(ids)])
+    with pytest.raises(ca.ValidationError, match='editada em lote'):
+        diff_table('veiculo', df_base, df_base.copy())
+
+
+def test_apply_table_edits_validates_before_writing(backend):
+    df_base = ca.get_data('veiculo')
+    df_edited = df_base.copy()
+    df_edited.loc[0, 'placa'] = df_edited.loc[1, 'placa']
+    with pytest.raises(ca.ValidationError):
+        services.apply_table_edits('veiculo', df_base, df_edited)
+    assert backend.calls['setup']['batch_update'] == 0
+    assert sheet_rows(backend, 'veiculo')[1][2] == df_base.loc[0, 'placa']
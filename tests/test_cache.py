@@ -0,0 +1,117 @@
+"""Cache com TTL: valores somente leitura, releitura em segundo plano e versões das entradas."""
+
+import threading
+
+import pandas as pd
+import pytest
+
+from controle_automotivo import cache, services
+from controle_automotivo.search import get_vehicle_index
+
+
+def make_cached(func, **kwargs):
+    kwargs.setdefault('ttl', 60)
+    return cache.ttl_cache(group='test', **kwargs)(func)
+
+
+def test_cached_frames_are_read_only_views():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return pd.DataFrame({'id': [1, 2], 'nome': ['a', 'b']})
+
+    cached = make_cached(load)
+    df = cached()
+    with pytest.raises(ValueError):
+        df.loc[0, 'id'] = 99
+    df['nome'] = 'trocado'  # só muda a visão deste chamador
+    assert cached()['nome'].tolist() == ['a', 'b']
+    assert cached()['id'].tolist() == [1, 2]
+    assert len(loads) == 1
+
+
+def test_stale_value_is_served_while_refreshing():
+    values = iter(['antigo', 'novo'])
+    release = threading.Event()
+
+    def load():
+        value = next(values)
+        if value == 'novo':
+            release.wait(5)
+        return value
+
+    cached = make_cached(load, ttl=0, max_stale=60, copy=False)
+    assert cached() == 'antigo'
+    assert cached() == 'antigo'  # vencido: volta na hora e dispara a releitura
+    release.set()
+    for thread in [t for t in threading.enumerate() if t.name == 'refresh-load']:
+        thread.join(5)
+    assert cached.peek() == 'novo'
+
+
+def test_refresh_started_before_a_write_does_not_overwrite_it():
+    started, release = threading.Event(), threading.Event()
+
+    def load():
+        if started.is_set():
+            release.wait(5)
+            return 'leitura antiga'
+        started.set()
+        return 'inicial'
+
+    cached = make_cached(load, ttl=0, max_stale=60, copy=False)
+    cached()
+    cached()  # dispara a releitura, que fica presa em load()
+    cached.set_entry((), 'gravado')
+    release.set()
+    for thread in [t for t in threading.enumerate() if t.name == 'refresh-load']:
+        thread.join(5)
+    assert cached.peek() == 'gravado'
+
+
+def test_version_changes_on_every_write_even_with_equal_content():
+    cached = make_cached(lambda: pd.Series([1, 2, 3]))
+    assert cached.version() is None
+    cached()
+    first = cached.version()
+    assert cached.version() == first
+    cached.set_entry((), pd.Series([1, 2, 3]))
+    assert cached.version() != first
+    cached.discard()
+    assert cached.version() is None
+
+
+def test_versioned_cache_rebuilds_only_when_the_version_changes():
+    cached = make_cached(lambda: pd.Series([1, 2, 3]))
+    results = cache.VersionedCache()
+    builds = []
+
+    def build(series):
+        builds.append(1)
+        return series * 2
+
+    def get():
+        return results.get_or_build('dobro', cached.version, lambda: (cached(),), build)
+
+    assert get().tolist() == [2, 4, 6]
+    assert get().tolist() == [2, 4, 6]
+    assert len(builds) == 1
+
+    # Mesmo conteúdo gravado de novo: outra versão, o resultado é recalculado
+    cached.set_entry((), pd.Series([1, 2, 3]))
+    get()
+    assert len(builds) == 2
+    cached.set_entry((), pd.Series([5]))
+    assert get().tolist() == [10]
+
+
+def test_search_index_follows_writes(backend):
+    index = get_vehicle_index()
+    assert get_vehicle_index() is index  # sem gravação: o mesmo índice, sem reler a aba
+    label = index.label(2)
+    services.update_vehicle(2, 'Renomeado', 'ABC1D23', 2020, 1000.0, '2020-01-01')
+
+    index = get_vehicle_index()
+    assert index.label(2) == 'Renomeado (ABC1D23)'
+    assert label not in index.search('', limit=100)
@@ -0,0 +1,87 @@
+"""Reaplicação e compactação do log de alterações."""
+
+import pandas as pd
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import config, services
+from controle_automotivo.changelog import apply_change_log, build_change_event, compact_change_log
+from loadtest.fake_sheets import FakeWorksheet, seed_tables
+
+COLUMNS = config.EXPECTED_COLS['veiculo']
+
+
+def vehicle(id_value, nome):
+    return [id_value, nome, f'PLC{id_value}', '', 2020, 1000.0, '2020-01-01']
+
+
+def base(*rows):
+    return pd.DataFrame([vehicle(*row) for row in rows], columns=COLUMNS)
+
+
+def log(*events):
+    return pd.DataFrame([build_change_event('veiculo', *event) for event in events], columns=config.CHANGE_LOG_COLUMNS)
+
+
+def records(df):
+    return sorted((int(id_value), nome) for id_value, nome in zip(df['id_veiculo'], df['nome']))
+
+
+def test_replay_over_compacted_base_is_noop():
+    df_log = log(('insert', 2, dict(zip(COLUMNS, vehicle(2, 'B')))), ('update', 2, {'nome': 'B2'}))
+    folded = apply_change_log('veiculo', base((1, 'A')), df_log)
+    assert records(folded) == [(1, 'A'), (2, 'B2')]
+    assert records(apply_change_log('veiculo', folded, df_log)) == [(1, 'A'), (2, 'B2')]
+
+
+def test_insert_of_used_id_gets_new_id_once():
+    df_log = log(('insert', 2, dict(zip(COLUMNS, vehicle(2, 'B')))))
+    folded = apply_change_log('veiculo', base((1, 'A'), (2, 'X')), df_log)
+    assert records(folded) == [(1, 'A'), (2, 'X'), (3, 'B')]
+    assert records(apply_change_log('veiculo', folded, df_log)) == records(folded)
+
+
+def test_rows_without_id_or_with_repeated_id_are_kept():
+    folded = apply_change_log('veiculo', base((1, 'A'), (1, 'A bis'), ('', 'B')), log(('update', 1, {'nome': 'A2'})))
+    assert len(folded) == 3
+    assert folded['nome'].tolist()[:2] == ['A2', 'A2']
+
+
+def test_reader_sees_no_duplicate_when_log_cleanup_fails(make_backend, monkeypatch):
+    monkeypatch.setattr(config, 'CHANGE_LOG_MODE', True)
+    tables = seed_tables(3, 2, 5)
+    tables[config.CHANGE_LOG_SHEET] = [config.CHANGE_LOG_COLUMNS]
+    make_backend(tables)
+    vid = services.insert_vehicle('Novo', 'NOV1', 2021, 0, '2021-01-01')
+    services.update_vehicle(vid, 'Novo2', 'NOV1', 2021, 0, '2021-01-01')
+
+    def fail(self, *args, **kwargs):
+        raise ConnectionError('offline')
+    monkeypatch.setattr(FakeWorksheet, 'delete_rows', fail)
+    with pytest.raises(ca.DataAccessError):
+        compact_change_log()
+
+    names = ca.get_data('veiculo')['nome'].tolist()
+    assert names.count('Novo2') == 1 and 'Novo' not in names
+
+
+def test_log_mode_appends_events_and_compaction_folds_them(make_backend, monkeypatch):
+    monkeypatch.setattr(config, 'CHANGE_LOG_MODE', True)
+    tables = seed_tables(3, 2, 5)
+    tables[config.CHANGE_LOG_SHEET] = [config.CHANGE_LOG_COLUMNS]
+    backend = make_backend(tables)
+    vid = services.insert_vehicle('Novo', 'NOV1', 2021, 0, '2021-01-01')
+    services.update_vehicle(1, 'Renomeado', 'SEED0001', 2020, 0, '2020-01-01')
+    services.delete_service(5)
+
+    calls = backend.calls['setup']
+    assert (calls['append_rows'], calls['update'], calls['batch_update']) == (3, 0, 0)
+    expected = {name: ca.get_data(name) for name in ('veiculo', 'servico')}
+
+    assert compact_change_log() == 3
+    worksheets = backend.spreadsheet._worksheets
+    assert worksheets[config.CHANGE_LOG_SHEET].rows == [config.CHANGE_LOG_COLUMNS]
+    assert [int(row[0]) for row in worksheets['veiculo'].rows[1:]] == [1, 2, 3, vid]
+    # Mesmo conteúdo (colunas fora do esquema voltam da planilha como texto)
+    for name, df in expected.items():
+        pd.testing.assert_frame_equal(ca.get_data(name).astype(str), df.astype(str))
@@ -0,0 +1,38 @@
+"""Verificação de integridade e reparo em lote."""
+
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import integrity
+from loadtest.fake_sheets import seed_tables
+
+from .conftest import sheet_rows
+
+
+def tables_with_duplicate_vehicle():
+    tables = seed_tables(4, 2, 6)
+    tables['veiculo'][4][0] = 2  # o veículo da última linha repete o ID 2
+    return tables
+
+
+def test_repair_gives_new_id_to_duplicate(make_backend):
+    backend = make_backend(tables_with_duplicate_vehicle())
+    report, counts = ca.repair_integrity()
+    assert counts['id_duplicado'] == 1
+    assert [int(row[0]) for row in sheet_rows(backend, 'veiculo')[1:]] == [1, 2, 3, 4]
+
+
+def test_repair_aborts_when_rows_moved_after_the_read(make_backend, monkeypatch):
+    backend = make_backend(tables_with_duplicate_vehicle())
+    read_all = integrity._read_all
+
+    def read_then_shift():
+        tables = read_all()
+        del sheet_rows(backend, 'veiculo')[1]  # outra sessão removeu a 1ª linha
+        return tables
+    monkeypatch.setattr(integrity, '_read_all', read_then_shift)
+
+    with pytest.raises(ca.DataAccessError, match='mudaram de posição'):
+        ca.repair_integrity()
+    assert [int(row[0]) for row in sheet_rows(backend, 'veiculo')[1:]] == [2, 3, 2]
+    assert backend.calls['setup']['batch_update'] == 0
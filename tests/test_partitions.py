@@ -0,0 +1,45 @@
+"""Particionamento dos serviços por ano (controle_automotivo.partitions)."""
+
+import pandas as pd
+
+import controle_automotivo as ca
+from controle_automotivo import config, services
+from controle_automotivo.partitions import partition_service_sheet, plan_table_writes, split_service_partitions
+from loadtest.fake_sheets import seed_tables
+
+
+def services_frame(dates):
+    return pd.DataFrame({'id_servico': range(1, len(dates) + 1), 'data_servico': pd.to_datetime(dates, errors='coerce')})
+
+
+def test_split_groups_by_year_and_keeps_undated_services():
+    parts = split_service_partitions(services_frame(['2023-05-01', '2024-01-10', 'inválida', '2023-12-31']))
+    assert {name: df['id_servico'].tolist() for name, df in parts.items()} == {
+        'servico_0000': [3], 'servico_2023': [1, 4], 'servico_2024': [2],
+    }
+
+
+def test_plan_writes_only_the_changed_partitions(monkeypatch):
+    monkeypatch.setattr(config, 'SERVICE_PARTITIONING', True)
+    df_old = services_frame(['2023-05-01', '2024-01-10'])
+    df_new = pd.concat([df_old, services_frame(['2025-02-02']).assign(id_servico=3)], ignore_index=True)
+    assert [name for name, _, _ in plan_table_writes('servico', df_new, df_old)] == ['servico_2025']
+
+    # Um serviço que muda de ano grava as duas partições
+    moved = df_old.assign(data_servico=pd.to_datetime(['2023-05-01', '2023-06-01']))
+    assert [name for name, _, _ in plan_table_writes('servico', moved, df_old)] == ['servico_2023', 'servico_2024']
+    assert plan_table_writes('veiculo', df_new, df_old) == [('veiculo', df_new, df_old)]
+
+
+def test_partitions_fit_years_with_more_than_1000_services(make_backend, monkeypatch):
+    backend = make_backend(seed_tables(5, 3, 2500))
+    counts = partition_service_sheet()
+    worksheets = backend.spreadsheet._worksheets
+    partition, largest = max(counts.items(), key=lambda item: item[1])
+    assert largest > 1000
+    assert all(worksheets[name].row_count == count + 1 for name, count in counts.items())
+
+    monkeypatch.setattr(config, 'SERVICE_PARTITIONING', True)
+    services.insert_service(1, 1, 'Revisão', f'{partition[-4:]}-06-01', 30, 100.0, 1000, 11000, '')
+    assert len(worksheets[partition].rows) == largest + 2
+    assert len(ca.get_data('servico')) == 2501
@@ -0,0 +1,84 @@
+"""Limpeza das linhas excluídas logicamente (tombstones)."""
+
+import logging
+
+import pandas as pd
+
+import controle_automotivo as ca
+from controle_automotivo import config, purge
+from loadtest.fake_sheets import seed_tables
+
+from .conftest import sheet_rows
+
+OLD = '2000-01-01'
+
+
+def tables_with_tombstones(*deleted_at):
+    """Serviços sem veículos/prestadores ligados aos testes; um valor de excluido_em por veículo."""
+    tables = seed_tables(len(deleted_at), 1, 0)
+    tables['veiculo'][0].append(config.DELETED_COL)
+    for row, value in zip(tables['veiculo'][1:], deleted_at):
+        row.append(value)
+    return tables
+
+
+def vehicle_ids(backend):
+    rows = sheet_rows(backend, 'veiculo')
+    return sorted((int(row[0]), row[-1]) for row in rows[1:])
+
+
+def test_purge_keeps_live_row_with_same_id(make_backend, monkeypatch):
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    tables = tables_with_tombstones(OLD, '', OLD)
+    tables['veiculo'][3][0] = 2  # a linha excluída repete o ID de uma linha ativa
+    backend = make_backend(tables)
+
+    assert ca.purge_deleted(older_than_days=1) == {'veiculo': 2}
+    assert vehicle_ids(backend) == [(2, '')]
+
+
+def test_purge_respects_cutoff(make_backend, monkeypatch):
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    recent = pd.Timestamp.now().normalize().date().isoformat()
+    backend = make_backend(tables_with_tombstones(OLD, recent))
+
+    assert ca.purge_deleted(older_than_days=1) == {'veiculo': 1}
+    assert vehicle_ids(backend) == [(2, recent)]
+
+
+def test_purge_in_log_mode_skips_ids_with_live_rows(make_backend, monkeypatch):
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    monkeypatch.setattr(config, 'CHANGE_LOG_MODE', True)
+    tables = tables_with_tombstones(OLD, '', OLD)
+    tables['veiculo'][3][0] = 2
+    tables[config.CHANGE_LOG_SHEET] = [config.CHANGE_LOG_COLUMNS]
+    backend = make_backend(tables)
+
+    assert ca.purge_deleted(older_than_days=1) == {'veiculo': 1}
+    events = sheet_rows(backend, config.CHANGE_LOG_SHEET)[1:]
+    assert [(row[2], int(row[3])) for row in events] == [('delete', 1)]
+    ca.clear_data_caches()
+    assert sorted(ca.get_data('veiculo')['id_veiculo']) == [2]
+
+
+def test_purge_loop_survives_unexpected_errors(monkeypatch, caplog):
+    calls = []
+
+    def fail():
+        calls.append(1)
+        if len(calls) >= 2:
+            raise SystemExit  # encerra o laço do teste
+        raise KeyError('coluna')
+
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    monkeypatch.setattr(config, 'PURGE_INTERVAL', 0)
+    monkeypatch.setattr(purge, 'is_configured', lambda: True)
+    monkeypatch.setattr(purge, 'idle_seconds', lambda: float('inf'))
+    monkeypatch.setattr(purge, 'purge_deleted', fail)
+    with caplog.at_level(logging.ERROR, logger='controle_automotivo.purge'):
+        try:
+            purge._purge_loop()
+        except SystemExit:
+            pass
+    assert len(calls) == 2
+    assert 'Limpeza dos excluídos falhou' in caplog.text
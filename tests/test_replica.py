@@ -0,0 +1,41 @@
+"""Réplica local (SQLite) e a sincronização com a planilha."""
+
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import cache, config, replica, services
+from controle_automotivo.sync import sync_replica
+
+from .conftest import sheet_rows
+
+
+@pytest.fixture
+def replicated(backend, monkeypatch):
+    monkeypatch.setattr(config, 'LOCAL_REPLICA', True)
+    ca.get_data('veiculo')  # primeira leitura: vem da planilha e fica na réplica
+    return backend
+
+
+def test_reads_come_from_the_replica_until_sync(replicated):
+    sheet_rows(replicated, 'veiculo')[1][1] = 'Alterado fora do app'
+    cache.clear_all()
+    assert ca.get_data('veiculo', 'id_veiculo', 1)['nome'].tolist() == ['Veículo 1']
+
+    assert sync_replica()['veiculo'] == 1
+    assert ca.get_data('veiculo', 'id_veiculo', 1)['nome'].tolist() == ['Alterado fora do app']
+    assert sync_replica() == {}
+
+
+def test_writes_are_mirrored_to_the_replica(replicated):
+    services.update_vehicle(2, 'Espelhado', 'ABC1D23', 2020, 1000.0, '2020-01-01')
+    assert replica.load_values('veiculo')[2][1] == 'Espelhado'
+
+
+def test_cell_write_past_the_replica_drops_the_sheet(replicated):
+    rows = len(replica.load_values('veiculo'))
+    replica.update_cells('veiculo', [(rows + 1, 2, 'linha que a réplica não tem')])
+    assert replica.load_values('veiculo') is None
+    # A próxima leitura busca a aba inteira de novo
+    cache.clear_all()
+    assert len(ca.get_data('veiculo')) == 5
+    assert replica.load_values('veiculo') is not None
@@ -0,0 +1,39 @@
+"""Regras de negócio da camada de dados (controle_automotivo.services)."""
+
+import pandas as pd
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import config, services
+from controle_automotivo.errors import ValidationError
+
+from .conftest import sheet_rows
+
+
+def test_bulk_upsert_updates_changed_rows_and_inserts_new_ones(backend):
+    df_rows = ca.get_data('veiculo').iloc[:2][['id_veiculo', 'nome', 'placa']].assign(nome=['Carro 1', 'Veículo 2'])
+    df_rows = pd.concat([df_rows, pd.DataFrame({'id_veiculo': [''], 'nome': ['Novo'], 'placa': ['NEW0001']})], ignore_index=True)
+
+    assert services.bulk_upsert('veiculo', df_rows) == {'inserted': 1, 'updated': 1}
+    df = ca.get_data('veiculo')
+    assert df.set_index('id_veiculo').loc[[1, 6], 'nome'].tolist() == ['Carro 1', 'Novo']
+    assert df['id_veiculo'].tolist() == [1, 2, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize('sheet_name, rows', [
+    ('veiculo', {'nome': ['Repetido'], 'placa': ['SEED0001']}),
+    ('servico', {'id_veiculo': [99], 'id_prestador': [1], 'nome_servico': ['Troca'], 'data_servico': ['2024-01-01']}),
+    ('prestador', {'empresa': ['']}),
+])
+def test_bulk_upsert_validates_the_batch_before_writing(backend, sheet_name, rows):
+    before = [list(row) for row in sheet_rows(backend, sheet_name)]
+    with pytest.raises(ValidationError):
+        services.bulk_upsert(sheet_name, pd.DataFrame(rows))
+    assert sheet_rows(backend, sheet_name) == before
+
+
+def test_bulk_upsert_rejects_soft_deleted_ids(backend, monkeypatch):
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    services.delete_service(1)
+    with pytest.raises(ValidationError, match="restaure-os antes"):
+        services.bulk_upsert('servico', pd.DataFrame({'id_servico': [1], 'valor': [10.0]}))
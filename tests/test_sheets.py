@@ -0,0 +1,29 @@
+"""Leitura da grade crua e tipos das colunas pelo esquema (config.COLUMN_TYPES)."""
+
+import pandas as pd
+
+from controle_automotivo import config
+from controle_automotivo.sheets import coerce_sheet_types, values_to_frame
+
+
+def test_schema_is_the_single_source_of_column_types(monkeypatch):
+    schema = {**config.COLUMN_TYPES['servico'], 'km_extra': 'int', 'valor': 'float'}
+    monkeypatch.setitem(config.COLUMN_TYPES, 'servico', schema)
+    values = [
+        ['id_servico', 'km_realizado', 'km_extra', 'valor', 'data_servico', 'descricao'],
+        ['1', '', '7', '10,5x', '2024-01-31', '007'],
+        ['2', '1500', '', '20.5', 'inválida', ''],
+    ]
+    df = coerce_sheet_types('servico', values_to_frame(values, schema))
+
+    assert df['km_realizado'].tolist() == [0, 1500]
+    assert df['km_extra'].dtype == 'int64' and df['km_extra'].tolist() == [7, 0]
+    assert df['valor'].dtype == 'float64' and df['valor'].tolist() == [0.0, 20.5]
+    assert df['data_servico'].iloc[0] == pd.Timestamp('2024-01-31') and pd.isna(df['data_servico'].iloc[1])
+    assert df['descricao'].tolist() == ['007', '']  # texto fora do esquema continua texto
+
+
+def test_untyped_frame_gets_the_same_types():
+    raw = pd.DataFrame({'id_prestador': ['3', ''], 'nome': ['A', 'B']})
+    df = coerce_sheet_types('prestador', raw)
+    assert df['id_prestador'].dtype == 'int64' and df['id_prestador'].tolist() == [3, 0]
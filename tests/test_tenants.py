@@ -0,0 +1,29 @@
+"""Várias frotas: escolha da frota e lista de usuários permitidos."""
+
+import pytest
+
+from controle_automotivo import config, tenants
+from controle_automotivo.errors import ValidationError
+
+FROTAS = {
+    'aberta': {'sheet_id': 'id-aberta'},
+    'restrita': {'sheet_id': 'id-restrita', 'usuarios': ['Gestor@Empresa.com']},
+}
+
+
+def test_restricted_fleets_are_only_offered_to_listed_users(monkeypatch):
+    monkeypatch.setattr(config, 'TENANTS', FROTAS)
+    assert tenants.restricted_tenants()
+    assert tenants.allowed_tenants() == ['aberta']
+    assert tenants.allowed_tenants('outro@empresa.com') == ['aberta']
+    assert tenants.allowed_tenants(' gestor@empresa.COM ') == ['aberta', 'restrita']
+
+
+def test_use_tenant_switches_the_spreadsheet_only_inside_the_block(monkeypatch):
+    monkeypatch.setattr(config, 'TENANTS', FROTAS)
+    default = tenants.tenant_spreadsheet()
+    with tenants.use_tenant('restrita'):
+        assert tenants.tenant_spreadsheet() == ('id-restrita', None)
+    assert tenants.tenant_spreadsheet() == default
+    with pytest.raises(ValidationError):
+        tenants.set_tenant('inexistente')
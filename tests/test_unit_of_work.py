@@ -0,0 +1,115 @@
+"""UnitOfWork: leituras, gravações em lote e desfazer em caso de falha."""
+
+import pytest
+
+import controle_automotivo as ca
+from controle_automotivo import UnitOfWork, config, services
+from controle_automotivo.errors import DataAccessError
+from loadtest.fake_sheets import FakeWorksheet, seed_tables
+
+from .conftest import sheet_rows
+
+
+def test_delete_many_soft_deletes_in_one_cell_batch(backend, monkeypatch):
+    monkeypatch.setattr(config, 'SOFT_DELETE', True)
+    with UnitOfWork() as uow:
+        assert uow.delete_many('servico', [2, 5, 5, 999]) == 2
+        assert uow.delete_many('servico', [2]) == 0  # já excluído
+        uow.commit()
+
+    assert backend.calls['setup']['batch_update'] == 1
+    rows = sheet_rows(backend, 'servico')
+    deleted_col = rows[0].index(config.DELETED_COL)
+    assert sorted(int(row[0]) for row in rows[1:] if len(row) > deleted_col and row[deleted_col]) == [2, 5]
+    assert not {2, 5} & set(ca.get_data('servico')['id_servico'])
+
+
+def test_apply_table_edits_hard_deletes_all_rows_at_once(backend):
+    df_base = ca.get_data('servico')
+    counts = services.apply_table_edits('servico', df_base, df_base.iloc[3:])
+    assert counts['deleted'] == 3
+    assert [int(row[0]) for row in sheet_rows(backend, 'servico')[1:4]] == [4, 5, 6]
+
+
+def test_commit_writes_one_batch_per_sheet(backend):
+    with UnitOfWork() as uow:
+        id_prestador = uow.insert('prestador', {'empresa': 'Oficina Nova', 'cidade': 'Campinas'})
+        uow.insert('servico', {'id_veiculo': 1, 'id_prestador': id_prestador, 'nome_servico': 'Revisão'})
+        uow.update('veiculo', 2, {'nome': 'Renomeado'})
+        uow.commit()
+
+    calls = backend.calls['setup']
+    # Inserções reescrevem a aba; a aba só com atualização grava apenas as células
+    assert (calls['update'], calls['clear'], calls['batch_update']) == (2, 2, 1)
+    assert int(sheet_rows(backend, 'prestador')[-1][0]) == id_prestador == 4
+    assert ca.get_data('veiculo', 'id_veiculo', 2)['nome'].tolist() == ['Renomeado']
+    assert ca.get_data('servico', 'id_prestador', id_prestador)['nome_servico'].tolist() == ['Revisão']
+
+
+def test_failed_commit_restores_every_sheet(backend, monkeypatch):
+    before = {name: [list(row) for row in sheet_rows(backend, name)] for name in ('prestador', 'servico')}
+    update = FakeWorksheet.update
+
+    def failing_update(self, range_name, values, value_input_option=None):
+        if self.title == 'servico' and len(values) > len(before['servico']):
+            raise RuntimeError("quota excedida")
+        return update(self, range_name, values, value_input_option)
+
+    monkeypatch.setattr(FakeWorksheet, 'update', failing_update)
+    with UnitOfWork() as uow:
+        id_prestador = uow.insert('prestador', {'empresa': 'Oficina Nova'})
+        uow.insert('servico', {'id_veiculo': 1, 'id_prestador': id_prestador})
+        with pytest.raises(DataAccessError):
+            uow.commit()
+        assert not uow.has_changes
+
+    # A aba gravada antes da falha e a que foi limpa pela reescrita voltam ao original
+    for name, rows in before.items():
+        assert sheet_rows(backend, name) == rows
+    assert ca.get_data('prestador')['id_prestador'].max() == 3
+
+
+def test_exception_in_block_discards_pending_changes(backend):
+    with pytest.raises(ValueError), UnitOfWork() as uow:
+        uow.update('veiculo', 1, {'nome': 'Nunca gravado'})
+        raise ValueError("cancelado")
+    assert not uow.has_changes
+    assert sum(backend.calls['setup'][method] for method in ('update', 'batch_update')) == 0
+    assert uow.live('veiculo')['nome'].iloc[0] != 'Nunca gravado'
+
+
+def test_cell_write_aborts_when_rows_moved(backend):
+    with UnitOfWork() as uow:
+        uow.update('veiculo', 3, {'nome': 'Alvo'})
+        # Outra sessão apaga uma linha acima: o ID 3 sobe uma posição na planilha
+        del sheet_rows(backend, 'veiculo')[1]
+        before = [list(row) for row in sheet_rows(backend, 'veiculo')]
+        with pytest.raises(DataAccessError, match="linhas mudaram de posição"):
+            uow.commit()
+
+    assert sheet_rows(backend, 'veiculo') == before
+    assert backend.calls['setup']['batch_update'] == 0
+
+
+def test_repeated_ids_fall_back_to_full_rewrite(make_backend):
+    tables = seed_tables(5, 3, 30)
+    tables['veiculo'][2][0] = tables['veiculo'][1][0]  # duas linhas com o ID 1
+    backend = make_backend(tables)
+    with UnitOfWork() as uow:
+        uow.update('veiculo', 1, {'nome': 'Duplicado'})
+        uow.commit()
+
+    assert backend.calls['setup']['batch_update'] == 0
+    rows = sheet_rows(backend, 'veiculo')
+    assert [row[1] for row in rows[1:3]] == ['Duplicado', 'Duplicado']
+    assert len(rows) == 6
+
+
+def test_table_reads_the_sheet_not_the_cache(backend):
+    assert ca.get_data('veiculo')['id_veiculo'].max() == 5
+    # Linha gravada por outra sessão depois da leitura em cache
+    sheet_rows(backend, 'veiculo').append(['6', 'Outro', 'XYZ0000'])
+    with UnitOfWork() as uow:
+        assert uow.insert('veiculo', {'nome': 'Novo'}) == 7
+        uow.commit()
+    assert [int(row[0]) for row in sheet_rows(backend, 'veiculo')[-2:]] == [6, 7]